@@ -0,0 +1,163 @@
+"""
+Compares the wall time and peak RSS of GenerateBuildingCentroids.execute in
+the "processes" and "threads" execution modes against a local Overpass
+stand-in answering every query after a fixed latency. Each mode runs in a fresh
+process with an empty osmnx cache, the peak RSS sums that process and all of
+its workers.
+
+    python benchmarks/bench_building_centroids_execution.py --locations 32 --latency 0.5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import osmnx as ox
+
+from open_geo_engine.src.generate_building_centroids import (
+    GenerateBuildingCentroids,
+)
+
+
+def serve_overpass(latency):
+    """Answers every query with one school at the center of the queried polygon."""
+
+    class OverpassHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            query = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+            coordinates = [
+                float(c) for c in re.search(r"poly:'([^']+)'", query["data"][0])[1].split()
+            ]
+            lat = sum(coordinates[0::2]) / len(coordinates[0::2])
+            lon = sum(coordinates[1::2]) / len(coordinates[1::2])
+            corners = [(-1, -1), (-1, 1), (1, 1), (1, -1)]
+            elements = [
+                {"type": "node", "id": i + 1, "lat": lat + 1e-3 * dy, "lon": lon + 1e-3 * dx}
+                for i, (dx, dy) in enumerate(corners)
+            ]
+            way_id = int(abs(lat * 1e4) * 1e5 + abs(lon * 1e4))
+            elements.append(
+                {
+                    "type": "way",
+                    "id": way_id,
+                    "nodes": [1, 2, 3, 4, 1],
+                    "tags": {"building": "school"},
+                }
+            )
+            time.sleep(latency)
+            body = json.dumps({"elements": elements}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OverpassHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def tree_rss_mb(root_pid):
+    """Resident memory of root_pid and all of its descendants, read from /proc."""
+    parents = {}
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                parents[int(pid)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    tree = {root_pid}
+    for _ in range(len(parents)):
+        children = {pid for pid, ppid in parents.items() if ppid in tree} - tree
+        if not children:
+            break
+        tree |= children
+    rss_kb = 0
+    for pid in tree:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                rss_kb += next(int(line.split()[1]) for line in f if line.startswith("VmRSS"))
+        except (FileNotFoundError, ProcessLookupError, StopIteration):
+            continue
+    return rss_kb / 1024
+
+
+def run(mode, endpoint, n_locations, max_concurrent, results):
+    ox.settings.overpass_endpoint = endpoint
+    ox.settings.overpass_rate_limit = False
+    ox.settings.cache_folder = tempfile.mkdtemp()
+    locations = [(f"L{i}", (i, i, i + 0.1, i + 0.1)) for i in range(n_locations)]
+    generate_building_centroids = GenerateBuildingCentroids(
+        locations,
+        "Benchmark",
+        {"building": "school"},
+        tile_size_degrees=1.0,
+        tile_area="bbox",
+        execution_mode=mode,
+        max_concurrent_locations=max_concurrent,
+        overpass_max_in_flight=max_concurrent,
+        overpass_requests_per_second=None,
+    )
+
+    peak_rss = [0.0]
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.is_set():
+            peak_rss[0] = max(peak_rss[0], tree_rss_mb(os.getpid()))
+            time.sleep(0.05)
+
+    sampler = threading.Thread(target=sample_rss)
+    sampler.start()
+    start = time.perf_counter()
+    first_result = None
+    rows = 0
+    for gdf in generate_building_centroids.iter_execute():
+        first_result = first_result or time.perf_counter() - start
+        rows += len(gdf)
+    seconds = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    results.put((rows, seconds, first_result, peak_rss[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--locations", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--max-concurrent", type=int, default=8)
+    args = parser.parse_args()
+
+    server = serve_overpass(args.latency)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/api"
+    print(
+        f"{args.locations} locations, {args.latency}s Overpass latency, "
+        f"{os.cpu_count()} cores, {args.max_concurrent} concurrent threads"
+    )
+    context = multiprocessing.get_context("spawn")
+    for mode in ("processes", "threads"):
+        results = context.Queue()
+        process = context.Process(
+            target=run, args=(mode, endpoint, args.locations, args.max_concurrent, results)
+        )
+        process.start()
+        rows, seconds, first_result, peak_rss_mb = results.get()
+        process.join()
+        print(
+            f"{mode:>10}: {rows} footprints in {seconds:.2f}s, first after {first_result:.2f}s, "
+            f"peak RSS {peak_rss_mb:.0f} MB"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compares the footprint GeoDataFrame written as CSV, with WKT geometries read
+back through LoadEEData._get_xy, against the compact centroid Parquet table
+read through LoadEEData._read_locations. Reports the file size, the time and
+peak RSS of reading each file in a fresh process, and the loaded frame size.
+
+    python benchmarks/bench_centroid_output.py --footprints 200000 --tags 40
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import Polygon
+
+from open_geo_engine.config.model_settings import DataConfig
+from open_geo_engine.src.generate_building_centroids import (
+    GenerateBuildingCentroids,
+)
+from open_geo_engine.src.load_ee_data import LoadEEData
+
+
+def generate_footprints(n_footprints, n_tags, seed=0):
+    """Building footprints shaped like osmnx output, mostly empty tag columns included."""
+    rng = np.random.default_rng(seed)
+    lons = rng.uniform(38.8, 48.6, n_footprints)
+    lats = rng.uniform(29.1, 37.4, n_footprints)
+    angles = np.linspace(0, 2 * np.pi, 7)[:-1]
+    radii = rng.uniform(5e-5, 2e-4, (n_footprints, 1))
+    xs = lons[:, None] + radii * np.cos(angles)
+    ys = lats[:, None] + radii * np.sin(angles)
+    geometry = [Polygon(zip(x, y)) for x, y in zip(xs, ys)]
+
+    tags = {"building": ["school"] * n_footprints}
+    for i in range(n_tags):
+        values = np.full(n_footprints, None, dtype=object)
+        filled = rng.random(n_footprints) < 0.05
+        values[filled] = f"value_{i}"
+        tags["name" if i == 0 else f"tag_{i}"] = values
+    index = pd.MultiIndex.from_arrays(
+        [["way"] * n_footprints, np.arange(n_footprints) + 10**8], names=["element_type", "osmid"]
+    )
+    footprints = gpd.GeoDataFrame(tags, geometry=geometry, index=index, crs="epsg:4326")
+    footprints["centroid_geometry"] = footprints.representative_point()
+    return footprints
+
+
+def read_csv(path):
+    load_ee_data = LoadEEData.from_dataclass_config(DataConfig())
+    return load_ee_data._get_xy(pd.read_csv(path))
+
+
+def read_parquet(path):
+    load_ee_data = LoadEEData.from_dataclass_config(DataConfig())
+    return load_ee_data._read_locations(path)
+
+
+def run(function, path, results):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    df = function(path)
+    seconds = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    frame_mb = df.memory_usage(deep=True).sum() / 1024**2
+    results.put((len(df), seconds, (rss_after - rss_before) / 1024, frame_mb))
+
+
+def write_files(n_footprints, n_tags, csv_path, parquet_path):
+    footprints = generate_footprints(n_footprints, n_tags)
+    footprints.to_csv(csv_path)
+    generate_building_centroids = GenerateBuildingCentroids([], "Benchmark", {})
+    generate_building_centroids.write_centroids(
+        generate_building_centroids.to_centroids(footprints), parquet_path
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--footprints", type=int, default=200_000)
+    parser.add_argument("--tags", type=int, default=40)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    csv_path = os.path.join(folder, "building_footprint.csv")
+    parquet_path = os.path.join(folder, "building_centroids.parquet")
+    context = multiprocessing.get_context("spawn")
+    # Peak RSS survives the exec of spawned processes, so keep this one small.
+    process = context.Process(
+        target=write_files, args=(args.footprints, args.tags, csv_path, parquet_path)
+    )
+    process.start()
+    process.join()
+
+    print(f"{args.footprints} footprints with {args.tags} tag columns")
+    for function, path in ((read_csv, csv_path), (read_parquet, parquet_path)):
+        results = context.Queue()
+        process = context.Process(target=run, args=(function, path, results))
+        process.start()
+        rows, seconds, peak_rss_mb, frame_mb = results.get()
+        process.join()
+        print(
+            f"{function.__name__:>12}: {os.path.getsize(path) / 1024**2:.1f} MB file, "
+            f"{rows} rows in {seconds:.2f}s, peak RSS +{peak_rss_mb:.0f} MB, "
+            f"frame {frame_mb:.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares bounding box queries of open_geo_engine.utils.centroid_store against
+a full scan of synthetic centroids, and times removing near duplicates.
+
+    python benchmarks/bench_centroid_store.py --rows 100000 1000000 --queries 1000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from open_geo_engine.utils.centroid_store import CentroidStore
+
+
+def generate_centroids(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {"lon": rng.uniform(38.8, 48.6, n_rows), "lat": rng.uniform(29.1, 37.4, n_rows)}
+    )
+
+
+def full_scan(centroids, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lons = centroids["lon"].to_numpy()
+    lats = centroids["lat"].to_numpy()
+    return np.flatnonzero(
+        (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--tolerance-meters", type=float, default=1.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    for n_rows in args.rows:
+        centroids = generate_centroids(n_rows)
+        corners = rng.uniform([38.8, 29.1], [48.5, 37.3], (args.queries, 2))
+        bboxes = [(lon, lat, lon + 0.05, lat + 0.05) for lon, lat in corners]
+
+        start = time.perf_counter()
+        store = CentroidStore(centroids)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scanned = [full_scan(centroids, bbox) for bbox in bboxes]
+        scan_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        queried = [store.query_bbox(bbox) for bbox in bboxes]
+        index_seconds = time.perf_counter() - start
+        assert all(np.array_equal(a, b) for a, b in zip(scanned, queried))
+        print(
+            f"{n_rows:>9} rows, {args.queries} bbox queries: full scan {scan_seconds:.2f}s, "
+            f"grid index {index_seconds:.2f}s + {build_seconds:.2f}s to build "
+            f"({scan_seconds / (index_seconds + build_seconds):.1f}x)"
+        )
+
+        start = time.perf_counter()
+        duplicated = store.duplicated(args.tolerance_meters)
+        print(
+            f"{n_rows:>9} rows, {duplicated.sum()} within {args.tolerance_meters} m of another: "
+            f"{time.perf_counter() - start:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares the wall time and peak RSS of collecting sampled points as a list of
+per-point DataFrames joined with pd.concat against the ColumnarAccumulator.
+Each path runs in a fresh process so their peak RSS do not interfere.
+
+    python benchmarks/bench_columnar_accumulator.py --points 20000 --timesteps 24
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+
+import pandas as pd
+from bench_ee_array_to_df import BANDS, generate_region_arrays
+
+from open_geo_engine.utils.columnar_accumulator import ColumnarAccumulator
+from open_geo_engine.utils.utils import ee_array_to_df
+
+
+def list_of_dataframes(region_arrays):
+    locations_ee_list = []
+    for region_array in region_arrays:
+        ee_df = ee_array_to_df(region_array, BANDS)
+        if not ee_df.empty:
+            locations_ee_list.append(ee_df)
+    return pd.concat(locations_ee_list)
+
+
+def columnar_accumulator(region_arrays):
+    accumulator = ColumnarAccumulator(BANDS)
+    for region_array in region_arrays:
+        accumulator.append_region_array(region_array)
+    return accumulator.to_df()
+
+
+def run(function, n_points, n_timesteps, results):
+    # Payloads are generated lazily, as they arrive from Earth Engine, so the
+    # peak RSS reflects what each path keeps alive. Generating them is part of
+    # both timings.
+    region_arrays = (
+        generate_region_arrays(1, n_timesteps, seed=point)[0] for point in range(n_points)
+    )
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    df = function(region_arrays)
+    seconds = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((len(df), seconds, (rss_after - rss_before) / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--timesteps", type=int, default=24)
+    args = parser.parse_args()
+
+    print(f"{args.points} points x {args.timesteps} timesteps x {len(BANDS)} bands")
+    context = multiprocessing.get_context("spawn")
+    for function in (list_of_dataframes, columnar_accumulator):
+        results = context.Queue()
+        process = context.Process(target=run, args=(function, args.points, args.timesteps, results))
+        process.start()
+        rows, seconds, peak_rss_mb = results.get()
+        process.join()
+        print(
+            f"{function.__name__:>20}: {rows} rows in {seconds:.2f}s, "
+            f"peak RSS +{peak_rss_mb:.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
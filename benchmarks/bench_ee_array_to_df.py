@@ -0,0 +1,60 @@
+"""
+Compares ee_array_to_df, called once per point and concatenated as the
+pipeline used to, with ee_arrays_to_df on synthetic getRegion payloads.
+
+    python benchmarks/bench_ee_array_to_df.py --points 2000 --timesteps 24
+"""
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from open_geo_engine.utils.utils import ee_array_to_df, ee_arrays_to_df
+
+BANDS = [
+    "temperature_2m_above_ground",
+    "relative_humidity_2m_above_ground",
+    "u_component_of_wind_10m_above_ground",
+    "v_component_of_wind_10m_above_ground",
+]
+
+
+def generate_region_arrays(n_points, n_timesteps, seed=0):
+    rng = np.random.default_rng(seed)
+    header = ["id", "longitude", "latitude", "time", *BANDS]
+    region_arrays = []
+    for point in range(n_points):
+        lon, lat = rng.uniform(68, 97), rng.uniform(8, 35)
+        rows = [header]
+        for step in range(n_timesteps):
+            values = rng.normal(size=len(BANDS)).tolist()
+            rows.append([f"{point}_{step}", lon, lat, 1584057600000 + step * 3600000, *values])
+        region_arrays.append(rows)
+    return region_arrays
+
+
+def per_point(region_arrays):
+    return pd.concat([ee_array_to_df(region_array, BANDS) for region_array in region_arrays])
+
+
+def batched(region_arrays):
+    return ee_arrays_to_df(region_arrays, BANDS)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--timesteps", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    region_arrays = generate_region_arrays(args.points, args.timesteps)
+    print(f"{args.points} points x {args.timesteps} timesteps x {len(BANDS)} bands")
+    for function in (per_point, batched):
+        seconds = min(timeit.repeat(lambda: function(region_arrays), number=1, repeat=args.repeat))
+        print(f"{function.__name__:>10}: {seconds:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compares per-row shapely calls against the array helpers of
+open_geo_engine.utils.geometry for the representative point of synthetic
+building polygons and for reading x and y back from WKT points.
+
+    python benchmarks/bench_geometry.py --rows 100000 1000000
+"""
+import argparse
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely.wkt
+from shapely.geometry import Polygon
+
+from open_geo_engine.utils.geometry import (
+    SHAPELY_2,
+    points_xy,
+    representative_points,
+    wkt_points_xy,
+)
+
+
+def generate_polygons(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform([38.8, 29.1], [48.6, 37.4], (n_rows, 2))
+    angles = np.linspace(0, 2 * np.pi, 7)[:-1]
+    radii = rng.uniform(5e-5, 2e-4, (n_rows, 1))
+    rings = np.stack(
+        [centers[:, :1] + radii * np.cos(angles), centers[:, 1:] + radii * np.sin(angles)], axis=-1
+    )
+    if SHAPELY_2:
+        return gpd.GeoSeries(shapely.polygons(rings), crs="epsg:4326")
+    return gpd.GeoSeries([Polygon(ring) for ring in rings], crs="epsg:4326")
+
+
+def per_row_representative_points(polygons):
+    return [polygon.representative_point() for polygon in polygons]
+
+
+def per_row_xy(wkt):
+    # The former LoadEEData._get_xy.
+    points = list(map(shapely.wkt.loads, wkt))
+    return list(map(lambda p: p.x, points)), list(map(lambda p: p.y, points))
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"shapely {shapely.__version__}, geopandas {gpd.__version__}")
+    for n_rows in args.rows:
+        polygons = generate_polygons(n_rows)
+        per_row_points, per_row_seconds = timed(per_row_representative_points, polygons)
+        points, array_seconds = timed(representative_points, polygons)
+        assert np.allclose(points_xy(per_row_points), points_xy(points))
+        print(
+            f"{n_rows:>9} representative points: per row {per_row_seconds:.2f}s, "
+            f"arrays {array_seconds:.2f}s ({per_row_seconds / array_seconds:.1f}x)"
+        )
+
+        x, y = points_xy(points)
+        wkt = [f"POINT ({lon!r} {lat!r})" for lon, lat in zip(x.tolist(), y.tolist())]
+        per_row, per_row_seconds = timed(per_row_xy, wkt)
+        vectorized, array_seconds = timed(wkt_points_xy, wkt)
+        assert np.array_equal(per_row, vectorized)
+        print(
+            f"{n_rows:>9} WKT points to x, y:    per row {per_row_seconds:.2f}s, "
+            f"arrays {array_seconds:.2f}s ({per_row_seconds / array_seconds:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
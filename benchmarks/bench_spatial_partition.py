@@ -0,0 +1,56 @@
+"""
+Simulates sampling clustered centroids in chunks against a cost model where
+every Earth Engine request pays a fixed latency plus a cost per tile it
+touches, comparing the order centroids arrive in with Hilbert curve order.
+
+    python benchmarks/bench_spatial_partition.py --points 50000 --chunk-size 250
+"""
+import argparse
+import time
+
+import numpy as np
+
+from open_geo_engine.utils.spatial_partition import chunk_locality, spatial_order, tile_degrees
+
+
+def generate_clustered_points(n_points, n_clusters=200, seed=0):
+    """Centroids grouped around towns spread over India's bounding box."""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform((68.2, 8.0), (97.4, 35.5), size=(n_clusters, 2))
+    spread = rng.uniform(0.01, 0.2, size=n_clusters)
+    cluster = rng.integers(0, n_clusters, size=n_points)
+    points = centers[cluster] + rng.normal(size=(n_points, 2)) * spread[cluster, None]
+    return points[:, 0], points[:, 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=250)
+    parser.add_argument("--scale", type=float, default=10)
+    parser.add_argument("--request-seconds", type=float, default=0.5)
+    parser.add_argument("--tile-seconds", type=float, default=0.02)
+    args = parser.parse_args()
+
+    lons, lats = generate_clustered_points(args.points)
+    start = time.perf_counter()
+    order = spatial_order(lons, lats)
+    print(f"Hilbert ordering of {args.points} points: {time.perf_counter() - start:.3f}s")
+
+    for name, (ordered_lons, ordered_lats) in {
+        "unsorted": (lons, lats),
+        "hilbert": (lons[order], lats[order]),
+    }.items():
+        locality = chunk_locality(
+            ordered_lons, ordered_lats, args.chunk_size, tile_degrees(args.scale)
+        )
+        seconds = locality["chunks"] * args.request_seconds + locality["tiles"] * args.tile_seconds
+        print(
+            f"{name:>9}: {locality['mean_tiles_per_chunk']:.1f} tiles/chunk, "
+            f"bbox {locality['mean_bbox_area']:.4f} deg2, "
+            f"simulated {seconds:.0f}s ({args.points / seconds:.0f} points/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares downloading Street View images one at a time over fresh
+connections, like google_streetview's download_links, against
+open_geo_engine.utils.streetview_downloader, from a local server answering
+each image after a fixed latency.
+
+    python benchmarks/bench_streetview_download.py --images 500 --latency-ms 20
+"""
+import argparse
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from open_geo_engine.utils.streetview_downloader import StreetViewDownloader
+
+IMAGE_BYTES = 40 * 1024
+
+
+def start_server(latency_seconds):
+    class ImageHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency_seconds)
+            body = b"\xff" * IMAGE_BYTES
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def download_one_at_a_time(urls, paths):
+    # What google_streetview.helpers.download does for every link.
+    for url, path in zip(urls, paths):
+        response = requests.get(url, stream=True)
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1024):
+                f.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--max-concurrent", type=int, default=16)
+    args = parser.parse_args()
+
+    server = start_server(args.latency_ms / 1000)
+    urls = [f"http://127.0.0.1:{server.server_address[1]}/{i}" for i in range(args.images)]
+    folder = tempfile.mkdtemp()
+    try:
+        paths = [f"{folder}/sequential_{i}.jpg" for i in range(args.images)]
+        start = time.perf_counter()
+        download_one_at_a_time(urls, paths)
+        sequential_seconds = time.perf_counter() - start
+
+        downloader = StreetViewDownloader(max_concurrent=args.max_concurrent)
+        paths = [f"{folder}/pooled_{i}.jpg" for i in range(args.images)]
+        start = time.perf_counter()
+        downloader.download_many(urls, paths)
+        pooled_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        downloader.download_many(urls, paths)
+        rerun_seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(folder)
+        server.shutdown()
+
+    print(
+        f"{args.images} images at {args.latency_ms:.0f} ms: one at a time {sequential_seconds:.2f}s, "
+        f"pooled x{args.max_concurrent} {pooled_seconds:.2f}s "
+        f"({sequential_seconds / pooled_seconds:.1f}x), rerun skipping present files "
+        f"{rerun_seconds:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
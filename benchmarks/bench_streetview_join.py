@@ -0,0 +1,96 @@
+"""
+Compares the former add_links_to_satellite_df, which wrote the links to a
+file, read them back, regex-extracted the coordinates and merged on floats,
+against GetGoogleStreetView.join_streetview_results on location_key. The
+satellite coordinates are read back from CSV, like the output of the Earth
+Engine stage.
+
+    python benchmarks/bench_streetview_join.py --rows 100000 1000000 --locations 20000
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from open_geo_engine.src.get_google_streetview import GetGoogleStreetView
+from open_geo_engine.utils.geometry import location_key
+
+LINK = "https://maps.googleapis.com/maps/api/streetview"
+
+
+def links_file_join(satellite_data_df, links, links_file):
+    # The former save_links and add_links_to_satellite_df.
+    with open(links_file, "w") as f:
+        f.write("\n".join(links))
+    street_view_links_df = pd.read_csv(links_file, lineterminator="\n", names=["URL"])
+    street_view_links_df["latitude"] = street_view_links_df["URL"].str.extract("location=(.*)%2C")
+    street_view_links_df["longitude"] = street_view_links_df["URL"].str.extract("%2C(.*)&pitch")
+    street_view_links_df[["latitude", "longitude"]] = street_view_links_df[
+        ["latitude", "longitude"]
+    ].apply(pd.to_numeric, errors="coerce")
+    return satellite_data_df.merge(street_view_links_df, on=["latitude", "longitude"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--locations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    get_google_streetview = GetGoogleStreetView(
+        "600x300", "151.78", "-0.76", "key", "", "", "", "Bench", ""
+    )
+    rng = np.random.default_rng(0)
+    coordinates = rng.uniform([29.1, 38.8], [37.4, 48.6], (args.locations, 2))
+    links = [
+        requests.Request(
+            "GET", LINK, params={"size": "600x300", "location": f"{lat},{lon}", "pitch": "-0.76"}
+        )
+        .prepare()
+        .url
+        for lat, lon in coordinates.tolist()
+    ]
+    streetview_results = pd.DataFrame(
+        {
+            "request_key": location_key(coordinates[:, 0], coordinates[:, 1]),
+            "latitude": coordinates[:, 0],
+            "longitude": coordinates[:, 1],
+            "URL": links,
+        }
+    )
+
+    with tempfile.TemporaryDirectory() as folder:
+        for n_rows in args.rows:
+            rows = coordinates[rng.integers(0, args.locations, n_rows)]
+            buffer = io.StringIO()
+            # Written with 12 decimals, a common float_format for CSV exports.
+            pd.DataFrame(rows, columns=["latitude", "longitude"]).to_csv(
+                buffer, index=False, float_format="%.12f"
+            )
+            satellite_data_df = pd.read_csv(io.StringIO(buffer.getvalue()))
+
+            start = time.perf_counter()
+            merged = links_file_join(
+                satellite_data_df.copy(), links, os.path.join(folder, "links.txt")
+            )
+            file_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            joined = get_google_streetview.join_streetview_results(
+                satellite_data_df.copy(), streetview_results, ["URL"]
+            )
+            key_seconds = time.perf_counter() - start
+
+            print(
+                f"{n_rows:>9} rows: links file and float merge {file_seconds:.2f}s, "
+                f"{len(merged)} rows matched; location_key join {key_seconds:.2f}s, "
+                f"{joined['URL'].notna().sum()} rows matched"
+            )
+
+
+if __name__ == "__main__":
+    main()
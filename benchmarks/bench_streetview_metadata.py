@@ -0,0 +1,106 @@
+"""
+Compares the former add_metadata_to_satellite_df, one request per row over
+fresh connections, against GetGoogleStreetView.add_metadata_to_satellite_df,
+one request per distinct location over a pooled session and then from the
+metadata cache, with a local server standing in for the metadata API.
+
+    python benchmarks/bench_streetview_metadata.py --rows 1000 --locations 100
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import requests
+
+from open_geo_engine.src.get_google_streetview import GetGoogleStreetView
+from open_geo_engine.utils.streetview_downloader import StreetViewDownloader
+from open_geo_engine.utils.streetview_metadata_cache import StreetViewMetadataCache
+
+
+def start_server(latency_seconds):
+    class MetadataHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency_seconds)
+            body = json.dumps({"status": "OK", "pano_id": self.path}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MetadataHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def per_row_metadata(satellite_data_df, meta_base):
+    # The former add_metadata_to_satellite_df.
+    for lat_lon in satellite_data_df["lat_lon_str"]:
+        meta_params = {"key": "key", "location": lat_lon}
+        satellite_data_df["metadata"] = str(requests.get(meta_base, params=meta_params))
+    return satellite_data_df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--locations", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=10)
+    parser.add_argument("--max-concurrent", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    coordinates = rng.uniform([40.3, -3.8], [40.5, -3.6], (args.locations, 2))
+    rows = coordinates[rng.integers(0, args.locations, args.rows)]
+    satellite_data_df = pd.DataFrame({"latitude": rows[:, 0], "longitude": rows[:, 1]})
+
+    server = start_server(args.latency_ms / 1000)
+    meta_base = f"http://127.0.0.1:{server.server_address[1]}/metadata"
+    with tempfile.TemporaryDirectory() as folder:
+
+        def get_google_streetview():
+            return GetGoogleStreetView(
+                "600x300",
+                "151.78",
+                "-0.76",
+                "key",
+                folder,
+                "",
+                "",
+                "Bench",
+                meta_base,
+                StreetViewDownloader(max_concurrent=args.max_concurrent),
+                StreetViewMetadataCache(f"{folder}/metadata.sqlite", ttl_seconds=3600),
+            )
+
+        satellite_data_df["lat_lon_str"] = get_google_streetview()._join_lat_lon(satellite_data_df)
+        start = time.perf_counter()
+        per_row_metadata(satellite_data_df.copy(), meta_base)
+        per_row_seconds = time.perf_counter() - start
+
+        timings = []
+        for _ in range(2):
+            start = time.perf_counter()
+            get_google_streetview().add_metadata_to_satellite_df(satellite_data_df.copy())
+            timings.append(time.perf_counter() - start)
+    server.shutdown()
+
+    print(
+        f"{args.rows} rows, {args.locations} locations at {args.latency_ms:.0f} ms: "
+        f"per row {per_row_seconds:.2f}s, distinct locations x{args.max_concurrent} "
+        f"{timings[0]:.2f}s ({per_row_seconds / timings[0]:.1f}x), cached {timings[1]:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
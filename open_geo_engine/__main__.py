@@ -1,3 +1,5 @@
+import logging
+
 import click
 import ee
 
@@ -11,6 +13,8 @@ from open_geo_engine.src.generate_building_centroids import (
 )
 from open_geo_engine.src.get_google_streetview import GetGoogleStreetView
 from open_geo_engine.src.load_ee_data import LoadEEData
+from open_geo_engine.src.load_multi_source_ee_data import LoadMultiSourceEEData
+from open_geo_engine.utils.streetview_image_store import StreetViewImageStore
 
 
 class GenerateBuildingCentroidsFlow:
@@ -22,7 +26,30 @@ class GenerateBuildingCentroidsFlow:
         building_generator = GenerateBuildingCentroids.from_dataclass_config(
             self.data_settings, self.osm_settings
         )
-        return building_generator.execute()
+        try:
+            return self._execute(building_generator)
+        finally:
+            if building_generator.response_cache is not None:
+                logging.info(
+                    f"Overpass response cache: {building_generator.response_cache.stats()}"
+                )
+
+    def _execute(self, building_generator):
+        # Every source returns the compact centroid table written to CENTROIDS_PATH.
+        if self.osm_settings.SOURCE == "extract":
+            centroids = building_generator.extract_centroids()
+            building_generator.write_centroids(centroids, self.osm_settings.CENTROIDS_PATH)
+            return centroids
+
+        if self.osm_settings.INCREMENTAL:
+            centroids, diff = building_generator.refresh()
+            building_generator.write_centroids(centroids, self.osm_settings.CENTROIDS_PATH)
+            building_generator.write_centroids(diff, self.osm_settings.CENTROID_DIFF_PATH)
+            return centroids
+
+        centroids = building_generator.execute_centroids()
+        building_generator.write_centroids(centroids, self.osm_settings.CENTROIDS_PATH)
+        return centroids
 
 
 class LoadDataFlow:
@@ -44,6 +71,17 @@ class LoadDataFlow:
         return data_loader.execute_for_country(kwargs, save_images=False)
 
 
+class LoadMultiSourceDataFlow:
+    def __init__(self):
+        self.config = DataConfig()
+
+    def execute(self, filepath):
+        data_loader = LoadMultiSourceEEData.from_dataclass_config(self.config)
+        if filepath:
+            data_loader.filepath = filepath
+        data_loader.execute(save_images=False)
+
+
 class GetGoogleStreetViewFlow:
     def __init__(self):
         self.streetview_config = StreetViewConfig()
@@ -67,6 +105,15 @@ def load_data(filepath):
     LoadDataFlow().execute(filepath)
 
 
+@click.command(
+    "load_multi_source_data",
+    help="Load every configured Earth Engine collection in a single pass",
+)
+@click.argument("filepath")
+def load_multi_source_data(filepath):
+    LoadMultiSourceDataFlow().execute(filepath)
+
+
 @click.command(
     "get_google_streetview",
     help="Retrieve streetview images for building locations",
@@ -75,13 +122,27 @@ def get_google_streetview(satellite_data_df):
     GetGoogleStreetViewFlow().execute_for_country(satellite_data_df)
 
 
+@click.command(
+    "compact_streetview_images",
+    help="Drop the Street View images and image store entries orphaned by each other",
+)
+def compact_streetview_images():
+    streetview_config = StreetViewConfig()
+    image_store = StreetViewImageStore(
+        streetview_config.LOCAL_IMAGE_FOLDER, streetview_config.IMAGE_STORE_INDEX_PATH
+    )
+    try:
+        click.echo(image_store.compact())
+    finally:
+        image_store.close()
+
+
 @click.command("run_pipeline", help="Run full analysis pipeline")
-@click.argument("path_to_local_data")
-def run_full_pipeline(path_to_local_data):
-    building_footprint_gdf = GenerateBuildingCentroidsFlow().execute()
-    building_footprint_gdf.to_csv(f"{path_to_local_data}/osm_data/building_footprint.csv")
+def run_full_pipeline():
+    # The flow writes the compact centroid table that Earth Engine samples.
+    GenerateBuildingCentroidsFlow().execute()
 
-    LoadDataFlow().execute(f"{path_to_local_data}/osm_data/building_footprint.csv")
+    LoadDataFlow().execute(OSMConfig().CENTROIDS_PATH)
     # GetGoogleStreetViewFlow().execute_for_df(satellite_data_df)
 
 
@@ -99,7 +160,9 @@ def cli(ctx):
 
 cli.add_command(generate_building_centroids)
 cli.add_command(load_data)
+cli.add_command(load_multi_source_data)
 cli.add_command(get_google_streetview)
+cli.add_command(compact_streetview_images)
 cli.add_command(run_full_pipeline)
 
 if __name__ == "__main__":
@@ -1,7 +1,7 @@
 import os
 from dataclasses import field
 from pathlib import Path
-from typing import Sequence
+from typing import Optional, Sequence
 
 from pydantic.dataclasses import dataclass
 
@@ -17,12 +17,79 @@ class StreetViewConfig:
     LOCAL_METADATA_FOLDER: str = f"{Path(__file__).resolve().parent.parent.parent.parent.parent.parent.parent.parent}/local_data/streetview_metadata"
     PLACE = "Iraq"
     META_BASE = "https://maps.googleapis.com/maps/api/streetview/metadata?"
+    # Images are downloaded over a pooled session with at most
+    # DOWNLOAD_MAX_CONCURRENT requests in flight, busy or failing servers are
+    # retried with a jittered exponential backoff.
+    DOWNLOAD_MAX_CONCURRENT: int = 16
+    DOWNLOAD_MAX_RETRIES: int = 3
+    DOWNLOAD_BACKOFF_SECONDS: float = 0.5
+    DOWNLOAD_TIMEOUT_SECONDS: float = 30.0
+    # Metadata is looked up once per distinct location over the same session
+    # and kept METADATA_CACHE_TTL_DAYS, set METADATA_CACHE_PATH to None to
+    # disable the cache.
+    METADATA_CACHE_PATH: Optional[str] = "local_data/streetview_cache/metadata.sqlite"
+    METADATA_CACHE_TTL_DAYS: Optional[float] = 30
+    # Look the metadata of every location up before downloading images, and
+    # download one image per panorama of the locations with coverage. Off by
+    # default, as it drops the locations without coverage from the results.
+    METADATA_FIRST: bool = False
+    IMAGE_BASE = "https://maps.googleapis.com/maps/api/streetview"
+    # Distinct locations are looked up and their images downloaded
+    # REQUEST_CHUNK_SIZE at a time.
+    REQUEST_CHUNK_SIZE: int = 1000
+    # Keep images in LOCAL_IMAGE_FOLDER once per panorama or location, size,
+    # heading and pitch, in sharded folders indexed by IMAGE_STORE_INDEX_PATH,
+    # by default LOCAL_IMAGE_FOLDER/index.sqlite. Off by default, images are then
+    # written to LOCAL_IMAGE_FOLDER under their flat names.
+    IMAGE_STORE: bool = False
+    IMAGE_STORE_INDEX_PATH: Optional[str] = None
 
 
 @dataclass
 class OSMConfig:
     TAGS = {"building": "school"}
     PLACE = "Iraq"
+    # Split the PLACE polygon, or each country's bounding box when TILE_AREA is
+    # "bbox", into tiles of TILE_SIZE_DEGREES downloaded with at most
+    # MAX_CONCURRENT_TILES concurrent Overpass queries. None downloads it in one query.
+    TILE_SIZE_DEGREES: Optional[float] = None
+    TILE_AREA: str = "place"
+    MAX_CONCURRENT_TILES: int = 4
+    # "threads" downloads at most MAX_CONCURRENT_LOCATIONS locations from one
+    # process, "processes" forks a joblib worker per core.
+    EXECUTION_MODE: str = "threads"
+    MAX_CONCURRENT_LOCATIONS: int = 8
+    # Limits shared by every query to the same Overpass endpoint, None leaves
+    # the request rate unlimited.
+    OVERPASS_MAX_IN_FLIGHT: int = 2
+    OVERPASS_REQUESTS_PER_SECOND: Optional[float] = 1.0
+    # Search radius around each (lat, lon) point passed as list_of_points.
+    POINT_RADIUS_METERS: int = 1000
+    # Compact centroid table written by GenerateBuildingCentroidsFlow and read by
+    # LoadEEData, keeping only these OSM tags next to osm_id, lon and lat.
+    CENTROIDS_PATH: str = "local_data/building_centroids.parquet"
+    CENTROID_TAGS: Sequence[str] = ("name",)
+    # Incremental refresh of tiled downloads: tiles fetched within the last
+    # SNAPSHOT_MAX_AGE_DAYS are reused from SNAPSHOT_FOLDER, and the centroids
+    # added, moved or removed since the previous run go to CENTROID_DIFF_PATH.
+    INCREMENTAL: bool = False
+    SNAPSHOT_FOLDER: str = "local_data/osm_snapshots"
+    SNAPSHOT_MAX_AGE_DAYS: float = 7
+    CENTROID_DIFF_PATH: str = "local_data/building_centroid_diff.parquet"
+    # Overpass and Nominatim responses shared by every worker, compressed and
+    # bounded to RESPONSE_CACHE_MAX_BYTES. None keeps the osmnx JSON cache.
+    RESPONSE_CACHE_PATH: Optional[str] = "local_data/osm_cache/responses.sqlite"
+    RESPONSE_CACHE_MAX_BYTES: int = 1024**3
+    RESPONSE_CACHE_TTL_DAYS: Optional[float] = 30
+    # "overpass" downloads the footprints, "extract" reads them from the local
+    # OSM extract at EXTRACT_PATH (.osm.pbf, GeoPackage or GeoParquet),
+    # EXTRACT_CHUNK_SIZE footprints at a time.
+    SOURCE: str = "overpass"
+    EXTRACT_PATH: Optional[str] = None
+    EXTRACT_CHUNK_SIZE: int = 50_000
+    # Centroids of different OSM elements closer than this are one building
+    # mapped twice and only the first is written, None keeps them all.
+    DEDUP_TOLERANCE_METERS: Optional[float] = 1.0
 
 
 @dataclass
@@ -64,6 +131,62 @@ class DataConfig:
     LAND_COVER_IMAGE_BAND: str = "discrete_classification"
     IMAGE_FOLDER = "local_data/image_folder"
 
+    # "batch" samples SAMPLE_CHUNK_SIZE centroids per Earth Engine request,
+    # "point" issues one getRegion request per centroid.
+    SAMPLE_MODE: str = "batch"
+    SAMPLE_CHUNK_SIZE: int = 250
+    SAMPLE_SCALE: int = 10
+    # Number of times a chunk is halved and retried when Earth Engine rejects
+    # it as too large, 0 disables the retry.
+    SAMPLE_MAX_SPLITS: int = 4
+    # Centroids that still fail are retried on their own this many times.
+    SAMPLE_MAX_RETRIES: int = 2
+    # Split the date window into shards of this many days, sampled concurrently,
+    # to stay under Earth Engine's element limits on long time ranges.
+    DATE_SHARD_DAYS: Optional[int] = None
+    # Sort centroids along a Hilbert curve before chunking them.
+    SAMPLE_SPATIAL_ORDER: bool = True
+    # Sample each country only at the centroids within its bounding box,
+    # centroids in the boxes of several countries go to the first of them.
+    # Off by default, every country samples every centroid of the table.
+    CLIP_LOCATIONS_TO_COUNTRY: bool = False
+    # Earth Engine requests kept in flight for each country and in total, quota
+    # rejections are retried with an exponential backoff.
+    EE_MAX_IN_FLIGHT_PER_COUNTRY: int = 8
+    EE_MAX_IN_FLIGHT: int = 32
+    EE_QUOTA_MAX_RETRIES: int = 5
+    EE_QUOTA_BACKOFF_SECONDS: float = 1.0
+    # Local cache of point samples, set SAMPLE_CACHE_PATH to None to disable it.
+    SAMPLE_CACHE_PATH: Optional[str] = "local_data/ee_cache/samples.sqlite"
+    SAMPLE_CACHE_MAX_BYTES: int = 2 * 1024**3
+    SAMPLE_CACHE_PRECISION: int = 6
+    # Results are written to OUTPUT_FOLDER/<country>_<model> as Parquet parts of
+    # OUTPUT_FLUSH_POINTS centroids keyed on their location. Reruns skip the
+    # centroids already written and drop those no longer in the centroid table,
+    # sampling an OSMConfig.CENTROID_DIFF_PATH diff replaces the changed ones only.
+    OUTPUT_FOLDER = "local_data/gee_data"
+    OUTPUT_FLUSH_POINTS: int = 1000
+    # Reduce each band server-side over the date window, or over "daily" or
+    # "weekly" bins of it, instead of sampling every image. Reducers are
+    # ee.Reducer names such as "mean", "min", "max" or percentiles like "p90".
+    AGGREGATION_REDUCERS: Sequence[str] = field(default_factory=list)
+    AGGREGATION_BIN: Optional[str] = None
+    # Collections sampled together by load_multi_source_data, named by the
+    # prefix of their <NAME>_IMAGE_COLLECTION and <NAME>_IMAGE_BAND settings.
+    # Their rows are merged on exact timestamps, or within MULTI_SOURCE_ALIGN_FREQ
+    # windows (a pandas frequency such as "1D") when it is set.
+    MULTI_SOURCE_MODELS: Sequence[str] = field(
+        default_factory=lambda: [
+            "LANDSAT",
+            "AOD",
+            "NIGHTTIME_LIGHT",
+            "METEROLOGICAL",
+            "POPULATION",
+            "LAND_COVER",
+        ]
+    )
+    MULTI_SOURCE_ALIGN_FREQ: Optional[str] = None
+
     COUNTRY_BOUNDING_BOXES = {
         "AF": (
             "Afghanistan",
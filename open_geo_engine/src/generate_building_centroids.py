@@ -1,11 +1,26 @@
-from typing import Any, Dict, Sequence, Tuple
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import geopandas as gpd
+import numpy as np
 import osmnx as ox
 import pandas as pd
 from joblib import Parallel, delayed
+from osmnx._errors import EmptyOverpassResponse
+from shapely.geometry import box
+from shapely.ops import unary_union
 
 from open_geo_engine.config.model_settings import DataConfig, OSMConfig
+from open_geo_engine.utils.centroid_store import CentroidStore, country_boxes
+from open_geo_engine.utils.geometry import points_xy, representative_points
+from open_geo_engine.utils.osm_extract import iter_extract_footprints
+from open_geo_engine.utils.overpass_cache import OverpassResponseCache
+from open_geo_engine.utils.rate_limiter import get_endpoint_limiter
+from open_geo_engine.utils.spatial_partition import METERS_PER_DEGREE
+from open_geo_engine.utils.tile_snapshot import TileSnapshotStore, centroid_diff
 
 
 class GenerateBuildingCentroids:
@@ -14,10 +29,40 @@ class GenerateBuildingCentroids:
         countries: Sequence,
         place: str,
         tags: Dict[str, Any],
+        tile_size_degrees: Optional[float] = None,
+        tile_area: str = "place",
+        max_concurrent_tiles: int = 4,
+        execution_mode: str = "threads",
+        max_concurrent_locations: int = 8,
+        overpass_max_in_flight: int = 2,
+        overpass_requests_per_second: Optional[float] = 1.0,
+        point_radius_meters: int = 1000,
+        centroid_tags: Sequence[str] = ("name",),
+        snapshot_folder: str = "local_data/osm_snapshots",
+        snapshot_max_age_days: float = 7,
+        response_cache: Optional[OverpassResponseCache] = None,
+        extract_path: Optional[str] = None,
+        extract_chunk_size: int = 50_000,
+        dedup_tolerance_meters: Optional[float] = 1.0,
     ):
         self.countries = countries
         self.place = place
         self.tags = tags
+        self.tile_size_degrees = tile_size_degrees
+        self.tile_area = tile_area
+        self.max_concurrent_tiles = max_concurrent_tiles
+        self.execution_mode = execution_mode
+        self.max_concurrent_locations = max_concurrent_locations
+        self.overpass_max_in_flight = overpass_max_in_flight
+        self.overpass_requests_per_second = overpass_requests_per_second
+        self.point_radius_meters = point_radius_meters
+        self.centroid_tags = centroid_tags
+        self.snapshot_folder = snapshot_folder
+        self.snapshot_max_age_days = snapshot_max_age_days
+        self.response_cache = response_cache
+        self.extract_path = extract_path
+        self.extract_chunk_size = extract_chunk_size
+        self.dedup_tolerance_meters = dedup_tolerance_meters
 
     @classmethod
     def from_dataclass_config(
@@ -25,35 +70,367 @@ class GenerateBuildingCentroids:
         data_config: DataConfig,
         osm_config: OSMConfig,
     ) -> "GenerateBuildingCentroids":
-        countries = []
-        for country in data_config.COUNTRY_CODES:
-            country_info = data_config.COUNTRY_BOUNDING_BOXES.get(country, "WO")
-            countries.append(country_info)
+        return cls(
+            countries=country_boxes(data_config.COUNTRY_CODES, data_config.COUNTRY_BOUNDING_BOXES),
+            place=osm_config.PLACE,
+            tags=osm_config.TAGS,
+            tile_size_degrees=osm_config.TILE_SIZE_DEGREES,
+            tile_area=osm_config.TILE_AREA,
+            max_concurrent_tiles=osm_config.MAX_CONCURRENT_TILES,
+            execution_mode=osm_config.EXECUTION_MODE,
+            max_concurrent_locations=osm_config.MAX_CONCURRENT_LOCATIONS,
+            overpass_max_in_flight=osm_config.OVERPASS_MAX_IN_FLIGHT,
+            overpass_requests_per_second=osm_config.OVERPASS_REQUESTS_PER_SECOND,
+            point_radius_meters=osm_config.POINT_RADIUS_METERS,
+            centroid_tags=osm_config.CENTROID_TAGS,
+            snapshot_folder=osm_config.SNAPSHOT_FOLDER,
+            snapshot_max_age_days=osm_config.SNAPSHOT_MAX_AGE_DAYS,
+            response_cache=cls._response_cache_from_config(osm_config),
+            extract_path=osm_config.EXTRACT_PATH,
+            extract_chunk_size=osm_config.EXTRACT_CHUNK_SIZE,
+            dedup_tolerance_meters=osm_config.DEDUP_TOLERANCE_METERS,
+        )
 
-        return cls(countries=countries, place=osm_config.PLACE, tags=osm_config.TAGS)
+    @staticmethod
+    def _response_cache_from_config(osm_config: OSMConfig) -> Optional[OverpassResponseCache]:
+        if not osm_config.RESPONSE_CACHE_PATH:
+            return None
+        ttl_seconds = None
+        if osm_config.RESPONSE_CACHE_TTL_DAYS is not None:
+            ttl_seconds = osm_config.RESPONSE_CACHE_TTL_DAYS * 24 * 60 * 60
+        return OverpassResponseCache(
+            osm_config.RESPONSE_CACHE_PATH, osm_config.RESPONSE_CACHE_MAX_BYTES, ttl_seconds
+        )
 
     def execute(self, **kwargs):
+        return pd.concat(list(self.iter_execute(**kwargs)))
+
+    def iter_execute(self, **kwargs) -> Iterator[gpd.GeoDataFrame]:
+        """
+        Yields the footprints of every location as soon as they are downloaded.
+
+        The "threads" mode shares one process between at most
+        max_concurrent_locations downloads, "processes" forks a worker per core.
+        """
+        locations = kwargs.get("list_of_points", self.countries)
         print(f"Downloading {self.tags} for {self.place}")
-        building_footprint_gdfs = Parallel(n_jobs=-1, backend="multiprocessing", verbose=5)(
-            delayed(self.execute_for_country)(location)
-            for location in (kwargs.get("list_of_points", self.countries))
-        )
-        return pd.concat(building_footprint_gdfs)
+        if locations and all(self._is_point(location) for location in locations):
+            self._configure_osmnx()
+            yield self.get_building_points_for_points(locations)
+            return
+
+        if self.execution_mode == "processes":
+            yield from Parallel(n_jobs=-1, backend="multiprocessing", verbose=5)(
+                delayed(self.execute_for_country)(location) for location in locations
+            )
+            return
+
+        self._configure_osmnx()
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_locations) as pool:
+            futures = [
+                pool.submit(self.get_representative_building_point, location)
+                for location in locations
+            ]
+            for future in as_completed(futures):
+                yield future.result()
 
     def execute_for_country(self, location):
-        ox.config(log_console=False, use_cache=True)
+        self._configure_osmnx()
         return self.get_representative_building_point(location)
 
+    def execute_centroids(self, **kwargs) -> pd.DataFrame:
+        """
+        Deduplicated centroid table of execute. The footprints of every location
+        are reduced to centroids as soon as iter_execute yields them, so only
+        the footprint geometries of the locations in flight are held.
+        """
+        return self._concat_centroids(
+            self.to_centroids(building_footprints)
+            for building_footprints in self.iter_execute(**kwargs)
+        )
+
+    def extract_centroids(self) -> pd.DataFrame:
+        """
+        Centroid table of the footprints in the local OSM extract at
+        extract_path, with the same columns as to_centroids. The extract is
+        read extract_chunk_size footprints at a time and only their centroids
+        are kept.
+        """
+        logging.info(f"Reading {self.tags} from {self.extract_path}")
+        centroid_chunks = []
+        for building_footprints in iter_extract_footprints(
+            self.extract_path, self.tags, self.centroid_tags, self.extract_chunk_size
+        ):
+            building_footprints["centroid_geometry"] = representative_points(
+                building_footprints.geometry
+            )
+            centroid_chunks.append(self.to_centroids(building_footprints))
+        return self._concat_centroids(centroid_chunks)
+
+    def _concat_centroids(self, centroid_chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+        centroid_chunks = list(centroid_chunks)
+        if not centroid_chunks:
+            building_footprints = gpd.GeoDataFrame(geometry=[], crs="epsg:4326")
+            building_footprints["centroid_geometry"] = building_footprints.geometry
+            return self.to_centroids(building_footprints)
+
+        centroids = self.deduplicate(pd.concat(centroid_chunks, ignore_index=True))
+        return centroids.astype({"osm_type": "category"})
+
+    def refresh(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Incremental execute over tile snapshots, returning the centroids of
+        every country and the centroids added, removed or moved since the
+        previous refresh.
+        """
+        self._configure_osmnx()
+        refreshed = [self.refresh_for_country(location) for location in self.countries]
+        if not refreshed:
+            return pd.DataFrame(), pd.DataFrame()
+        centroids, diffs = zip(*refreshed)
+        # Buildings of overlapping countries are in the snapshots of each of them.
+        diff = pd.concat(diffs, ignore_index=True).drop_duplicates(ignore_index=True)
+        return self.deduplicate(pd.concat(centroids, ignore_index=True)), diff
+
+    def refresh_for_country(self, location) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Downloads only the tiles whose snapshot is older than
+        snapshot_max_age_days. Tiles whose content hash is unchanged keep their
+        snapshot.
+        """
+        name = location[0] if self.tile_area == "bbox" else self.place
+        store = TileSnapshotStore(
+            os.path.join(self.snapshot_folder, str(name)),
+            job={
+                "tags": self.tags,
+                "tile_size_degrees": self.tile_size_degrees,
+                "centroid_tags": list(self.centroid_tags),
+            },
+        )
+        previous = store.read()
+        tiles = {
+            store.tile_key(tile): tile for tile in self._get_tiles(self._get_tiling_area(location))
+        }
+        now = time.time()
+        max_age_seconds = self.snapshot_max_age_days * 24 * 60 * 60
+        stale_keys = [key for key in tiles if store.is_stale(key, max_age_seconds, now)]
+        logging.info(f"Refreshing {len(stale_keys)} of {len(tiles)} tiles for {name}")
+
+        changed_tiles = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_tiles) as pool:
+            tile_gdfs = pool.map(
+                self._get_boundaries_from_polygon, [tiles[key] for key in stale_keys]
+            )
+            for key, building_footprints in zip(stale_keys, tile_gdfs):
+                building_footprints["centroid_geometry"] = representative_points(
+                    building_footprints.geometry
+                )
+                changed_tiles += store.put(key, self.to_centroids(building_footprints), now)
+        store.retain(tiles)
+        store.save()
+
+        centroids = store.read()
+        diff = centroid_diff(previous, centroids)
+        logging.info(
+            f"{changed_tiles} tiles changed for {name}: "
+            f"{diff['change'].value_counts().to_dict()}"
+        )
+        return centroids, diff
+
+    def to_centroids(self, building_footprints: gpd.GeoDataFrame) -> pd.DataFrame:
+        """
+        Compact centroid table of the footprints. It holds the OSM element type
+        and id, the float64 lon and lat of the representative point and the
+        centroid_tags, without the footprint geometries. The columns added by
+        get_building_points_for_points are kept.
+        """
+        index = building_footprints.index
+        has_osm_index = "osmid" in index.names
+        lons, lats = points_xy(building_footprints["centroid_geometry"])
+        centroids = pd.DataFrame(
+            {
+                "osm_type": pd.Categorical(
+                    index.get_level_values("element_type") if has_osm_index else []
+                ),
+                "osm_id": np.asarray(
+                    index.get_level_values("osmid") if has_osm_index else [], dtype=np.int64
+                ),
+                "lon": lons,
+                "lat": lats,
+            }
+        )
+        for tag in self.centroid_tags:
+            if tag in building_footprints:
+                values = building_footprints[tag].astype("string")
+            else:
+                values = pd.Series(pd.NA, index=building_footprints.index, dtype="string")
+            centroids[tag] = values.array
+        for column in ("point_index", "point_latitude", "point_longitude"):
+            if column in building_footprints:
+                centroids[column] = building_footprints[column].to_numpy()
+        return centroids
+
+    def deduplicate(self, centroids: pd.DataFrame) -> pd.DataFrame:
+        """
+        Drops the centroids repeated by overlapping countries or tiles: rows of
+        the same OSM element and, unless they belong to points of
+        get_building_points_for_points, centroids of other elements closer than
+        dedup_tolerance_meters, such as a building mapped twice.
+        """
+        has_points = "point_index" in centroids
+        keys = ["osm_type", "osm_id"] + (["point_index"] if has_points else [])
+        centroids = centroids.drop_duplicates(keys, ignore_index=True)
+        if has_points or not self.dedup_tolerance_meters:
+            return centroids
+        store = CentroidStore(centroids)
+        return store.deduplicate(self.dedup_tolerance_meters).reset_index(drop=True)
+
+    @staticmethod
+    def write_centroids(centroids: pd.DataFrame, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a partial file.
+        centroids.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+
+    def _configure_osmnx(self):
+        ox.settings.log_console = False
+        ox.settings.use_cache = True
+        if self.response_cache is not None:
+            self.response_cache.install()
+
+    def _query_overpass(self, query: Callable[..., gpd.GeoDataFrame], *args) -> gpd.GeoDataFrame:
+        limiter = get_endpoint_limiter(
+            ox.settings.overpass_endpoint,
+            self.overpass_max_in_flight,
+            self.overpass_requests_per_second,
+        )
+        with limiter.slot():
+            return query(*args)
+
     def _get_boundaries_from_place(self) -> gpd.GeoDataFrame:
-        return ox.geometries.geometries_from_place(self.place, self.tags)
+        return self._query_overpass(ox.geometries.geometries_from_place, self.place, self.tags)
+
+    def _get_boundaries_from_tiles(self, location) -> gpd.GeoDataFrame:
+        """
+        Downloads the footprints of the place polygon, or of the country bounding
+        box, as a grid of tiles queried concurrently, dropping the footprints
+        returned by more than one tile.
+        """
+        tiles = self._get_tiles(self._get_tiling_area(location))
+        logging.info(f"Downloading {self.tags} for {len(tiles)} tiles")
+        return self._get_boundaries_from_polygons(tiles, self.max_concurrent_tiles)
+
+    def _get_boundaries_from_polygons(self, polygons, max_workers: int) -> gpd.GeoDataFrame:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            gdfs = [
+                gdf for gdf in pool.map(self._get_boundaries_from_polygon, polygons) if len(gdf)
+            ]
+        if not gdfs:
+            return gpd.GeoDataFrame(geometry=[], crs="epsg:4326")
+        building_footprints = pd.concat(gdfs)
+        return building_footprints[~building_footprints.index.duplicated()]
+
+    def _get_boundaries_from_polygon(self, polygon) -> gpd.GeoDataFrame:
+        try:
+            return self._query_overpass(ox.geometries.geometries_from_polygon, polygon, self.tags)
+        except EmptyOverpassResponse:
+            return gpd.GeoDataFrame(geometry=[], crs="epsg:4326")
+
+    def _get_tiling_area(self, location):
+        if self.tile_area == "bbox":
+            return box(*location[1])
+        return ox.geocode_to_gdf(self.place).unary_union
+
+    def _get_tiles(self, area) -> List[Any]:
+        min_x, min_y, max_x, max_y = area.bounds
+        xs = min_x + self.tile_size_degrees * np.arange(
+            max(1, int(np.ceil((max_x - min_x) / self.tile_size_degrees)))
+        )
+        ys = min_y + self.tile_size_degrees * np.arange(
+            max(1, int(np.ceil((max_y - min_y) / self.tile_size_degrees)))
+        )
+        tiles = []
+        for x in xs:
+            for y in ys:
+                tile = box(x, y, x + self.tile_size_degrees, y + self.tile_size_degrees)
+                tile = tile.intersection(area)
+                # Tiles only touching the area along an edge have nothing to download.
+                if tile.area > 0:
+                    tiles.append(tile)
+        return tiles
+
+    def get_building_points_for_points(self, points: Sequence) -> gpd.GeoDataFrame:
+        """
+        Downloads the footprints within point_radius_meters of every (lat, lon)
+        point. Overlapping search boxes are merged so each area is queried once,
+        and every footprint is joined back to each point whose box it intersects,
+        giving one row per footprint and point.
+        """
+        search_boxes = self._get_search_boxes(points)
+        areas = unary_union(list(search_boxes.geometry))
+        areas = list(getattr(areas, "geoms", [areas]))
+        logging.info(f"Downloading {self.tags} for {len(points)} points in {len(areas)} queries")
+        building_footprints = self._get_boundaries_from_polygons(
+            areas, self.max_concurrent_locations
+        )
+        building_footprints["centroid_geometry"] = representative_points(
+            building_footprints.geometry
+        )
+
+        index_names = building_footprints.index.names
+        building_footprints = gpd.sjoin(
+            building_footprints.reset_index(), search_boxes, how="inner", predicate="intersects"
+        )
+        building_footprints = building_footprints.rename(columns={"index_right": "point_index"})
+        if all(index_names):
+            building_footprints = building_footprints.set_index(index_names)
+        return building_footprints
+
+    def _get_search_boxes(self, points: Sequence) -> gpd.GeoDataFrame:
+        latitudes, longitudes = np.asarray(points, dtype=np.float64).reshape(-1, 2).T
+        delta_lat = self.point_radius_meters / METERS_PER_DEGREE
+        delta_lon = delta_lat / np.cos(np.radians(latitudes))
+        return gpd.GeoDataFrame(
+            {"point_latitude": latitudes, "point_longitude": longitudes},
+            geometry=[
+                box(lon - d_lon, lat - delta_lat, lon + d_lon, lat + delta_lat)
+                for lat, lon, d_lon in zip(latitudes, longitudes, delta_lon)
+            ],
+            crs="epsg:4326",
+        )
+
+    @staticmethod
+    def _is_point(location) -> bool:
+        """Points are (lat, lon) pairs, countries are (code, bounding box) pairs."""
+        return (
+            isinstance(location, (tuple, list))
+            and len(location) == 2
+            and all(isinstance(value, (int, float, np.number)) for value in location)
+        )
 
     def get_representative_building_point(self, location) -> gpd.GeoDataFrame:
-        if type(location) is Tuple:
-            building_footprints = ox.geometries.geometries_from_point(location, self.tags, 1000)
-            building_footprints["centroid_geometry"] = building_footprints.representative_point()
+        if self._is_point(location):
+            building_footprints = self._query_overpass(
+                ox.geometries.geometries_from_point,
+                tuple(location),
+                self.tags,
+                self.point_radius_meters,
+            )
+            building_footprints["centroid_geometry"] = representative_points(
+                building_footprints.geometry
+            )
+
+        elif self.tile_size_degrees:
+            building_footprints = self._get_boundaries_from_tiles(location)
+
+            building_footprints["centroid_geometry"] = representative_points(
+                building_footprints.geometry
+            )
 
         else:
             building_footprints = self._get_boundaries_from_place()
 
-            building_footprints["centroid_geometry"] = building_footprints.representative_point()
+            building_footprints["centroid_geometry"] = representative_points(
+                building_footprints.geometry
+            )
         return building_footprints
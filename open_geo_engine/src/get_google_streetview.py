@@ -1,4 +1,8 @@
+import json
+import logging
+import os
 from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
 import google_streetview.api
 import google_streetview.helpers
@@ -6,7 +10,30 @@ import pandas as pd
 import requests
 
 from open_geo_engine.config.model_settings import StreetViewConfig
-from open_geo_engine.utils.utils import write_csv
+from open_geo_engine.utils.geometry import location_key
+from open_geo_engine.utils.streetview_downloader import (
+    DOWNLOADED,
+    EXISTS,
+    FAILED,
+    StreetViewDownloader,
+)
+from open_geo_engine.utils.streetview_image_store import StreetViewImageStore
+from open_geo_engine.utils.streetview_metadata_cache import StreetViewMetadataCache
+from open_geo_engine.utils.utils import chunked, write_csv
+
+# Statuses of the locations without an image to download.
+NO_COVERAGE = "no_coverage"
+LOOKUP_FAILED = "lookup_failed"
+RESULT_COLUMNS = [
+    "request_key",
+    "latitude",
+    "longitude",
+    "pano_id",
+    "metadata",
+    "URL",
+    "image_file",
+    "status",
+]
 
 
 class GetGoogleStreetView:
@@ -21,6 +48,12 @@ class GetGoogleStreetView:
         metadata_file: str,
         place: str,
         meta_base: str,
+        downloader: Optional[StreetViewDownloader] = None,
+        metadata_cache: Optional[StreetViewMetadataCache] = None,
+        metadata_first: bool = False,
+        image_base: str = "https://maps.googleapis.com/maps/api/streetview",
+        request_chunk_size: int = 1000,
+        image_store: Optional[StreetViewImageStore] = None,
     ):
         self.size = size
         self.heading = heading
@@ -31,6 +64,12 @@ class GetGoogleStreetView:
         self.metadata_file = metadata_file
         self.place = place
         self.meta_base = meta_base
+        self.downloader = downloader or StreetViewDownloader()
+        self.metadata_cache = metadata_cache
+        self.metadata_first = metadata_first
+        self.image_base = image_base
+        self.request_chunk_size = request_chunk_size
+        self.image_store = image_store
 
     @classmethod
     def from_dataclass_config(cls, streetview_config: StreetViewConfig) -> "GetGoogleStreetView":
@@ -51,63 +90,374 @@ class GetGoogleStreetView:
             ),
             place=streetview_config.PLACE,
             meta_base=streetview_config.META_BASE,
+            downloader=StreetViewDownloader(
+                max_concurrent=streetview_config.DOWNLOAD_MAX_CONCURRENT,
+                max_retries=streetview_config.DOWNLOAD_MAX_RETRIES,
+                backoff_seconds=streetview_config.DOWNLOAD_BACKOFF_SECONDS,
+                timeout_seconds=streetview_config.DOWNLOAD_TIMEOUT_SECONDS,
+            ),
+            metadata_cache=cls._metadata_cache_from_config(streetview_config),
+            metadata_first=streetview_config.METADATA_FIRST,
+            image_base=streetview_config.IMAGE_BASE,
+            request_chunk_size=streetview_config.REQUEST_CHUNK_SIZE,
+            image_store=cls._image_store_from_config(streetview_config),
         )
 
-    def execute_for_df(self, satellite_data_df):
-        lat_lon_str = self.generate_lat_lon_string(satellite_data_df)
-        params = self._generate_params(lat_lon_str)
-        results = self.get_google_streetview(google_streetview.helpers.api_list(params))
-        self.save_streetview_information(results)
+    @staticmethod
+    def _metadata_cache_from_config(
+        streetview_config: StreetViewConfig,
+    ) -> Optional[StreetViewMetadataCache]:
+        if not streetview_config.METADATA_CACHE_PATH:
+            return None
+        ttl_seconds = None
+        if streetview_config.METADATA_CACHE_TTL_DAYS is not None:
+            ttl_seconds = streetview_config.METADATA_CACHE_TTL_DAYS * 24 * 60 * 60
+        return StreetViewMetadataCache(streetview_config.METADATA_CACHE_PATH, ttl_seconds)
 
-        satellite_streetview_data_df = self.add_links_to_satellite_df(satellite_data_df)
-
-        satellite_streetview_metadata_df = self.add_metadata_to_satellite_df(
-            satellite_streetview_data_df
+    @staticmethod
+    def _image_store_from_config(
+        streetview_config: StreetViewConfig,
+    ) -> Optional[StreetViewImageStore]:
+        if not streetview_config.IMAGE_STORE:
+            return None
+        return StreetViewImageStore(
+            streetview_config.LOCAL_IMAGE_FOLDER, streetview_config.IMAGE_STORE_INDEX_PATH
         )
 
+    def execute_for_df(self, satellite_data_df):
+        if self.metadata_first:
+            satellite_streetview_metadata_df = self.add_panoramas_to_satellite_df(satellite_data_df)
+        else:
+            satellite_streetview_data_df = self.add_links_to_satellite_df(
+                satellite_data_df, self.download_locations(satellite_data_df)
+            )
+
+            satellite_streetview_metadata_df = self.add_metadata_to_satellite_df(
+                satellite_streetview_data_df
+            )
+
         write_csv(
             satellite_streetview_metadata_df,
             f"{Path(__file__).resolve().parent.parent.parent}/local_data/{self.place}.csv",
         )
 
+    def add_panoramas_to_satellite_df(self, satellite_data_df):
+        """
+        Adds the pano_id, metadata, URL, image_file and status of
+        download_panoramas to every row, the image_file of rows without an
+        image is missing.
+        """
+        streetview_results = self.download_panoramas(satellite_data_df)
+        satellite_data_df["lat_lon_str"] = self._join_lat_lon(satellite_data_df)
+        return self.join_streetview_results(satellite_data_df, streetview_results)
+
+    def download_panoramas(self, satellite_data_df) -> pd.DataFrame:
+        """
+        Looks the metadata of the distinct locations up before downloading
+        anything, then downloads one image per panorama the locations with
+        coverage snap to, one chunk of plan_requests at a time.
+
+        Returns a table with a row per location: its request_key, latitude,
+        longitude, pano_id, metadata JSON, URL, image_file and the status of
+        its image, "no_coverage" or "lookup_failed".
+        """
+        metadata: Dict[str, Optional[Dict[str, Any]]] = {}
+        # image_file and download status of every panorama requested so far.
+        panoramas: Dict[str, Tuple[Optional[str], str]] = {}
+        tables = []
+        for locations in self.plan_requests(satellite_data_df):
+            chunk_metadata = self.get_metadata(locations["lat_lon_str"])
+            metadata.update(chunk_metadata)
+            pano_ids, _ = self.snap_to_panoramas(chunk_metadata)
+            new_panoramas = [
+                pano_id for pano_id in dict.fromkeys(pano_ids.values()) if pano_id not in panoramas
+            ]
+            paths, statuses = self._download_images(
+                [self._image_url(pano_id, self.key) for pano_id in new_panoramas],
+                [f"pano_{pano_id}.jpg" for pano_id in new_panoramas],
+                new_panoramas,
+                self.heading,
+            )
+            for pano_id, path, status in zip(new_panoramas, paths, statuses):
+                panoramas[pano_id] = (None if status == FAILED else path, status)
+            tables.append(self._panorama_results(locations, chunk_metadata, pano_ids, panoramas))
+
+        _, counts = self.snap_to_panoramas(metadata)
+        statuses = [status for _, status in panoramas.values()]
+        counts.update({status: statuses.count(status) for status in (DOWNLOADED, EXISTS, FAILED)})
+        logging.info(f"Street View metadata-first download: {counts}")
+        if not tables:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+        return pd.concat(tables, ignore_index=True)
+
+    def download_locations(self, satellite_data_df) -> pd.DataFrame:
+        """
+        Requests the distinct locations from google_streetview one chunk of
+        plan_requests at a time, downloading the image of every location with
+        coverage, then saves the links and metadata of every chunk together.
+
+        Returns the table of download_panoramas.
+        """
+        tables, chunk_results = [], []
+        first_position = 0
+        for locations in self.plan_requests(satellite_data_df):
+            params = self._generate_params(";".join(locations["lat_lon_str"]))
+            results = self.get_google_streetview(google_streetview.helpers.api_list(params))
+            statuses = self.download_images(results, first_position)
+            first_position += len(results.metadata)
+            tables.append(self._results_table(locations, results, statuses))
+            chunk_results.append(results)
+        if not tables:
+            return pd.DataFrame(columns=RESULT_COLUMNS)
+        self.save_streetview_information(self._merge_results(chunk_results))
+        return pd.concat(tables, ignore_index=True)
+
+    @staticmethod
+    def _merge_results(chunk_results):
+        """The google_streetview results of every chunk as those of a single request."""
+        results = chunk_results[0]
+        for other in chunk_results[1:]:
+            results.params = results.params + other.params
+            results.links = results.links + other.links
+            results.metadata = results.metadata + other.metadata
+        return results
+
+    def _panorama_results(self, locations, metadata, pano_ids, panoramas) -> pd.DataFrame:
+        rows = []
+        for location in locations["lat_lon_str"]:
+            location_metadata = metadata.get(location)
+            pano_id = pano_ids.get(location)
+            if pano_id is not None:
+                image_file, status = panoramas[pano_id]
+                # Links are written without the API key.
+                url = self._image_url(pano_id)
+            else:
+                image_file, url = None, None
+                status = LOOKUP_FAILED if location_metadata is None else NO_COVERAGE
+            metadata_json = json.dumps(location_metadata) if location_metadata is not None else None
+            rows.append((pano_id, metadata_json, url, image_file, status))
+        results = pd.DataFrame(rows, columns=RESULT_COLUMNS[3:])
+        results.insert(
+            0, "request_key", location_key(locations["latitude"], locations["longitude"])
+        )
+        results.insert(1, "latitude", locations["latitude"].to_numpy())
+        results.insert(2, "longitude", locations["longitude"].to_numpy())
+        return results
+
+    def join_streetview_results(
+        self, satellite_data_df, streetview_results, columns: Optional[Sequence[str]] = None
+    ):
+        """
+        Adds the columns of the Street View result of the location of every
+        row, matched on the exact location_key of its coordinates. Rows
+        without a result keep missing values.
+        """
+        streetview_results = streetview_results.drop_duplicates("request_key").set_index(
+            "request_key"
+        )
+        if columns is None:
+            columns = [
+                column
+                for column in streetview_results.columns
+                if column not in ("latitude", "longitude")
+            ]
+        keys = location_key(satellite_data_df["latitude"], satellite_data_df["longitude"])
+        for column in columns:
+            satellite_data_df[column] = streetview_results[column].reindex(keys).to_numpy()
+        return satellite_data_df
+
+    def plan_requests(self, satellite_data_df) -> Iterator[pd.DataFrame]:
+        """
+        Yields the distinct locations of satellite_data_df with their
+        lat_lon_str, in chunks of at most request_chunk_size. Locations with
+        missing or out of range coordinates are skipped instead of failing
+        their chunk.
+        """
+        locations = satellite_data_df[["latitude", "longitude"]].drop_duplicates()
+        valid = pd.to_numeric(locations["latitude"], errors="coerce").between(-90, 90) & (
+            pd.to_numeric(locations["longitude"], errors="coerce").between(-180, 180)
+        )
+        if not valid.all():
+            logging.warning(f"Skipping {(~valid).sum()} locations with invalid coordinates")
+        for chunk in chunked(locations[valid], self.request_chunk_size):
+            yield chunk.assign(lat_lon_str=self._join_lat_lon(chunk))
+
+    @staticmethod
+    def snap_to_panoramas(
+        metadata: Dict[str, Optional[Dict[str, Any]]]
+    ) -> Tuple[Dict[str, str], Dict[str, int]]:
+        """
+        The pano_id of every location with Street View coverage, and how many
+        locations were looked up, failed, had no coverage, and shared a
+        panorama with another location.
+        """
+        pano_ids = {
+            location: location_metadata["pano_id"]
+            for location, location_metadata in metadata.items()
+            if location_metadata is not None
+            and location_metadata.get("status") == "OK"
+            and location_metadata.get("pano_id")
+        }
+        failed_lookups = sum(location_metadata is None for location_metadata in metadata.values())
+        counts = {
+            "locations": len(metadata),
+            "failed_lookups": failed_lookups,
+            "no_coverage": len(metadata) - failed_lookups - len(pano_ids),
+            "panoramas": len(set(pano_ids.values())),
+            "deduplicated": len(pano_ids) - len(set(pano_ids.values())),
+        }
+        return pano_ids, counts
+
+    def _image_url(self, pano_id: str, key: Optional[str] = None) -> str:
+        params = {"size": self.size, "pano": pano_id, "heading": self.heading, "pitch": self.pitch}
+        if key is not None:
+            params["key"] = key
+        return requests.Request("GET", self.image_base, params=params).prepare().url
+
     def generate_lat_lon_string(self, satellite_data_df):
-        satellite_lat_lon_unique = satellite_data_df[["latitude", "longitude"]].drop_duplicates()
-        satellite_lat_lon_unique["lat_lon_str"] = self._join_lat_lon(satellite_lat_lon_unique)
-        return ";".join(satellite_lat_lon_unique["lat_lon_str"])
+        # Joins every distinct location, requests are sent in plan_requests chunks.
+        return ";".join(
+            self._join_lat_lon(satellite_data_df[["latitude", "longitude"]].drop_duplicates())
+        )
 
     def get_google_streetview(self, params):
         return google_streetview.api.results(params)
 
     def save_streetview_information(self, results):
-        results.download_links(self.image_folder)
         results.save_links(f"{self.links_file}")
         results.save_metadata(f"{self.metadata_file}")
+        results.save_metadata(os.path.join(self.image_folder, "metadata.json"))
 
-    def add_links_to_satellite_df(self, satellite_data_df):
-        satellite_data_df["lat_lon_str"] = self._join_lat_lon(satellite_data_df)
-        street_view_links_df = pd.read_csv(
-            f"{self.links_file}",
-            lineterminator="\n",
-            names=["URL"],
+    def download_images(self, results, first_position: int = 0):
+        """
+        Downloads the image of every location with Street View coverage to
+        image_folder/gsv_<position>.jpg, or to the image store keyed on its
+        location, like results.download_links but concurrently and skipping
+        the images already downloaded. Positions of a later chunk start at
+        first_position. Returns the status of every location.
+        """
+        os.makedirs(self.image_folder, exist_ok=True)
+        positions = [
+            position
+            for position, metadata in enumerate(results.metadata)
+            if metadata.get("status") == "OK"
+        ]
+        paths, statuses = self._download_images(
+            [results.links[position] for position in positions],
+            [f"gsv_{first_position + position}.jpg" for position in positions],
+            [results.params[position]["location"] for position in positions]
+            if self.image_store is not None
+            else [],
+        )
+        location_statuses = [NO_COVERAGE] * len(results.metadata)
+        for position, path, status in zip(positions, paths, statuses):
+            location_statuses[position] = status
+            if status != FAILED:
+                results.metadata[position]["_file"] = os.path.relpath(path, self.image_folder)
+        return location_statuses
+
+    def _download_images(
+        self,
+        urls: Sequence[str],
+        names: Sequence[str],
+        subjects: Sequence[str],
+        heading: Optional[str] = None,
+    ) -> Tuple[List[str], List[str]]:
+        """
+        The path and download status of every url. Without an image store the
+        images are saved as image_folder/<name>, with one they are stored once
+        per key of their subject, a pano_id or location, and the keys already
+        in the store are not requested again.
+        """
+        if self.image_store is None:
+            paths = [os.path.join(self.image_folder, name) for name in names]
+            return paths, self.downloader.download_many(urls, paths)
+
+        keys = [
+            self.image_store.key(subject, self.size, heading, self.pitch) for subject in subjects
+        ]
+        stored = self.image_store.has_many(keys)
+        # Locations showing the same image are downloaded once.
+        missing = {key: url for key, url in zip(keys, urls) if key not in stored}
+        downloaded = dict(
+            zip(
+                missing,
+                self.downloader.download_many(
+                    list(missing.values()), [self.image_store.path(key) for key in missing]
+                ),
+            )
         )
-        street_view_links_df["latitude"] = street_view_links_df["URL"].str.extract(
-            "location=(.*)%2C"
+        subject_of = dict(zip(keys, subjects))
+        self.image_store.add_many(
+            (key, subject_of[key]) for key, status in downloaded.items() if status != FAILED
+        )
+        logging.info(f"Street View image store: {self.image_store.stats()}")
+        return [self.image_store.path(key) for key in keys], [
+            downloaded.get(key, EXISTS) for key in keys
+        ]
+
+    def _results_table(self, locations, results, statuses) -> pd.DataFrame:
+        """The table of download_panoramas for the results of google_streetview."""
+        return pd.DataFrame(
+            {
+                "request_key": location_key(locations["latitude"], locations["longitude"]),
+                "latitude": locations["latitude"].to_numpy(),
+                "longitude": locations["longitude"].to_numpy(),
+                "pano_id": [metadata.get("pano_id") for metadata in results.metadata],
+                "metadata": [json.dumps(metadata) for metadata in results.metadata],
+                "URL": results.links,
+                "image_file": [
+                    os.path.join(self.image_folder, metadata["_file"])
+                    if "_file" in metadata
+                    else None
+                    for metadata in results.metadata
+                ],
+                "status": statuses,
+            },
+            columns=RESULT_COLUMNS,
         )
-        street_view_links_df["longitude"] = street_view_links_df["URL"].str.extract("%2C(.*)&pitch")
-        street_view_links_df[["latitude", "longitude"]] = street_view_links_df[
-            ["latitude", "longitude"]
-        ].apply(pd.to_numeric, errors="coerce")
-        return satellite_data_df.merge(street_view_links_df, on=["latitude", "longitude"])
+
+    def add_links_to_satellite_df(self, satellite_data_df, streetview_results):
+        """Adds the image URL of every row from the Street View results."""
+        satellite_data_df["lat_lon_str"] = self._join_lat_lon(satellite_data_df)
+        return self.join_streetview_results(satellite_data_df, streetview_results, ["URL"])
 
     def add_metadata_to_satellite_df(self, satellite_data_df):
-        for lat_lon in satellite_data_df["lat_lon_str"]:
-            meta_params = {"key": self.key, "location": lat_lon}
-            satellite_data_df["metadata"] = str(requests.get(self.meta_base, params=meta_params))
+        """
+        Adds the Street View metadata of the location of every row as a JSON
+        string, looking each distinct location up once.
+        """
+        metadata = self.get_metadata(satellite_data_df["lat_lon_str"].unique())
+        metadata_json = {
+            location: json.dumps(location_metadata)
+            for location, location_metadata in metadata.items()
+            if location_metadata is not None
+        }
+        satellite_data_df["metadata"] = satellite_data_df["lat_lon_str"].map(metadata_json)
         return satellite_data_df
 
+    def get_metadata(self, locations) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Parsed metadata of every "lat,lon" location, from the metadata cache
+        or looked up concurrently. Failed lookups are None.
+        """
+        locations = list(dict.fromkeys(locations))
+        metadata = self.metadata_cache.get_many(locations) if self.metadata_cache else {}
+        missing = [location for location in locations if location not in metadata]
+        fetched = self.downloader.get_json_many(
+            self.meta_base, [{"key": self.key, "location": location} for location in missing]
+        )
+        if self.metadata_cache is not None:
+            self.metadata_cache.put_many(zip(missing, fetched))
+            logging.info(f"Street View metadata cache: {self.metadata_cache.stats()}")
+        metadata.update(zip(missing, fetched))
+        return metadata
+
     def _join_lat_lon(self, satellite_data_df):
-        return satellite_data_df[["latitude", "longitude"]].apply(
-            lambda x: ",".join(x.astype(str)), axis=1
+        return (
+            satellite_data_df["latitude"].astype(str)
+            + ","
+            + satellite_data_df["longitude"].astype(str)
         )
 
     def _generate_params(self, lat_lon_str):
@@ -1,20 +1,42 @@
 import datetime
-from typing import Any, Sequence, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 import logging
 
 import ee
 import geemap
 import pandas as pd
-import shapely
+import pyarrow.parquet as pq
 from ee.ee_exception import EEException
 from googleapiclient.errors import HttpError
 from joblib import Parallel, delayed
 
 from open_geo_engine.config.model_settings import DataConfig
-from open_geo_engine.utils.utils import ee_array_to_df
+from open_geo_engine.utils.centroid_store import CentroidStore, country_boxes
+from open_geo_engine.utils.ee_request_executor import EERequestExecutor, is_quota_error
+from open_geo_engine.utils.ee_sample_cache import EESampleCache
+from open_geo_engine.utils.geometry import location_key, points_xy, wkt_points_xy
+from open_geo_engine.utils.parquet_writer import StreamingParquetWriter
+from open_geo_engine.utils.spatial_partition import chunk_locality, spatial_order, tile_degrees
+from open_geo_engine.utils.utils import chunked
+
+REGION_HEADER = ["id", "longitude", "latitude", "time"]
+
+AGGREGATION_BIN_DAYS = {"daily": 1, "weekly": 7}
+
+# Earth Engine error messages raised when a request returns or accumulates too
+# much data, these are retried with a smaller chunk of points.
+PAYLOAD_TOO_LARGE_ERRORS = (
+    "payload size exceeds",
+    "accumulating over",
+    "memory limit exceeded",
+    "computation timed out",
+)
 
 
 class LoadEEData:
+    # Sampled rows missing "any" band are dropped, like in ee_array_to_df.
+    dropna_how = "any"
+
     def __init__(
         self,
         countries: Sequence,
@@ -29,6 +51,21 @@ class LoadEEData:
         folder: str,
         image_folder: str,
         model_name: str,
+        sample_mode: str = "batch",
+        sample_chunk_size: int = 250,
+        sample_scale: int = 10,
+        sample_max_splits: int = 4,
+        filepath: Optional[str] = None,
+        executor: Optional[EERequestExecutor] = None,
+        cache: Optional[EESampleCache] = None,
+        output_folder: str = "local_data/gee_data",
+        flush_points: int = 1000,
+        aggregation_reducers: Sequence[str] = (),
+        aggregation_bin: Optional[str] = None,
+        date_shard_days: Optional[int] = None,
+        sample_max_retries: int = 2,
+        spatial_order: bool = True,
+        clip_to_country: bool = False,
         **kwargs,
     ):
         self.countries = countries
@@ -43,16 +80,30 @@ class LoadEEData:
         self.folder = folder
         self.image_folder = image_folder
         self.model_name = model_name
+        self.sample_mode = sample_mode
+        self.sample_chunk_size = sample_chunk_size
+        self.sample_scale = sample_scale
+        self.sample_max_splits = sample_max_splits
+        self.filepath = filepath
+        self.executor = executor or EERequestExecutor()
+        self.cache = cache
+        self.output_folder = output_folder
+        self.flush_points = flush_points
+        self.aggregation_reducers = list(aggregation_reducers)
+        self.aggregation_bin = aggregation_bin
+        self.date_shard_days = date_shard_days
+        self.sample_max_retries = sample_max_retries
+        self.spatial_order = spatial_order
+        self.clip_to_country = clip_to_country
 
     @classmethod
     def from_dataclass_config(cls, config: DataConfig) -> "LoadEEData":
-        countries = []
-        for country in config.COUNTRY_CODES:
-            country_info = config.COUNTRY_BOUNDING_BOXES.get(country, "WO")
-            countries.append(country_info)
+        return cls(**cls._kwargs_from_config(config))
 
-        return cls(
-            countries=countries,
+    @classmethod
+    def _kwargs_from_config(cls, config: DataConfig) -> Dict[str, Any]:
+        return dict(
+            countries=country_boxes(config.COUNTRY_CODES, config.COUNTRY_BOUNDING_BOXES),
             year=config.YEAR,
             mon_start=config.MON_START,
             date_start=config.DATE_START,
@@ -64,15 +115,43 @@ class LoadEEData:
             folder=config.BASE_FOLDER,
             image_folder=config.IMAGE_FOLDER,
             model_name=config.MODEL_NAME,
+            sample_mode=config.SAMPLE_MODE,
+            sample_chunk_size=config.SAMPLE_CHUNK_SIZE,
+            sample_scale=config.SAMPLE_SCALE,
+            sample_max_splits=config.SAMPLE_MAX_SPLITS,
+            executor=EERequestExecutor(
+                max_in_flight_per_country=config.EE_MAX_IN_FLIGHT_PER_COUNTRY,
+                max_in_flight=config.EE_MAX_IN_FLIGHT,
+                max_retries=config.EE_QUOTA_MAX_RETRIES,
+                backoff_seconds=config.EE_QUOTA_BACKOFF_SECONDS,
+            ),
+            cache=EESampleCache(
+                config.SAMPLE_CACHE_PATH,
+                max_bytes=config.SAMPLE_CACHE_MAX_BYTES,
+                precision=config.SAMPLE_CACHE_PRECISION,
+            )
+            if config.SAMPLE_CACHE_PATH
+            else None,
+            output_folder=config.OUTPUT_FOLDER,
+            flush_points=config.OUTPUT_FLUSH_POINTS,
+            aggregation_reducers=config.AGGREGATION_REDUCERS,
+            aggregation_bin=config.AGGREGATION_BIN,
+            date_shard_days=config.DATE_SHARD_DAYS,
+            sample_max_retries=config.SAMPLE_MAX_RETRIES,
+            spatial_order=config.SAMPLE_SPATIAL_ORDER,
+            clip_to_country=config.CLIP_LOCATIONS_TO_COUNTRY,
             place=config.PLACE,
         )
 
     def execute(self, save_images):
-        Parallel(n_jobs=-1, backend="multiprocessing", verbose=5)(
-            delayed(self.execute_for_country)(country, save_images) for country in self.countries
+        # Countries share the executor's global cap on in-flight requests, so
+        # they run as threads of a single process.
+        Parallel(n_jobs=-1, backend="threading", verbose=5)(
+            delayed(self.execute_for_country)(country, save_images, load_results=False)
+            for country in self.countries
         )
 
-    def execute_for_country(self, country, save_images):
+    def execute_for_country(self, country, save_images, load_results=True):
         logging.info(f"Downloading {self.model_name} data for {country[0]}")
         ee.Initialize()
         coords_tup = country[1]
@@ -84,38 +163,156 @@ class LoadEEData:
         s_date = s_datetime.date()
         e_date = e_datetime.date()
 
-        collection = (
-            ee.ImageCollection(self.image_collection)
-            .filterBounds(geom)
-            .filterDate(str(s_date), str(e_date))
-            .select(self.image_band)
-        )
+        collection = self._build_collection(geom, s_date, e_date)
 
         if save_images:
             self.save_images_to_drive(collection, s_datetime, e_datetime, country)
 
+        if self.aggregation_reducers:
+            collection = self._aggregate_collection(collection, s_datetime, e_datetime)
+
         if self.filepath:
-            locations_gdf = pd.read_csv(self.filepath)
-            # locations_gdf = self._get_xy(locations_gdf)
-            locations_ee_list = []
-            for lon, lat in zip(locations_gdf.x, locations_gdf.y):
-                centroid_point = ee.Geometry.Point(lon, lat)
-                satellite_centroid_point = self._get_centroid_value_from_collection(
-                    collection, centroid_point
-                )
-                try:
-                    ee_df = ee_array_to_df(satellite_centroid_point, self.image_band)
-                    if not ee_df.empty:
-                        locations_ee_list.append(ee_df)
-                except IndexError:
-                    pass
-            if len(self.countries) == 1:
-
-                locations_ee_df = pd.concat(locations_ee_list)
-                locations_ee_df.to_csv(f"local_data/gee_data/{country[0]}_{self.model_name}.csv")
-                return locations_ee_df
+            locations_gdf = self._read_locations(self.filepath)
+            if self.clip_to_country:
+                locations_gdf = self._locations_in_country(locations_gdf, country)
+            # Points are keyed on their exact location, so the results of a
+            # centroid survive runs over other tables, such as refresh diffs.
+            point_ids = pd.Series(
+                location_key(locations_gdf.y, locations_gdf.x), index=locations_gdf.index
+            )
+            writer = StreamingParquetWriter(
+                f"{self.output_folder}/{country[0]}_{self.model_name}",
+                self.output_bands,
+                flush_points=self.flush_points,
+                job=self._describe_job(country),
+                how=self.dropna_how,
+            )
+            stale_locations = self._read_stale_locations(self.filepath)
+            if stale_locations is None:
+                # A full centroid table replaces the centroids written before.
+                stale_point_ids = writer.completed_point_ids - set(point_ids)
             else:
-                return pd.concat(locations_ee_list)
+                stale_point_ids = set(location_key(stale_locations.y, stale_locations.x))
+            discarded = writer.discard(stale_point_ids)
+            completed_point_ids = writer.completed_point_ids
+            remaining = ~point_ids.isin(list(completed_point_ids)) & ~point_ids.duplicated()
+            remaining_gdf = locations_gdf[remaining]
+            logging.info(
+                f"Skipping {len(locations_gdf) - len(remaining_gdf)} centroids already written "
+                f"and discarding {discarded} stale ones for {country[0]}"
+            )
+            if self.spatial_order:
+                # Nearby centroids share chunks, so each request touches few tiles.
+                remaining_gdf = remaining_gdf.iloc[spatial_order(remaining_gdf.x, remaining_gdf.y)]
+            locality = chunk_locality(
+                remaining_gdf.x,
+                remaining_gdf.y,
+                self.sample_chunk_size,
+                tile_degrees(self.sample_scale),
+            )
+            logging.info(f"Chunk locality for {country[0]}: {locality}")
+            for point_id, region_array in zip(
+                point_ids[remaining_gdf.index],
+                self._sample_points(collection, remaining_gdf.x, remaining_gdf.y),
+            ):
+                writer.add(point_id, region_array)
+            writer.close()
+            if load_results:
+                return writer.read()
+
+    def _locations_in_country(self, locations_gdf, country):
+        """
+        The locations within the bounding box of country. Locations in the
+        boxes of several countries are sampled for the first of them only.
+        """
+        store = CentroidStore(locations_gdf, x="x", y="y")
+        assigned = store.assign_countries(self.countries)
+        logging.info(
+            f"{(assigned == country[0]).sum()} of {len(locations_gdf)} centroids in {country[0]}"
+        )
+        return locations_gdf[assigned == country[0]]
+
+    @property
+    def output_bands(self) -> List[str]:
+        """Bands of the sampled collection, named <band>_<reducer> when aggregating."""
+        return self._output_bands_for(self.image_band)
+
+    def _output_bands_for(self, bands) -> List[str]:
+        if not self.aggregation_reducers:
+            return list(bands)
+        return [f"{band}_{name}" for band in bands for name in self.aggregation_reducers]
+
+    def _aggregate_collection(self, collection, s_datetime, e_datetime):
+        """
+        Reduces the collection server-side to one image per temporal bin, so
+        only one row per point and bin is transferred.
+        """
+        reducer = self._build_reducer()
+        images = []
+        for bin_start, bin_end in self._aggregation_bins(s_datetime, e_datetime):
+            image = collection.filterDate(str(bin_start.date()), str(bin_end.date())).reduce(
+                reducer
+            )
+            images.append(
+                image.set(
+                    {
+                        "system:time_start": ee.Date(str(bin_start.date())).millis(),
+                        "band_count": image.bandNames().size(),
+                    }
+                )
+            )
+        # Bins without any image reduce to an image without bands.
+        return ee.ImageCollection.fromImages(images).filter(ee.Filter.gt("band_count", 0))
+
+    def _aggregation_bins(self, s_datetime, e_datetime) -> List[Tuple[Any, Any]]:
+        if self.aggregation_bin is None:
+            return [(s_datetime, e_datetime)]
+        return self._date_windows(
+            s_datetime, e_datetime, AGGREGATION_BIN_DAYS[self.aggregation_bin]
+        )
+
+    def _date_windows(self, start, end, step) -> List[Tuple[Any, Any]]:
+        """Splits [start, end) into consecutive windows of step days."""
+        return [
+            (window_start, min(window_start + datetime.timedelta(days=step), end))
+            for window_start in self._date_range(start, end, step)
+            if window_start < end
+        ]
+
+    def _build_reducer(self):
+        reducers = [self._reducer_from_name(name) for name in self.aggregation_reducers]
+        reducer = reducers[0]
+        for other in reducers[1:]:
+            reducer = reducer.combine(other, sharedInputs=True)
+        return reducer
+
+    def _reducer_from_name(self, name):
+        # Percentiles are named like their Earth Engine outputs, e.g. p90.
+        if name.startswith("p") and name[1:].isdigit():
+            return ee.Reducer.percentile([int(name[1:])])
+        return getattr(ee.Reducer, name)()
+
+    def _build_collection(self, geom, s_date, e_date):
+        return (
+            ee.ImageCollection(self.image_collection)
+            .filterBounds(geom)
+            .filterDate(str(s_date), str(e_date))
+            .select(self.image_band)
+        )
+
+    def _describe_job(self, country):
+        # The centroid table is left out, a diff of it samples into the same folder.
+        start, end = self._generate_start_end_date()
+        return {
+            "country": country[0],
+            "image_collection": self.image_collection,
+            "image_band": self.image_band,
+            "scale": self.sample_scale,
+            "aggregation_reducers": self.aggregation_reducers,
+            "aggregation_bin": self.aggregation_bin,
+            "start": start.date(),
+            "end": end.date(),
+        }
 
     def save_images_to_drive(self, collection, s_datetime, e_datetime, country):
         s_date = s_datetime.date()
@@ -125,10 +322,177 @@ class LoadEEData:
             out_dir=f"{self.image_folder}/{self.model_name}_{s_date}_{e_date}_{country}",
         )
 
+    def _sample_points(self, collection, lons, lats) -> Iterator[Optional[list]]:
+        """Yields one getRegion style array per point, in the order of the points."""
+        points = list(zip(lons, lats))
+        if self.cache is None:
+            yield from self._fetch_points(collection, points)
+            return
+
+        keys = [self._cache_key(lon, lat) for lon, lat in points]
+        cached = self.cache.get_many(keys)
+        fetched = self._fetch_points(
+            collection, [point for point, key in zip(points, keys) if key not in cached]
+        )
+        pending = []
+        for key in keys:
+            if key in cached:
+                yield cached[key]
+                continue
+            region_array = next(fetched)
+            if region_array is not None:
+                pending.append((key, region_array))
+            if len(pending) >= self.sample_chunk_size:
+                self.cache.put_many(pending)
+                pending = []
+            yield region_array
+        self.cache.put_many(pending)
+        logging.info(f"Earth Engine sample cache: {self.cache.stats()}")
+
+    def _cache_key(self, lon, lat) -> str:
+        start, end = self._generate_start_end_date()
+        return self.cache.key(
+            self.image_collection,
+            self.image_band,
+            lon,
+            lat,
+            self.sample_scale,
+            start.date(),
+            end.date(),
+            **self._aggregation_key(),
+        )
+
+    def _aggregation_key(self):
+        if not self.aggregation_reducers:
+            return {}
+        return {"reducers": self.aggregation_reducers, "bin": self.aggregation_bin}
+
+    def _fetch_points(self, collection, points) -> Iterator[Optional[list]]:
+        """
+        Samples every date shard of every chunk concurrently, then stitches the
+        shards of each point back together in date order.
+        """
+        shards = self._shard_collection(collection)
+        if self.sample_mode == "batch":
+            chunks, sample = chunked(points, self.sample_chunk_size), self._sample_chunk
+        else:
+            chunks, sample = ([point] for point in points), self._sample_point
+        tasks = [(shard, chunk) for chunk in chunks for shard in shards]
+        results = self.executor.imap(lambda task: self._sample_with_retries(sample, *task), tasks)
+        for _ in range(len(tasks) // len(shards)):
+            yield from self._stitch_shards([next(results) for _ in shards])
+
+    def _shard_collection(self, collection) -> list:
+        if not self.date_shard_days:
+            return [collection]
+        s_datetime, e_datetime = self._generate_start_end_date()
+        return [
+            self._filter_date(collection, shard_start, shard_end)
+            for shard_start, shard_end in self._date_windows(
+                s_datetime, e_datetime, self.date_shard_days
+            )
+        ]
+
+    def _filter_date(self, collection, start, end):
+        return collection.filterDate(str(start.date()), str(end.date()))
+
+    def _stitch_shards(self, shard_region_arrays) -> Iterator[Optional[list]]:
+        for point_region_arrays in zip(*shard_region_arrays):
+            # A partial series would be cached and written as the whole window,
+            # so a point with a failed shard is left to be sampled again.
+            if any(region_array is None for region_array in point_region_arrays):
+                yield None
+                continue
+            yield [point_region_arrays[0][0]] + [
+                row for region_array in point_region_arrays for row in region_array[1:]
+            ]
+
+    def _sample_with_retries(self, sample, collection, chunk) -> List[Optional[list]]:
+        """Retries the centroids of a chunk that failed, without resampling the others."""
+        region_arrays = sample(collection, chunk)
+        for _ in range(self.sample_max_retries):
+            failed = [i for i, region_array in enumerate(region_arrays) if region_array is None]
+            if not failed:
+                break
+            logging.info(f"Retrying {len(failed)} centroids that could not be sampled")
+            for i, region_array in zip(failed, sample(collection, [chunk[i] for i in failed])):
+                region_arrays[i] = region_array
+        return region_arrays
+
+    def _sample_chunk(self, collection, chunk) -> List[Optional[list]]:
+        return self._get_chunk_values_from_collection(collection, chunk, self.sample_max_splits)
+
+    def _sample_point(self, collection, chunk) -> List[Optional[list]]:
+        return [
+            self._get_centroid_value_from_collection(collection, ee.Geometry.Point(*point))
+            for point in chunk
+        ]
+
+    def _get_chunk_values_from_collection(
+        self, collection, chunk, splits_left
+    ) -> List[Optional[list]]:
+        try:
+            features = self._build_chunk_samples(collection, chunk).getInfo()["features"]
+        except (EEException, HttpError) as e:
+            if is_quota_error(e):
+                raise
+            if splits_left > 0 and len(chunk) > 1 and self._is_payload_too_large(e):
+                middle = len(chunk) // 2
+                return self._get_chunk_values_from_collection(
+                    collection, chunk[:middle], splits_left - 1
+                ) + self._get_chunk_values_from_collection(
+                    collection, chunk[middle:], splits_left - 1
+                )
+            logging.warning(f"Chunk of {len(chunk)} centroids could not be sampled: {e}")
+            return [None] * len(chunk)
+
+        return self._features_to_region_arrays(features, len(chunk))
+
+    def _build_chunk_samples(self, collection, chunk):
+        return self._sample_collection(collection, self._build_points(chunk), self.output_bands)
+
+    def _build_points(self, chunk):
+        return ee.FeatureCollection(
+            [
+                ee.Feature(
+                    ee.Geometry.Point(lon, lat),
+                    {"point_id": i, "longitude": lon, "latitude": lat},
+                )
+                for i, (lon, lat) in enumerate(chunk)
+            ]
+        )
+
+    def _sample_collection(self, collection, points, bands):
+        reducer = ee.Reducer.first().forEach(bands)
+
+        def _sample_image(image):
+            return image.reduceRegions(
+                collection=points, reducer=reducer, scale=self.sample_scale
+            ).map(lambda feature: feature.set("time", image.get("system:time_start")))
+
+        return collection.map(_sample_image).flatten()
+
+    def _features_to_region_arrays(self, features, n_points) -> List[list]:
+        """Splits sampled features into one getRegion style array per point."""
+        header = [*REGION_HEADER, *self.output_bands]
+        region_arrays = [[header] for _ in range(n_points)]
+        for feature in features:
+            properties = feature["properties"]
+            region_arrays[properties["point_id"]].append(
+                [feature.get("id")] + [properties.get(column) for column in header[1:]]
+            )
+        return region_arrays
+
+    def _is_payload_too_large(self, error) -> bool:
+        message = str(error).lower()
+        return any(pattern in message for pattern in PAYLOAD_TOO_LARGE_ERRORS)
+
     def _get_centroid_value_from_collection(self, collection, centroid_point):
         try:
-            return collection.getRegion(centroid_point, 10).getInfo()
-        except (EEException, HttpError):
+            return collection.getRegion(centroid_point, self.sample_scale).getInfo()
+        except (EEException, HttpError) as e:
+            if is_quota_error(e):
+                raise
             logging.warning(
                 f"""Centroid location {centroid_point}
                 table does not match any existing location."""
@@ -140,24 +504,56 @@ class LoadEEData:
         end = datetime.datetime(self.year_end, self.mon_end, self.date_end)
         return start, end
 
-    def _date_range(self, start, end) -> Sequence[Any]:
+    def _date_range(self, start, end, step=7) -> Sequence[Any]:
         r = (end + datetime.timedelta(days=1) - start).days
-        return [start + datetime.timedelta(days=i) for i in range(0, r, 7)]
+        return [start + datetime.timedelta(days=i) for i in range(0, r, step)]
 
     def _generate_dates(self, date_list) -> Sequence[str]:
         return [str(date) for date in date_list]
 
-    def _get_xy(self, locations_gdf):
-        try:
-            locations_gdf["centroid_geometry"] = locations_gdf["centroid_geometry"].map(
-                shapely.wkt.loads
-            )
+    def _read_locations(self, filepath) -> pd.DataFrame:
+        """
+        Reads the centroids to sample from the compact Parquet table written by
+        GenerateBuildingCentroidsFlow, or from a CSV with x and y, lon and lat or
+        WKT centroid_geometry columns. Removed centroids of an incremental refresh diff
+        are skipped, so only added and moved ones are sampled.
+        """
+        if filepath.endswith(".parquet"):
+            if "change" in pq.read_schema(filepath).names:
+                locations_df = pd.read_parquet(filepath, columns=["lon", "lat", "change"])
+                locations_df = locations_df[locations_df["change"] != "removed"]
+                locations_df = locations_df.drop(columns="change").reset_index(drop=True)
+            else:
+                locations_df = pd.read_parquet(filepath, columns=["lon", "lat"])
+            return locations_df.rename(columns={"lon": "x", "lat": "y"})
+        locations_df = pd.read_csv(filepath)
+        if "x" in locations_df and "y" in locations_df:
+            return locations_df
+        if "lon" in locations_df and "lat" in locations_df:
+            # A centroid table of GenerateBuildingCentroidsFlow saved as CSV.
+            return locations_df.rename(columns={"lon": "x", "lat": "y"})
+        return self._get_xy(locations_df)
 
-        except TypeError:
-            pass
+    def _read_stale_locations(self, filepath) -> Optional[pd.DataFrame]:
+        """
+        The previous x and y of the centroids removed or moved by the
+        incremental refresh diff at filepath, whose results are discarded.
+        None when filepath is a full centroid table.
+        """
+        if not filepath.endswith(".parquet") or "change" not in pq.read_schema(filepath).names:
+            return None
+        diff = pd.read_parquet(filepath, columns=["lon_previous", "lat_previous", "change"])
+        stale = diff[diff["change"].isin(["removed", "moved"])]
+        return pd.DataFrame(
+            {"x": stale["lon_previous"].to_numpy(), "y": stale["lat_previous"].to_numpy()}
+        )
 
-        locations_gdf["x"] = locations_gdf.centroid_geometry.map(lambda p: p.x)
-        locations_gdf["y"] = locations_gdf.centroid_geometry.map(lambda p: p.y)
+    def _get_xy(self, locations_gdf):
+        centroid_geometry = locations_gdf["centroid_geometry"]
+        if pd.api.types.infer_dtype(centroid_geometry, skipna=True) == "string":
+            locations_gdf["x"], locations_gdf["y"] = wkt_points_xy(centroid_geometry)
+        else:
+            locations_gdf["x"], locations_gdf["y"] = points_xy(centroid_geometry)
         return locations_gdf
 
     def _replace_symbol(self, item):
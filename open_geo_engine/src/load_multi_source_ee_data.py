@@ -0,0 +1,136 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import ee
+import pandas as pd
+
+from open_geo_engine.config.model_settings import DataConfig
+from open_geo_engine.src.load_ee_data import LoadEEData
+
+
+class LoadMultiSourceEEData(LoadEEData):
+    """
+    Samples several image collections for each chunk of centroids in a single
+    Earth Engine request and aligns them on point and time into a wide table,
+    with bands named <source>_<band>.
+    """
+
+    # Sources are sampled at different times, so rows are kept while any band has data.
+    dropna_how = "all"
+
+    def __init__(
+        self,
+        countries: Sequence,
+        year: int,
+        mon_start: int,
+        date_start: int,
+        year_end: int,
+        mon_end: int,
+        date_end: int,
+        sources: Dict[str, Tuple[str, Union[str, Sequence[str]]]],
+        folder: str,
+        image_folder: str,
+        model_name: str,
+        align_freq: Optional[str] = None,
+        **kwargs,
+    ):
+        self.sources = {
+            name: (image_collection, [image_band] if isinstance(image_band, str) else image_band)
+            for name, (image_collection, image_band) in sources.items()
+        }
+        # Rows of every source falling in the same align_freq window are merged.
+        self.align_ms = pd.Timedelta(align_freq) // pd.Timedelta("1ms") if align_freq else None
+        kwargs["sample_mode"] = "batch"
+        super().__init__(
+            countries,
+            year,
+            mon_start,
+            date_start,
+            year_end,
+            mon_end,
+            date_end,
+            ",".join(image_collection for image_collection, _ in self.sources.values()),
+            [band for name in self.sources for band in self._source_bands(name)],
+            folder,
+            image_folder,
+            model_name,
+            **kwargs,
+        )
+
+    @classmethod
+    def _kwargs_from_config(cls, config: DataConfig) -> Dict[str, Any]:
+        kwargs = super()._kwargs_from_config(config)
+        del kwargs["image_collection"], kwargs["image_band"]
+        kwargs["sources"] = {
+            name: (
+                getattr(config, f"{name}_IMAGE_COLLECTION"),
+                getattr(config, f"{name}_IMAGE_BAND"),
+            )
+            for name in config.MULTI_SOURCE_MODELS
+        }
+        kwargs["model_name"] = "_".join(config.MULTI_SOURCE_MODELS)
+        kwargs["align_freq"] = config.MULTI_SOURCE_ALIGN_FREQ
+        return kwargs
+
+    def _source_bands(self, name) -> List[str]:
+        return [f"{name}_{band}" for band in self.sources[name][1]]
+
+    def _build_collection(self, geom, s_date, e_date):
+        return {
+            name: ee.ImageCollection(image_collection)
+            .filterBounds(geom)
+            .filterDate(str(s_date), str(e_date))
+            .select(image_band, self._source_bands(name))
+            for name, (image_collection, image_band) in self.sources.items()
+        }
+
+    def save_images_to_drive(self, collections, s_datetime, e_datetime, country):
+        for name, collection in collections.items():
+            super().save_images_to_drive(collection, s_datetime, e_datetime, f"{country}_{name}")
+
+    def _aggregate_collection(self, collections, s_datetime, e_datetime):
+        return {
+            name: super(LoadMultiSourceEEData, self)._aggregate_collection(
+                collection, s_datetime, e_datetime
+            )
+            for name, collection in collections.items()
+        }
+
+    def _filter_date(self, collections, start, end):
+        return {
+            name: super(LoadMultiSourceEEData, self)._filter_date(collection, start, end)
+            for name, collection in collections.items()
+        }
+
+    def _build_chunk_samples(self, collections, chunk):
+        # The points and the request are shared by every source.
+        points = self._build_points(chunk)
+        return ee.FeatureCollection(
+            [
+                self._sample_collection(
+                    collections[name], points, self._output_bands_for(self._source_bands(name))
+                )
+                for name in self.sources
+            ]
+        ).flatten()
+
+    def _features_to_region_arrays(self, features, n_points) -> List[list]:
+        return [
+            self._align_rows(region_array)
+            for region_array in super()._features_to_region_arrays(features, n_points)
+        ]
+
+    def _align_rows(self, region_array) -> list:
+        """Merges the rows of every source sharing a (aligned) timestamp into one."""
+        header, rows = region_array[0], region_array[1:]
+        aligned: Dict[int, list] = {}
+        for row in rows:
+            time = row[3]
+            if time is None:
+                continue
+            if self.align_ms:
+                time -= time % self.align_ms
+            merged = aligned.setdefault(time, [*row[:3], time] + [None] * (len(header) - 4))
+            for i, value in enumerate(row[4:], start=4):
+                if merged[i] is None:
+                    merged[i] = value
+        return [header, *(aligned[time] for time in sorted(aligned))]
@@ -0,0 +1,159 @@
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from open_geo_engine.utils.spatial_partition import METERS_PER_DEGREE
+
+# Country used for codes missing from COUNTRY_BOUNDING_BOXES.
+WORLD_CODE = "WO"
+
+
+def country_boxes(
+    codes: Sequence[str], bounding_boxes: Mapping[str, Tuple[str, Sequence[float]]]
+) -> List[Tuple[str, Tuple[float, float, float, float]]]:
+    """(name, bounding box) of each country code, the world for unknown codes."""
+    return [bounding_boxes.get(code, bounding_boxes[WORLD_CODE]) for code in codes]
+
+
+def normalize_bbox(bbox: Sequence[float]) -> Tuple[float, float, float, float]:
+    """(min lon, min lat, max lon, max lat), whatever the order of the corners."""
+    x1, y1, x2, y2 = bbox
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+class CentroidStore:
+    """
+    A table of points with a grid index over their coordinates, for bounding
+    box queries, removing points closer than a tolerance and assigning points
+    to countries.
+
+    Rows are sorted by the grid cell of cell_size_degrees they fall in, so a
+    bounding box query only looks at the rows of the cells it overlaps.
+    Queries return positions in the table, its index is left untouched.
+    """
+
+    def __init__(
+        self,
+        centroids: pd.DataFrame,
+        x: str = "lon",
+        y: str = "lat",
+        cell_size_degrees: float = 0.01,
+    ):
+        self.centroids = centroids
+        self.cell_size_degrees = cell_size_degrees
+        self.lons = centroids[x].to_numpy(dtype=np.float64)
+        self.lats = centroids[y].to_numpy(dtype=np.float64)
+
+        cells_x = np.floor(self.lons / cell_size_degrees).astype(np.int64)
+        cells_y = np.floor(self.lats / cell_size_degrees).astype(np.int64)
+        self._origin = (cells_x.min(initial=0), cells_y.min(initial=0))
+        self._rows = int(cells_y.max(initial=0) - self._origin[1] + 1)
+        self._columns = int(cells_x.max(initial=0) - self._origin[0] + 1)
+        keys = (cells_x - self._origin[0]) * self._rows + (cells_y - self._origin[1])
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    def __len__(self) -> int:
+        return len(self.centroids)
+
+    def query_bbox(self, bbox: Sequence[float]) -> np.ndarray:
+        """Sorted positions of the points within bbox, borders included."""
+        min_lon, min_lat, max_lon, max_lat = normalize_bbox(bbox)
+        first_x, first_y = self._cell_range(min_lon, min_lat)
+        last_x, last_y = self._cell_range(max_lon, max_lat)
+        if not len(self) or first_x > last_x or first_y > last_y:
+            return np.array([], dtype=np.int64)
+
+        # The cells of a grid column are contiguous in the sorted keys.
+        columns = np.arange(first_x, last_x + 1) * self._rows
+        starts = np.searchsorted(self._keys, columns + first_y, side="left")
+        ends = np.searchsorted(self._keys, columns + last_y, side="right")
+        candidates = self._order[_ranges(starts, ends)]
+        inside = (
+            (self.lons[candidates] >= min_lon)
+            & (self.lons[candidates] <= max_lon)
+            & (self.lats[candidates] >= min_lat)
+            & (self.lats[candidates] <= max_lat)
+        )
+        return np.sort(candidates[inside])
+
+    def clip(self, bbox: Sequence[float]) -> pd.DataFrame:
+        return self.centroids.iloc[self.query_bbox(bbox)]
+
+    def duplicated(self, tolerance_meters: float) -> np.ndarray:
+        """
+        Marks every point closer than tolerance_meters to an earlier point.
+
+        Points are projected to meters around their own latitude and bucketed
+        in cells of tolerance_meters, so only the points of neighbouring cells
+        are compared.
+        """
+        n = len(self)
+        duplicated = np.zeros(n, dtype=bool)
+        if not tolerance_meters or tolerance_meters <= 0 or n < 2:
+            return duplicated
+        x = self.lons * np.cos(np.radians(self.lats)) * METERS_PER_DEGREE
+        y = self.lats * METERS_PER_DEGREE
+        cells_x = np.floor(x / tolerance_meters).astype(np.int64)
+        cells_y = np.floor(y / tolerance_meters).astype(np.int64)
+        # A spare row on either side keeps neighbours from wrapping to the next column.
+        rows = cells_y.max() - cells_y.min() + 3
+        keys = (cells_x - cells_x.min()) * rows + (cells_y - cells_y.min() + 1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+
+        # Half of the neighbourhood suffices, every pair is met from one of its ends.
+        for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+            targets = sorted_keys + dx * rows + dy
+            starts = np.searchsorted(sorted_keys, targets, side="left")
+            ends = np.searchsorted(sorted_keys, targets, side="right")
+            first = order[np.repeat(np.arange(n), ends - starts)]
+            second = order[_ranges(starts, ends)]
+            close = (first != second) & (
+                (x[first] - x[second]) ** 2 + (y[first] - y[second]) ** 2 <= tolerance_meters**2
+            )
+            duplicated[np.maximum(first[close], second[close])] = True
+        return duplicated
+
+    def deduplicate(self, tolerance_meters: float) -> pd.DataFrame:
+        """The points without any earlier point closer than tolerance_meters."""
+        return self.centroids[~self.duplicated(tolerance_meters)]
+
+    def assign_countries(
+        self,
+        countries: Sequence[Tuple[str, Sequence[float]]],
+        polygons: Optional[Dict[str, Any]] = None,
+    ) -> np.ndarray:
+        """
+        Name of the first of the (name, bounding box) countries holding each
+        point, or None. Countries with a polygon in polygons only hold the
+        points of their bounding box within the polygon.
+        """
+        assigned = np.full(len(self), None, dtype=object)
+        for name, bbox in countries:
+            positions = self.query_bbox(bbox)
+            positions = positions[pd.isna(assigned[positions])]
+            if polygons and name in polygons:
+                points = gpd.GeoSeries(
+                    gpd.points_from_xy(self.lons[positions], self.lats[positions])
+                )
+                positions = positions[points.within(polygons[name]).to_numpy()]
+            assigned[positions] = name
+        return assigned
+
+    def _cell_range(self, lon: float, lat: float) -> Tuple[int, int]:
+        cell_x = int(np.floor(lon / self.cell_size_degrees)) - self._origin[0]
+        cell_y = int(np.floor(lat / self.cell_size_degrees)) - self._origin[1]
+        return (
+            min(max(cell_x, 0), self._columns - 1),
+            min(max(cell_y, 0), self._rows - 1),
+        )
+
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """The concatenation of range(start, end) for every pair."""
+    counts = ends - starts
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
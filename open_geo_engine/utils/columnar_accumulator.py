@@ -0,0 +1,93 @@
+from operator import itemgetter
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+class ColumnarAccumulator:
+    """
+    Collects sampled rows into typed NumPy columns that grow geometrically,
+    so the sampling loop never holds per-point DataFrames.
+    """
+
+    def __init__(
+        self, list_of_bands: Sequence[str], initial_capacity: int = 4096, how: str = "any"
+    ):
+        self.list_of_bands = list(list_of_bands)
+        # Rows are dropped when "any" or "all" of their bands are missing.
+        self.how = how
+        self.columns = ["longitude", "latitude", "time", *self.list_of_bands]
+        dtypes = [np.float64, np.float64, np.int64] + [np.float32] * len(self.list_of_bands)
+        self._buffers = [np.empty(initial_capacity, dtype=dtype) for dtype in dtypes]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffers[0])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffer in self._buffers)
+
+    def append_region_array(self, arr: Optional[list]) -> None:
+        """Appends the rows of a client-side ee.Image.getRegion array."""
+        if not arr or len(arr) < 2:
+            return
+        header = list(arr[0])
+        get_columns = itemgetter(*[header.index(column) for column in self.columns])
+        # None values become NaN and are dropped like in ee_array_to_df.
+        self.append_values(np.array(list(map(get_columns, arr[1:])), dtype=np.float64))
+
+    def append_values(self, values: np.ndarray) -> None:
+        """Appends a (rows, columns) float array ordered like self.columns."""
+        missing = np.isnan(values[:, 3:])
+        missing = missing.all(axis=1) if self.how == "all" else missing.any(axis=1)
+        values = values[~missing & ~np.isnan(values[:, :3]).any(axis=1)]
+        start, end = self._size, self._size + len(values)
+        self._reserve(end)
+        for buffer, column in zip(self._buffers, values.T):
+            buffer[start:end] = column
+        self._size = end
+
+    def clear(self) -> None:
+        self._size = 0
+
+    def to_df(self) -> pd.DataFrame:
+        data = dict(zip(self.columns, (buffer[: self._size] for buffer in self._buffers)))
+        data["datetime"] = pd.to_datetime(data["time"], unit="ms")
+        # Copy so the frame stays valid once the buffers are cleared and reused.
+        return pd.DataFrame(
+            data,
+            columns=["longitude", "latitude", "time", "datetime", *self.list_of_bands],
+            copy=True,
+        )
+
+    def to_table(self) -> pa.Table:
+        # Copy so the table stays valid once the buffers are cleared and reused.
+        longitude, latitude, time, *bands = (
+            buffer[: self._size].copy() for buffer in self._buffers
+        )
+        arrays = [
+            pa.array(longitude),
+            pa.array(latitude),
+            pa.array(time),
+            pa.array(time, type=pa.timestamp("ms")),
+            *(pa.array(band) for band in bands),
+        ]
+        return pa.Table.from_arrays(
+            arrays, names=["longitude", "latitude", "time", "datetime", *self.list_of_bands]
+        )
+
+    def _reserve(self, capacity: int) -> None:
+        if capacity <= self.capacity:
+            return
+        new_capacity = max(capacity, 2 * self.capacity)
+        for i, buffer in enumerate(self._buffers):
+            grown = np.empty(new_capacity, dtype=buffer.dtype)
+            grown[: self._size] = buffer[: self._size]
+            self._buffers[i] = grown
@@ -0,0 +1,90 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from ee.ee_exception import EEException
+from googleapiclient.errors import HttpError
+
+# Earth Engine error messages raised when the project is over its request or
+# aggregation quota, these are retried with an exponential backoff.
+QUOTA_ERRORS = (
+    "too many concurrent aggregations",
+    "too many requests",
+    "quota exceeded",
+    "rate limit",
+)
+
+_global_slots: Dict[int, threading.BoundedSemaphore] = {}
+_global_slots_lock = threading.Lock()
+
+
+def get_global_slots(max_in_flight: int) -> threading.BoundedSemaphore:
+    """
+    Return the process wide semaphore capping in-flight Earth Engine requests,
+    shared by every executor created with the same cap.
+    """
+    with _global_slots_lock:
+        if max_in_flight not in _global_slots:
+            _global_slots[max_in_flight] = threading.BoundedSemaphore(max_in_flight)
+        return _global_slots[max_in_flight]
+
+
+def is_quota_error(error: Exception) -> bool:
+    if isinstance(error, HttpError) and getattr(error.resp, "status", None) == 429:
+        return True
+    message = str(error).lower()
+    return any(pattern in message for pattern in QUOTA_ERRORS)
+
+
+class EERequestExecutor:
+    def __init__(
+        self,
+        max_in_flight_per_country: int = 8,
+        max_in_flight: int = 32,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        max_backoff_seconds: float = 60.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_in_flight_per_country = max_in_flight_per_country
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.sleep = sleep
+        self.global_slots = get_global_slots(max_in_flight)
+
+    def map(self, function: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """
+        Call function on every item with at most max_in_flight_per_country
+        calls running at once, returning the results in the order of items.
+        """
+        return list(self.imap(function, items))
+
+    def imap(self, function: Callable[[Any], Any], items: Iterable[Any]) -> Iterator[Any]:
+        """Like map, but yields each result as soon as it and its predecessors are done."""
+        items = list(items)
+        if self.max_in_flight_per_country <= 1 or len(items) <= 1:
+            for item in items:
+                yield self.call(function, item)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight_per_country) as pool:
+            yield from pool.map(lambda item: self.call(function, item), items)
+
+    def call(self, function: Callable[[Any], Any], item: Any) -> Any:
+        for attempt in range(self.max_retries + 1):
+            with self.global_slots:
+                try:
+                    return function(item)
+                except (EEException, HttpError) as e:
+                    if attempt == self.max_retries or not is_quota_error(e):
+                        raise
+            # Back off outside of the slot so other requests can use it.
+            delay = min(self.max_backoff_seconds, self.backoff_seconds * 2**attempt)
+            delay *= 1 + random.random()
+            logging.info(f"Earth Engine quota reached, retrying in {delay:.1f}s")
+            self.sleep(delay)
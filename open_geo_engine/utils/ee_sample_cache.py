@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from open_geo_engine.utils.utils import chunked
+
+# SQLite limits the number of bound parameters in a single statement.
+QUERY_BATCH_SIZE = 500
+
+
+class EESampleCache:
+    """
+    Earth Engine point samples cached in SQLite, evicting the least recently
+    used beyond max_bytes. The database is created on first use.
+    """
+
+    def __init__(self, path: str, max_bytes: int, precision: int = 6):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS samples (
+                    key TEXT PRIMARY KEY,
+                    payload BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS samples_last_access ON samples (last_access)"
+            )
+            connection.commit()
+            self._db = connection
+        return self._db
+
+    def key(
+        self,
+        image_collection: str,
+        image_band: Sequence[str],
+        lon: float,
+        lat: float,
+        scale: int,
+        start: Any,
+        end: Any,
+        **extra: Any,
+    ) -> str:
+        """
+        Content address of a point sample, coordinates are rounded to the cache
+        precision so that re-parsed centroids map to the same entry.
+        """
+        fields = [
+            image_collection,
+            list(image_band),
+            round(float(lon), self.precision),
+            round(float(lat), self.precision),
+            scale,
+            str(start),
+            str(end),
+            sorted(extra.items()),
+        ]
+        return hashlib.sha256(json.dumps(fields, default=str).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        found: Dict[str, Any] = {}
+        with self._lock:
+            for batch in chunked(list(keys), QUERY_BATCH_SIZE):
+                rows = self._connection.execute(
+                    f"SELECT key, payload FROM samples WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update((key, json.loads(zlib.decompress(payload))) for key, payload in rows)
+            self._connection.executemany(
+                "UPDATE samples SET last_access = ? WHERE key = ?",
+                [(time.time(), key) for key in found],
+            )
+            self._connection.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items: Iterable[tuple]) -> None:
+        now = time.time()
+        rows = []
+        for key, value in items:
+            payload = zlib.compress(json.dumps(value).encode("utf-8"))
+            rows.append((key, payload, len(payload), now))
+        if not rows:
+            return
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO samples (key, payload, size, last_access) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._connection.commit()
+            self._evict()
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._size_bytes()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": self.size_bytes(),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _size_bytes(self) -> int:
+        return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM samples").fetchone()[0]
+
+    def _evict(self) -> None:
+        """Drop the least recently used samples until the cache fits max_bytes."""
+        excess = self._size_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+        evicted_keys = []
+        for key, size in self._connection.execute(
+            "SELECT key, size FROM samples ORDER BY last_access"
+        ):
+            evicted_keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._connection.executemany("DELETE FROM samples WHERE key = ?", evicted_keys)
+        self._connection.commit()
+        self.evictions += len(evicted_keys)
@@ -0,0 +1,70 @@
+from typing import Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+# Shapely 2 exposes vectorized array functions, shapely 1.8 (pinned by osmnx
+# 1.2) only works on one geometry at a time.
+SHAPELY_2 = hasattr(shapely, "from_wkt")
+
+# Locations are keyed on their coordinates quantized to 1e-7 degrees, about a centimeter.
+LOCATION_KEY_SCALE = 10**7
+
+NUMBER_PATTERN = r"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+WKT_POINT_PATTERN = rf"^\s*POINT\s*\(\s*{NUMBER_PATTERN}\s+{NUMBER_PATTERN}\s*\)\s*$"
+
+
+def representative_points(geometries: gpd.GeoSeries) -> gpd.GeoSeries:
+    """A point guaranteed to lie within each geometry, of any geometry type."""
+    if SHAPELY_2:
+        return gpd.GeoSeries(
+            shapely.point_on_surface(np.asarray(geometries.array)),
+            index=geometries.index,
+            crs=geometries.crs,
+        )
+    return geometries.representative_point()
+
+
+def points_xy(points: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """float64 x and y arrays of a sequence of shapely points."""
+    if SHAPELY_2:
+        points = np.asarray(gpd.GeoSeries(points).array)
+        return shapely.get_x(points), shapely.get_y(points)
+    points = gpd.GeoSeries(points)
+    return points.x.to_numpy(dtype=np.float64), points.y.to_numpy(dtype=np.float64)
+
+
+def wkt_points_xy(wkt: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    float64 x and y arrays of WKT points. Without shapely 2 the coordinates
+    of plain "POINT (x y)" strings are extracted as text, and only the other
+    strings are parsed into geometries.
+    """
+    wkt = pd.Series(wkt, dtype=object).reset_index(drop=True)
+    if SHAPELY_2:
+        return points_xy(shapely.from_wkt(wkt.to_numpy()))
+
+    coordinates = wkt.str.extract(WKT_POINT_PATTERN)
+    # astype parses exactly, pd.to_numeric may be off by one unit in the last place.
+    x = coordinates[0].astype(np.float64).to_numpy()
+    y = coordinates[1].astype(np.float64).to_numpy()
+    unparsed = np.isnan(x) & wkt.notna().to_numpy()
+    if unparsed.any():
+        x[unparsed], y[unparsed] = points_xy(gpd.GeoSeries.from_wkt(wkt[unparsed]))
+    return x, y
+
+
+def location_key(lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+    """
+    int64 key of each location, its latitude and longitude quantized to
+    1 / LOCATION_KEY_SCALE degrees and packed in the high and low 32 bits.
+    Locations with missing or out of range coordinates are keyed -1.
+    """
+    lats = pd.to_numeric(pd.Series(lats), errors="coerce").to_numpy(dtype=np.float64)
+    lons = pd.to_numeric(pd.Series(lons), errors="coerce").to_numpy(dtype=np.float64)
+    valid = (np.abs(lats) <= 90) & (np.abs(lons) <= 180)
+    lat_steps = np.round((np.where(valid, lats, 0) + 90) * LOCATION_KEY_SCALE).astype(np.int64)
+    lon_steps = np.round((np.where(valid, lons, 0) + 180) * LOCATION_KEY_SCALE).astype(np.int64)
+    return np.where(valid, (lat_steps << 32) | lon_steps, -1)
@@ -0,0 +1,112 @@
+import re
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import fiona
+import geopandas as gpd
+import pandas as pd
+import pyarrow.parquet as pq
+from shapely.geometry import shape
+
+# GDAL reads .osm and .osm.pbf extracts, fiona only lets through the drivers it lists.
+fiona.supported_drivers.setdefault("OSM", "r")
+
+# Layers of the GDAL OSM driver holding the nodes, and the ways and relations.
+OSM_LAYERS = ("points", "multipolygons")
+# Tags without a column of their own are packed as "key"=>"value" pairs.
+OTHER_TAGS_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"=>"((?:[^"\\]|\\.)*)"')
+
+
+def iter_extract_footprints(
+    path: str, tags: Dict[str, Any], columns: Sequence[str], chunk_size: int
+) -> Iterator[gpd.GeoDataFrame]:
+    """
+    Streams the features of a local OSM extract matching any of tags, in
+    GeoDataFrames of at most chunk_size footprints shaped like the osmnx
+    geometries: indexed by element_type and osmid, with a column per tag in
+    columns.
+
+    The extract is a .osm.pbf (or .osm) file, a GeoPackage with the osmnx
+    element_type and osmid columns or the osm_id, osm_way_id and other_tags
+    columns of ogr2ogr, or a GeoParquet file with the same columns.
+    """
+    columns = list(dict.fromkeys([*tags, *columns]))
+    if path.endswith((".parquet", ".geoparquet")):
+        records = _iter_parquet_records(path, chunk_size)
+    elif path.endswith((".pbf", ".osm")):
+        records = (record for layer in OSM_LAYERS for record in _iter_fiona_records(path, layer))
+    else:
+        records = _iter_fiona_records(path, None)
+
+    chunk: List[Tuple[Any, ...]] = []
+    for properties, geometry in records:
+        properties = _with_other_tags(properties)
+        if not _matches(properties, tags):
+            continue
+        chunk.append((*_osm_key(properties), *(properties.get(c) for c in columns), geometry))
+        if len(chunk) >= chunk_size:
+            yield _to_gdf(chunk, columns)
+            chunk = []
+    if chunk:
+        yield _to_gdf(chunk, columns)
+
+
+def _iter_fiona_records(path: str, layer: Optional[str]) -> Iterator[Tuple[Dict[str, Any], Any]]:
+    with fiona.open(path, layer=layer) as source:
+        for feature in source:
+            if feature["geometry"] is not None:
+                yield dict(feature["properties"]), shape(feature["geometry"])
+
+
+def _iter_parquet_records(path: str, batch_size: int) -> Iterator[Tuple[Dict[str, Any], Any]]:
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        # Keep index columns such as element_type and osmid as plain columns.
+        df = batch.to_pandas(ignore_metadata=True)
+        geometries = gpd.GeoSeries.from_wkb(df.pop("geometry"))
+        for properties, geometry in zip(df.to_dict("records"), geometries):
+            if geometry is not None:
+                yield properties, geometry
+
+
+def _with_other_tags(properties: Dict[str, Any]) -> Dict[str, Any]:
+    other_tags = properties.get("other_tags")
+    if other_tags:
+        for key, value in OTHER_TAGS_PATTERN.findall(other_tags):
+            properties.setdefault(key, value)
+    return properties
+
+
+def _matches(properties: Dict[str, Any], tags: Dict[str, Any]) -> bool:
+    """Like osmnx, a feature matches when any of the tags does."""
+    for key, wanted in tags.items():
+        value = properties.get(key)
+        if value is None or value != value:
+            continue
+        if wanted is True:
+            return True
+        if isinstance(wanted, str) and value == wanted:
+            return True
+        if isinstance(wanted, (list, tuple, set)) and value in wanted:
+            return True
+    return False
+
+
+def _osm_key(properties: Dict[str, Any]) -> Tuple[str, int]:
+    if properties.get("element_type") is not None:
+        return properties["element_type"], int(properties["osmid"])
+    if properties.get("osm_type") is not None:
+        return properties["osm_type"], int(properties["osm_id"])
+    # GDAL stores the ids of ways in osm_way_id, and of nodes and relations in osm_id.
+    if properties.get("osm_way_id") is not None:
+        return "way", int(properties["osm_way_id"])
+    element_type = "relation" if "osm_way_id" in properties else "node"
+    return element_type, int(properties["osm_id"])
+
+
+def _to_gdf(chunk: List[Tuple[Any, ...]], columns: List[str]) -> gpd.GeoDataFrame:
+    element_types, osmids, *values, geometries = zip(*chunk)
+    return gpd.GeoDataFrame(
+        dict(zip(columns, values)),
+        geometry=list(geometries),
+        index=pd.MultiIndex.from_arrays([element_types, osmids], names=["element_type", "osmid"]),
+        crs="epsg:4326",
+    )
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from osmnx import downloader, settings
+
+# Lookup counters aggregated over the processes of a run.
+COUNTERS = ("hits", "misses", "bytes_saved", "evictions")
+# Overpass settings that do not change the elements a query returns.
+QUERY_SETTINGS_PATTERN = re.compile(r"\[(?:timeout|maxsize):\d+\]")
+
+
+def normalize_url(url: str) -> str:
+    """
+    The part of a request URL that determines its response. The server is
+    dropped so mirrors share responses, parameters are sorted and Overpass
+    timeouts, memory limits and whitespace are ignored.
+    """
+    parts = urlsplit(url)
+    params = []
+    for name, value in parse_qsl(parts.query, keep_blank_values=True):
+        if name == "data":
+            value = " ".join(QUERY_SETTINGS_PATTERN.sub("", value).split())
+        params.append((name, value))
+    return json.dumps([parts.path, sorted(params)])
+
+
+class OverpassResponseCache:
+    """
+    Overpass and Nominatim responses cached in SQLite, shared by the threads
+    and processes of a run, compressed, bounded to max_bytes by evicting the
+    least recently used responses and expired after ttl_seconds. The database
+    is created on first use, and the stats of a run count the lookups of every
+    process sharing this cache, forked workers included.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # Workers unpickle the same run_id and add to the counters of this run.
+        self.run_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Workers receive the settings and open their own connection.
+        state = self.__dict__.copy()
+        for attribute in ("_connection", "_lock"):
+            state.pop(attribute, None)
+        state["_pid"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def install(self) -> None:
+        """Serve the osmnx cache lookups of this process from this cache."""
+        downloader._retrieve_from_cache = self.retrieve
+        downloader._save_to_cache = self.save
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+    def retrieve(self, url: str, check_remark: bool = False) -> Optional[Dict[str, Any]]:
+        """Drop-in for osmnx.downloader._retrieve_from_cache."""
+        if not settings.use_cache:
+            return None
+        key = self.key(url)
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT payload, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self._expired(row[1]):
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                row = None
+            if row is None:
+                self._count(connection, misses=1)
+                return None
+            response = zlib.decompress(row[0])
+            response_json = json.loads(response)
+            # Like osmnx, responses with a server remark are requested again.
+            if check_remark and "remark" in response_json:
+                self._count(connection, misses=1)
+                return None
+            connection.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._count(connection, hits=1, bytes_saved=len(response))
+        return response_json
+
+    def save(self, url: str, response_json: Optional[Dict[str, Any]], sc: int) -> None:
+        """Drop-in for osmnx.downloader._save_to_cache."""
+        if not settings.use_cache or sc != 200 or response_json is None:
+            return
+        payload = zlib.compress(json.dumps(response_json).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.key(url), payload, len(payload), now, now),
+            )
+            connection.commit()
+            self._evict(connection)
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._size_bytes(self._connect())
+
+    def stats(self) -> Dict[str, Any]:
+        counts = dict.fromkeys(COUNTERS, 0)
+        size_bytes = 0
+        # Nothing was cached yet, reporting stats does not create the database.
+        if os.path.exists(self.path):
+            with self._lock:
+                connection = self._connect()
+                counts.update(
+                    connection.execute(
+                        "SELECT name, value FROM counters WHERE run_id = ?", (self.run_id,)
+                    ).fetchall()
+                )
+                size_bytes = self._size_bytes(connection)
+        lookups = counts["hits"] + counts["misses"]
+        return {
+            "hits": counts["hits"],
+            "misses": counts["misses"],
+            "hit_rate": counts["hits"] / lookups if lookups else 0.0,
+            "bytes_saved": counts["bytes_saved"],
+            "evictions": counts["evictions"],
+            "size_bytes": size_bytes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                self._connection.close()
+            self._pid = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # SQLite connections must not be shared with forked workers, each
+        # process opens its own.
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    payload BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS counters (
+                    run_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    value INTEGER NOT NULL,
+                    PRIMARY KEY (run_id, name)
+                )
+                """
+            )
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def _count(self, connection, **counts: int) -> None:
+        """Adds counts to the counters of this run and commits."""
+        connection.executemany(
+            "INSERT INTO counters (run_id, name, value) VALUES (?, ?, ?)"
+            " ON CONFLICT (run_id, name) DO UPDATE SET value = value + excluded.value",
+            [(self.run_id, name, value) for name, value in counts.items()],
+        )
+        connection.commit()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at >= self.ttl_seconds
+
+    def _size_bytes(self, connection) -> int:
+        return connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self, connection) -> None:
+        """Drop expired responses, then the least recently used until the cache fits max_bytes."""
+        evicted = 0
+        if self.ttl_seconds is not None:
+            evicted += connection.execute(
+                "DELETE FROM responses WHERE created_at <= ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+        excess = self._size_bytes(connection) - self.max_bytes
+        evicted_keys = []
+        if excess > 0:
+            for key, size in connection.execute(
+                "SELECT key, size FROM responses ORDER BY last_access"
+            ):
+                evicted_keys.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            connection.executemany("DELETE FROM responses WHERE key = ?", evicted_keys)
+        self._count(connection, evictions=evicted + len(evicted_keys))
@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from open_geo_engine.utils.columnar_accumulator import ColumnarAccumulator
+
+MANIFEST_FILE = "manifest.json"
+
+
+class StreamingParquetWriter:
+    """
+    Writes sampled points to a folder of Parquet parts, one part every
+    flush_points points, alongside a manifest of the points already written.
+
+    A restarted run pointing at the same folder with the same job description
+    can skip completed_point_ids, a different job starts the folder afresh.
+    The manifest also records how many rows each point wrote, so the points
+    of a later run can replace earlier ones through discard.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        list_of_bands: Sequence[str],
+        flush_points: int = 1000,
+        job: Optional[Dict[str, Any]] = None,
+        how: str = "any",
+    ):
+        self.folder = folder
+        self.flush_points = flush_points
+        self.job = json.loads(json.dumps(job or {}, default=str))
+        self._accumulator = ColumnarAccumulator(list_of_bands, how=how)
+        self._pending_point_ids: List[int] = []
+        self._pending_rows: List[int] = []
+
+        os.makedirs(folder, exist_ok=True)
+        self._manifest = self._read_manifest()
+        if self._manifest["job"] != self.job:
+            if self._manifest["parts"]:
+                logging.info(f"Job changed, discarding {len(self._manifest['parts'])} parts")
+            for part in self._manifest["parts"]:
+                self._remove(part["file"])
+            self._manifest = {"job": self.job, "parts": [], "next_part": 0}
+            self._write_manifest()
+
+    @property
+    def completed_point_ids(self) -> Set[int]:
+        return {point_id for part in self._manifest["parts"] for point_id in part["point_ids"]}
+
+    def add(self, point_id: int, region_array: Optional[list]) -> None:
+        # A point that could not be sampled is left out of the manifest, so a
+        # restarted run samples it again.
+        if region_array is None:
+            return
+        rows = len(self._accumulator)
+        self._accumulator.append_region_array(region_array)
+        self._pending_point_ids.append(int(point_id))
+        self._pending_rows.append(len(self._accumulator) - rows)
+        if len(self._pending_point_ids) >= self.flush_points:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending_point_ids:
+            return
+        part_file = self._next_part_file()
+        self._atomic_write(
+            part_file, lambda path: pq.write_table(self._accumulator.to_table(), path)
+        )
+        self._manifest["parts"].append(
+            {"file": part_file, "point_ids": self._pending_point_ids, "rows": self._pending_rows}
+        )
+        self._write_manifest()
+        self._accumulator.clear()
+        self._pending_point_ids = []
+        self._pending_rows = []
+
+    def discard(self, point_ids: Iterable[int]) -> int:
+        """
+        Removes the rows of the written points among point_ids, returning how
+        many points were discarded. Parts holding them are rewritten without
+        their rows before the manifest points at the new parts.
+        """
+        point_ids = {int(point_id) for point_id in point_ids}
+        parts, replaced_files, discarded = [], [], 0
+        for part in self._manifest["parts"]:
+            keep = [point_id not in point_ids for point_id in part["point_ids"]]
+            if all(keep):
+                parts.append(part)
+                continue
+            discarded += keep.count(False)
+            replaced_files.append(part["file"])
+            if not any(keep):
+                continue
+            table = pq.read_table(os.path.join(self.folder, part["file"]))
+            table = table.filter(pa.array(np.repeat(keep, part["rows"])))
+            part_file = self._next_part_file()
+            self._atomic_write(part_file, lambda path: pq.write_table(table, path))
+            parts.append(
+                {
+                    "file": part_file,
+                    "point_ids": [
+                        point_id for point_id, kept in zip(part["point_ids"], keep) if kept
+                    ],
+                    "rows": [rows for rows, kept in zip(part["rows"], keep) if kept],
+                }
+            )
+        if not replaced_files:
+            return 0
+        self._manifest["parts"] = parts
+        self._write_manifest()
+        for part_file in replaced_files:
+            self._remove(part_file)
+        logging.info(f"Discarded {discarded} points from {len(replaced_files)} parts")
+        return discarded
+
+    def close(self) -> None:
+        self.flush()
+
+    def read(self) -> pd.DataFrame:
+        tables = [
+            pq.read_table(os.path.join(self.folder, part["file"]))
+            for part in self._manifest["parts"]
+        ]
+        if not tables:
+            return self._accumulator.to_df()
+        return pa.concat_tables(tables).to_pandas()
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        path = os.path.join(self.folder, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return {"job": None, "parts": [], "next_part": 0}
+        with open(path) as f:
+            return json.load(f)
+
+    def _next_part_file(self) -> str:
+        # Numbered by a counter, discarded parts leave gaps instead of reused names.
+        number = self._manifest.get("next_part", len(self._manifest["parts"]))
+        self._manifest["next_part"] = number + 1
+        return f"part-{number:05d}.parquet"
+
+    def _write_manifest(self) -> None:
+        def write(path):
+            with open(path, "w") as f:
+                json.dump(self._manifest, f)
+
+        self._atomic_write(MANIFEST_FILE, write)
+
+    def _atomic_write(self, file_name, write) -> None:
+        """Write to a temporary file first so a crash never leaves a partial file."""
+        path = os.path.join(self.folder, file_name)
+        write(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def _remove(self, file_name) -> None:
+        path = os.path.join(self.folder, file_name)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,52 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+
+class RateLimiter:
+    """
+    Caps the requests in flight to an endpoint and spaces their starts at
+    least 1 / requests_per_second apart, None leaves the rate unlimited.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        requests_per_second: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_in_flight = max_in_flight
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with self._slots:
+            with self._lock:
+                now = self.clock()
+                start = max(now, self._next_start)
+                self._next_start = start + self.interval
+            if start > now:
+                self.sleep(start - now)
+            yield
+
+
+_endpoint_limiters: Dict[Tuple[str, int, Optional[float]], RateLimiter] = {}
+_endpoint_limiters_lock = threading.Lock()
+
+
+def get_endpoint_limiter(
+    endpoint: str, max_in_flight: int, requests_per_second: Optional[float]
+) -> RateLimiter:
+    """Return the process wide limiter of an endpoint, shared by every caller with the same limits."""
+    key = (endpoint, max_in_flight, requests_per_second)
+    with _endpoint_limiters_lock:
+        if key not in _endpoint_limiters:
+            _endpoint_limiters[key] = RateLimiter(max_in_flight, requests_per_second)
+        return _endpoint_limiters[key]
@@ -0,0 +1,85 @@
+from typing import Dict, Sequence
+
+import numpy as np
+
+from open_geo_engine.utils.utils import chunked
+
+# Earth Engine computes images in tiles of 256 x 256 pixels.
+EE_TILE_PIXELS = 256
+METERS_PER_DEGREE = 111_320
+
+
+def hilbert_index(lons: Sequence[float], lats: Sequence[float], order: int = 16) -> np.ndarray:
+    """
+    Position of every point along a Hilbert curve of 2**order x 2**order cells
+    covering the bounding box of the points, so that points close on the curve
+    are close in space.
+    """
+    lons = np.asarray(lons, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    n = 1 << order
+    x = _to_grid(lons, n)
+    y = _to_grid(lats, n)
+
+    d = np.zeros(len(x), dtype=np.int64)
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve stays continuous.
+        flip = rx & ~ry
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+        s >>= 1
+    return d
+
+
+def spatial_order(lons: Sequence[float], lats: Sequence[float]) -> np.ndarray:
+    """Indices that sort the points along a Hilbert curve."""
+    return np.argsort(hilbert_index(lons, lats), kind="stable")
+
+
+def tile_degrees(scale: float) -> float:
+    """Approximate width in degrees of an Earth Engine tile at scale meters per pixel."""
+    return scale * EE_TILE_PIXELS / METERS_PER_DEGREE
+
+
+def chunk_locality(
+    lons: Sequence[float], lats: Sequence[float], chunk_size: int, tile_size: float
+) -> Dict[str, float]:
+    """
+    Describes how compact consecutive chunks of chunk_size points are: the mean
+    bounding box of a chunk in square degrees and the tiles of tile_size
+    degrees each chunk touches.
+    """
+    lons = np.asarray(lons, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    tile_x = np.floor(lons / tile_size).astype(np.int64)
+    tile_y = np.floor(lats / tile_size).astype(np.int64)
+    tile_y -= tile_y.min(initial=0)
+    tiles = tile_x * (tile_y.max(initial=0) + 1) + tile_y
+
+    bbox_areas = []
+    tiles_per_chunk = []
+    for chunk in chunked(np.arange(len(lons)), chunk_size):
+        bbox_areas.append(np.ptp(lons[chunk]) * np.ptp(lats[chunk]))
+        tiles_per_chunk.append(len(np.unique(tiles[chunk])))
+
+    if not tiles_per_chunk:
+        return {"chunks": 0, "mean_bbox_area": 0.0, "mean_tiles_per_chunk": 0.0, "tiles": 0}
+    return {
+        "chunks": len(tiles_per_chunk),
+        "mean_bbox_area": float(np.mean(bbox_areas)),
+        "mean_tiles_per_chunk": float(np.mean(tiles_per_chunk)),
+        "tiles": int(np.sum(tiles_per_chunk)),
+    }
+
+
+def _to_grid(values: np.ndarray, n: int) -> np.ndarray:
+    if not len(values):
+        return values.astype(np.int64)
+    low, high = values.min(), values.max()
+    extent = high - low if high > low else 1.0
+    return np.minimum(((values - low) / extent * n).astype(np.int64), n - 1)
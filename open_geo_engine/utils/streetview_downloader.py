@@ -0,0 +1,129 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth asking for again, the server is busy or briefly failing.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+DOWNLOADED = "downloaded"
+EXISTS = "exists"
+FAILED = "failed"
+
+
+class StreetViewDownloader:
+    """
+    Downloads images and JSON responses over one pooled HTTP session with at
+    most max_concurrent requests in flight. Images are streamed to disk,
+    files already present are skipped and busy or failing servers are
+    retried with a jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 16,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.5,
+        max_backoff_seconds: float = 30.0,
+        timeout_seconds: float = 30.0,
+        chunk_size: int = 64 * 1024,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.chunk_size = chunk_size
+        self.sleep = sleep
+
+        # Every worker thread reuses the connections of the same pool.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def download_many(self, urls: Sequence[str], paths: Sequence[str]) -> List[str]:
+        """
+        Downloads every url to the path at the same position, returning for
+        each whether it was "downloaded", already "exists" or "failed".
+        """
+        if len(urls) != len(paths):
+            raise ValueError(f"Got {len(urls)} urls for {len(paths)} paths")
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as pool:
+            statuses = list(pool.map(self.download, urls, paths))
+        logging.info(
+            f"Street View images: {statuses.count(DOWNLOADED)} downloaded, "
+            f"{statuses.count(EXISTS)} already present, {statuses.count(FAILED)} failed"
+        )
+        return statuses
+
+    def download(self, url: str, path: str) -> str:
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            return EXISTS
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        written = self._get(
+            url, lambda response: self._write(response, path), os.path.basename(path), stream=True
+        )
+        return FAILED if written is None else DOWNLOADED
+
+    def get_json_many(self, url: str, params: Sequence[Dict[str, Any]]) -> List[Optional[Any]]:
+        """The parsed JSON response to url with each of params, None when it failed."""
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as pool:
+            return list(pool.map(lambda request_params: self.get_json(url, request_params), params))
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        name = (params or {}).get("location", url)
+        return self._get(url, lambda response: response.json(), name, params=params)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _get(
+        self, url: str, read: Callable[[requests.Response], Any], name: str, **kwargs
+    ) -> Optional[Any]:
+        """read of the first successful response to url, None once the retries are spent."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.session.get(url, timeout=self.timeout_seconds, **kwargs) as response:
+                    if response.status_code == 200:
+                        return read(response)
+                    error = f"HTTP {response.status_code}"
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        break
+            except RETRY_ERRORS as e:
+                error = str(e)
+            except ValueError as e:
+                # A body that is not JSON is not worth asking for again.
+                error = str(e)
+                break
+            if attempt < self.max_retries:
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2**attempt)
+                self.sleep(delay * (1 + random.random()))
+        # The url holds the API key, only the request is named.
+        logging.warning(f"Request for {name} failed: {error}")
+        return None
+
+    def _write(self, response: requests.Response, path: str) -> str:
+        """Write to a temporary file first so a failed download never leaves a partial image."""
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+            return path
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Sequence, Set
+
+from open_geo_engine.utils.utils import chunked
+
+# SQLite limits the number of bound parameters in a single statement.
+QUERY_BATCH_SIZE = 500
+INDEX_FILE = "index.sqlite"
+IMAGE_SUFFIX = ".jpg"
+
+
+class StreetViewImageStore:
+    """
+    Street View images stored once per key, the hash of what they show: the
+    pano_id or location requested with its size, heading and pitch. Images
+    live in folder/<k[:2]>/<k[2:4]>/<k>.jpg so no directory grows past a few
+    thousand files, and an SQLite index answers has() without touching the
+    file system. Files removed by hand are reconciled by compact().
+    """
+
+    def __init__(self, folder: str, index_path: Optional[str] = None):
+        self.folder = folder
+        self.index_path = index_path or os.path.join(folder, INDEX_FILE)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(folder, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        self._connection = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS images (
+                key TEXT PRIMARY KEY,
+                subject TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def key(
+        subject: str, size: str, heading: Optional[str] = None, pitch: Optional[str] = None
+    ) -> str:
+        """The key of the image of subject, a pano_id or "lat,lon" location."""
+        request = json.dumps([str(subject), str(size), heading, pitch])
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], key[2:4], f"{key}{IMAGE_SUFFIX}")
+
+    def has(self, key: str) -> bool:
+        return key in self.has_many([key])
+
+    def has_many(self, keys: Sequence[str]) -> Set[str]:
+        """The keys among keys with an image in the store."""
+        found: Set[str] = set()
+        with self._lock:
+            for batch in chunked(list(dict.fromkeys(keys)), QUERY_BATCH_SIZE):
+                rows = self._connection.execute(
+                    f"SELECT key FROM images WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(key for key, in rows)
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def add_many(self, items: Iterable[tuple]) -> None:
+        """Indexes the (key, subject) items whose image was written to path(key)."""
+        now = time.time()
+        rows = [
+            (key, str(subject), os.path.getsize(self.path(key)), now)
+            for key, subject in items
+            if os.path.exists(self.path(key))
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO images (key, subject, bytes, created_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._connection.commit()
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Drops the index entries whose image is gone, and deletes the images
+        and leftover temporary files the index does not know. Run it while
+        nothing is downloading into the store.
+        """
+        with self._lock:
+            indexed = {key for key, in self._connection.execute("SELECT key FROM images")}
+            on_disk = set()
+            removed_files = 0
+            for path in self._shard_files():
+                key, suffix = os.path.splitext(os.path.basename(path))
+                if suffix == IMAGE_SUFFIX and key in indexed:
+                    on_disk.add(key)
+                    continue
+                os.remove(path)
+                removed_files += 1
+            missing = sorted(indexed - on_disk)
+            for batch in chunked(missing, QUERY_BATCH_SIZE):
+                self._connection.execute(
+                    f"DELETE FROM images WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+            self._connection.commit()
+            self._connection.execute("VACUUM")
+        counts = {
+            "images": len(on_disk),
+            "removed_files": removed_files,
+            "removed_entries": len(missing),
+        }
+        logging.info(f"Street View image store compacted: {counts}")
+        return counts
+
+    def _shard_files(self) -> Iterable[str]:
+        for first in os.scandir(self.folder):
+            if not (first.is_dir() and len(first.name) == 2):
+                continue
+            for second in os.scandir(first.path):
+                if not (second.is_dir() and len(second.name) == 2):
+                    continue
+                for entry in os.scandir(second.path):
+                    if entry.is_file():
+                        yield entry.path
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,93 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from open_geo_engine.utils.utils import chunked
+
+# SQLite limits the number of bound parameters in a single statement.
+QUERY_BATCH_SIZE = 500
+# Answers about the location itself. Errors such as REQUEST_DENIED or
+# OVER_QUERY_LIMIT depend on the key and the moment, and are asked again.
+CACHEABLE_STATUSES = {"OK", "ZERO_RESULTS", "NOT_FOUND"}
+
+
+class StreetViewMetadataCache:
+    """
+    Parsed Street View metadata responses cached in SQLite per location
+    string, expired after ttl_seconds.
+    """
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS metadata (
+                location TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.commit()
+
+    def get_many(self, locations: Sequence[str]) -> Dict[str, Any]:
+        oldest = time.time() - self.ttl_seconds if self.ttl_seconds is not None else None
+        found: Dict[str, Any] = {}
+        with self._lock:
+            for batch in chunked(list(locations), QUERY_BATCH_SIZE):
+                rows = self._connection.execute(
+                    "SELECT location, payload, created_at FROM metadata"
+                    f" WHERE location IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update(
+                    (location, json.loads(payload))
+                    for location, payload, created_at in rows
+                    if oldest is None or created_at > oldest
+                )
+            self.hits += len(found)
+            self.misses += len(set(locations)) - len(found)
+        return found
+
+    def put_many(self, items: Iterable[tuple]) -> None:
+        """Stores the (location, metadata) items whose status is worth keeping."""
+        now = time.time()
+        rows = [
+            (location, json.dumps(metadata), now)
+            for location, metadata in items
+            if metadata is not None and metadata.get("status") in CACHEABLE_STATUSES
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO metadata (location, payload, created_at) VALUES (?, ?, ?)",
+                rows,
+            )
+            if self.ttl_seconds is not None:
+                self._connection.execute(
+                    "DELETE FROM metadata WHERE created_at <= ?", (now - self.ttl_seconds,)
+                )
+            self._connection.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        self._connection.close()
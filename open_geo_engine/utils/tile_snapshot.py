@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+MANIFEST_FILE = "manifest.json"
+OSM_KEY = ["osm_type", "osm_id"]
+# Centroids closer than this many degrees, about a centimeter, have not moved.
+MOVED_TOLERANCE_DEGREES = 1e-7
+
+
+def content_hash(centroids: pd.DataFrame) -> str:
+    """Hash of a centroid table that does not depend on the order of its rows."""
+    centroids = centroids.astype({"osm_type": str}).sort_values(OSM_KEY, kind="stable")
+    row_hashes = pd.util.hash_pandas_object(centroids, index=False).to_numpy()
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
+
+
+def centroid_diff(previous: pd.DataFrame, current: pd.DataFrame) -> pd.DataFrame:
+    """
+    The centroids added, removed or moved between two centroid tables, keyed
+    on the OSM element. Removed centroids keep their previous coordinates, and
+    the previous coordinates of removed and moved ones are in lon_previous and
+    lat_previous.
+    """
+    columns = OSM_KEY + ["lon", "lat"]
+    merged = pd.merge(
+        previous[columns].astype({"osm_type": str}),
+        current[columns].astype({"osm_type": str}),
+        on=OSM_KEY,
+        how="outer",
+        suffixes=("_previous", ""),
+        indicator=True,
+    )
+    added = merged["_merge"] == "right_only"
+    removed = merged["_merge"] == "left_only"
+    moved = (merged["_merge"] == "both") & ~(
+        np.isclose(merged["lon"], merged["lon_previous"], rtol=0, atol=MOVED_TOLERANCE_DEGREES)
+        & np.isclose(merged["lat"], merged["lat_previous"], rtol=0, atol=MOVED_TOLERANCE_DEGREES)
+    )
+    merged["lon"] = merged["lon"].where(~removed, merged["lon_previous"])
+    merged["lat"] = merged["lat"].where(~removed, merged["lat_previous"])
+    merged["change"] = np.select([added, removed, moved], ["added", "removed", "moved"], "")
+    diff = merged.loc[merged["change"] != "", columns + ["lon_previous", "lat_previous", "change"]]
+    return diff.reset_index(drop=True)
+
+
+class TileSnapshotStore:
+    """
+    Per-tile centroid snapshots of one location: a Parquet file per tile and
+    a manifest with when each tile was fetched and the hash of its centroids.
+
+    A store opened with a different job description, for instance other tags
+    or tile size, starts afresh.
+    """
+
+    def __init__(self, folder: str, job: Optional[Dict[str, Any]] = None):
+        self.folder = folder
+        self.job = json.loads(json.dumps(job or {}, default=str))
+
+        os.makedirs(folder, exist_ok=True)
+        self._manifest = self._read_manifest()
+        if self._manifest["job"] != self.job:
+            if self._manifest["tiles"]:
+                logging.info(f"Job changed, discarding {len(self._manifest['tiles'])} tiles")
+            self.retain([])
+            self._manifest["job"] = self.job
+
+    @staticmethod
+    def tile_key(tile) -> str:
+        return "_".join(f"{bound:.6f}" for bound in tile.bounds)
+
+    def is_stale(self, key: str, max_age_seconds: float, now: float) -> bool:
+        entry = self._manifest["tiles"].get(key)
+        return entry is None or now - entry["fetched_at"] >= max_age_seconds
+
+    def put(self, key: str, centroids: pd.DataFrame, fetched_at: float) -> bool:
+        """Stores the centroids of a tile, returning whether they differ from its snapshot."""
+        digest = content_hash(centroids)
+        entry = self._manifest["tiles"].get(key)
+        changed = entry is None or entry["hash"] != digest
+        if changed:
+            file_name = f"tile-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.parquet"
+            self._atomic_write(file_name, lambda path: centroids.to_parquet(path, index=False))
+            entry = {"file": file_name, "hash": digest}
+        self._manifest["tiles"][key] = {**entry, "fetched_at": fetched_at}
+        return changed
+
+    def retain(self, keys: Iterable[str]) -> None:
+        """Drops the snapshots of every tile not in keys."""
+        keys = set(keys)
+        for key in list(self._manifest["tiles"]):
+            if key not in keys:
+                self._remove(self._manifest["tiles"].pop(key)["file"])
+
+    def read(self) -> pd.DataFrame:
+        """The centroids of every tile, once per OSM element."""
+        tables = [
+            pd.read_parquet(os.path.join(self.folder, entry["file"]))
+            for entry in self._manifest["tiles"].values()
+        ]
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return pd.DataFrame(
+                {
+                    "osm_type": pd.Series(dtype=str),
+                    "osm_id": pd.Series(dtype=np.int64),
+                    "lon": pd.Series(dtype=np.float64),
+                    "lat": pd.Series(dtype=np.float64),
+                }
+            )
+        centroids = pd.concat(tables, ignore_index=True).astype({"osm_type": str})
+        return centroids.drop_duplicates(OSM_KEY).reset_index(drop=True)
+
+    def save(self) -> None:
+        def write(path):
+            with open(path, "w") as f:
+                json.dump(self._manifest, f)
+
+        self._atomic_write(MANIFEST_FILE, write)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        path = os.path.join(self.folder, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return {"job": None, "tiles": {}}
+        with open(path) as f:
+            return json.load(f)
+
+    def _atomic_write(self, file_name, write) -> None:
+        """Write to a temporary file first so a crash never leaves a partial file."""
+        path = os.path.join(self.folder, file_name)
+        write(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def _remove(self, file_name) -> None:
+        path = os.path.join(self.folder, file_name)
+        if os.path.exists(path):
+            os.remove(path)
@@ -1,9 +1,11 @@
 import json
-from typing import Any
+from typing import Any, Iterable, Iterator, Optional, Sequence
 
 import pandas as pd
 from pydantic.json import pydantic_encoder
 
+from open_geo_engine.utils.columnar_accumulator import ColumnarAccumulator
+
 
 def ee_array_to_df(arr, list_of_bands):
     """Transforms client-side ee.Image.getRegion array to pandas.DataFrame."""
@@ -29,6 +31,27 @@ def ee_array_to_df(arr, list_of_bands):
     return df
 
 
+def ee_arrays_to_df(arrs: Iterable[Optional[list]], list_of_bands: Sequence[str]) -> pd.DataFrame:
+    """
+    Transforms many client-side ee.Image.getRegion arrays into a single
+    pandas.DataFrame with the columns of ee_array_to_df.
+
+    Rows are written straight into typed NumPy columns instead of building a
+    frame per array, bands are returned as float32, time as int64 milliseconds.
+    """
+    accumulator = ColumnarAccumulator(list_of_bands)
+    for arr in arrs:
+        accumulator.append_region_array(arr)
+    return accumulator.to_df()
+
+
+def chunked(items: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    """Yields consecutive slices of at most size items."""
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
 def read_csv(path: str, **kwargs: Any) -> pd.DataFrame:
     """
     Read csv ensuring that nan's are not parsed
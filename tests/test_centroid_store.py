@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+from open_geo_engine.utils.centroid_store import CentroidStore, country_boxes, normalize_bbox
+from open_geo_engine.utils.spatial_partition import METERS_PER_DEGREE
+
+
+def _random_centroids(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {"lon": rng.uniform(-3.8, -3.6, n), "lat": rng.uniform(40.3, 40.5, n)},
+        index=np.arange(n) * 10,
+    )
+
+
+def test_query_bbox_matches_a_full_scan():
+    centroids = _random_centroids()
+    store = CentroidStore(centroids, cell_size_degrees=0.01)
+
+    for bbox in [(-3.75, 40.35, -3.65, 40.45), (-3.7, 40.4, -3.7, 40.4), (0, 0, 1, 1)]:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        expected = np.flatnonzero(
+            centroids["lon"].between(min_lon, max_lon) & centroids["lat"].between(min_lat, max_lat)
+        )
+        assert store.query_bbox(bbox).tolist() == expected.tolist()
+
+    # Corners may come in any order, and clip keeps the index of the table.
+    positions = store.query_bbox((-3.75, 40.35, -3.65, 40.45))
+    clipped = store.clip((-3.65, 40.45, -3.75, 40.35))
+    assert clipped.index.tolist() == centroids.index[positions].tolist()
+
+
+def test_duplicated_marks_later_points_within_tolerance():
+    centroids = pd.DataFrame(
+        {
+            # About 0.5 m, 5 m and 0.8 m apart, the last pair across a cell border.
+            "lon": [-3.7, -3.700005, -3.70006, 9.9999964, 10.0000036],
+            "lat": [40.4, 40.4, 40.4, 0.0, 0.0],
+        }
+    )
+    store = CentroidStore(centroids)
+
+    assert store.duplicated(1.0).tolist() == [False, True, False, False, True]
+    assert store.duplicated(None).tolist() == [False] * 5
+    assert store.deduplicate(10.0).index.tolist() == [0, 3]
+
+
+def test_duplicated_matches_pairwise_distances():
+    centroids = _random_centroids(500, seed=1)
+    tolerance_meters = 200.0
+    lons, lats = centroids["lon"].to_numpy(), centroids["lat"].to_numpy()
+    x = lons * np.cos(np.radians(lats)) * METERS_PER_DEGREE
+    y = lats * METERS_PER_DEGREE
+    distances = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :])
+    expected = np.tril(distances <= tolerance_meters, k=-1).any(axis=1)
+
+    assert CentroidStore(centroids).duplicated(tolerance_meters).tolist() == expected.tolist()
+
+
+def test_assign_countries_by_bbox_and_polygon():
+    centroids = pd.DataFrame({"x": [0.5, 1.5, 2.5, 5.0], "y": [0.5, 0.5, 0.5, 5.0]})
+    countries = [("A", (0, 0, 2, 1)), ("B", (1, 0, 3, 1)), ("World", (180, 90, -180, -90))]
+    store = CentroidStore(centroids, x="x", y="y")
+
+    assert store.assign_countries(countries).tolist() == ["A", "A", "B", "World"]
+    # Only the part of A west of lon 1 belongs to it.
+    polygons = {"A": box(0, 0, 1, 1)}
+    assert store.assign_countries(countries, polygons).tolist() == ["A", "B", "B", "World"]
+    assert store.assign_countries(countries[:1]).tolist() == ["A", "A", None, None]
+
+
+def test_country_boxes_fall_back_to_the_world():
+    bounding_boxes = {
+        "ES": ("Spain", (-9.4, 35.9, 3.0, 43.7)),
+        "WO": ("World", (180, 90, -180, -90)),
+    }
+
+    assert country_boxes(["ES", "XX"], bounding_boxes) == [
+        ("Spain", (-9.4, 35.9, 3.0, 43.7)),
+        ("World", (180, 90, -180, -90)),
+    ]
+    assert normalize_bbox((180, 90, -180, -90)) == (-180, -90, 180, 90)
@@ -0,0 +1,43 @@
+import numpy as np
+
+from open_geo_engine.utils.columnar_accumulator import ColumnarAccumulator
+
+HEADER = ["id", "longitude", "latitude", "time", "B4"]
+
+
+def test_accumulator_grows_geometrically():
+    accumulator = ColumnarAccumulator(["B4"], initial_capacity=2)
+    for point in range(5):
+        accumulator.append_region_array([HEADER, [f"{point}", point, point, point * 1000, point]])
+
+    assert len(accumulator) == 5
+    assert accumulator.capacity == 8
+    df = accumulator.to_df()
+    assert df["longitude"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert df["B4"].dtype == np.float32
+    assert str(df["datetime"][1]) == "1970-01-01 00:00:01"
+
+
+def test_accumulator_drops_rows_without_data_and_can_be_reused():
+    accumulator = ColumnarAccumulator(["B4"])
+    accumulator.append_region_array(None)
+    accumulator.append_region_array([HEADER, ["0", 1.0, 2.0, 1000, None], ["1", 1.0, 2.0, 2000, 7]])
+
+    df = accumulator.to_df()
+    accumulator.clear()
+    accumulator.append_region_array([HEADER, ["2", 5.0, 6.0, 3000, 8]])
+
+    assert df["time"].tolist() == [2000]
+    assert accumulator.to_df()["time"].tolist() == [3000]
+
+
+def test_accumulator_keeps_partial_rows_when_how_is_all():
+    accumulator = ColumnarAccumulator(["B4", "B3"], how="all")
+    header = ["id", "longitude", "latitude", "time", "B4", "B3"]
+    accumulator.append_region_array(
+        [header, ["0", 1.0, 2.0, 1000, None, 3], ["1", 1.0, 2.0, 2000, None, None]]
+    )
+
+    df = accumulator.to_df()
+    assert df["time"].tolist() == [1000]
+    assert np.isnan(df["B4"][0])
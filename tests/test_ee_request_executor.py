@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+from ee.ee_exception import EEException
+
+from open_geo_engine.utils.ee_request_executor import EERequestExecutor, is_quota_error
+
+
+class FakeEE:
+    """Stands in for Earth Engine, answering getInfo calls after a delay and
+    rejecting them once more than quota calls are running at once."""
+
+    def __init__(self, latency=0.01, quota=None):
+        self.latency = latency
+        self.quota = quota
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rejections = 0
+        self.lock = threading.Lock()
+
+    def getInfo(self, value):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            rejected = self.quota is not None and self.in_flight > self.quota
+            self.rejections += rejected
+        try:
+            if rejected:
+                raise EEException("Too many concurrent aggregations.")
+            time.sleep(self.latency)
+            return value * 2
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def test_results_are_returned_in_order_within_global_cap():
+    fake_ee = FakeEE()
+    executor = EERequestExecutor(max_in_flight_per_country=8, max_in_flight=3)
+
+    assert executor.map(fake_ee.getInfo, range(20)) == [value * 2 for value in range(20)]
+    assert fake_ee.max_in_flight <= 3
+
+
+def test_quota_rejections_are_retried():
+    fake_ee = FakeEE(quota=2)
+    executor = EERequestExecutor(
+        max_in_flight_per_country=6,
+        max_in_flight=6,
+        max_retries=10,
+        backoff_seconds=0.005,
+        max_backoff_seconds=0.05,
+    )
+
+    assert executor.map(fake_ee.getInfo, range(12)) == [value * 2 for value in range(12)]
+    assert fake_ee.rejections > 0
+
+
+def test_other_errors_are_not_retried():
+    calls = []
+
+    def fail(value):
+        calls.append(value)
+        raise EEException("Image.select: Pattern 'B4' did not match any bands.")
+
+    executor = EERequestExecutor(max_in_flight_per_country=1, sleep=lambda _: None)
+    with pytest.raises(EEException):
+        executor.map(fail, [1])
+    assert calls == [1]
+    assert is_quota_error(EEException("Too many concurrent aggregations."))
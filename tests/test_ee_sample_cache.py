@@ -0,0 +1,59 @@
+from open_geo_engine.utils.ee_sample_cache import EESampleCache
+
+REGION_ARRAY = [
+    ["id", "longitude", "latitude", "time", "B4"],
+    ["0_0", -3.68, 40.41, 1578653746335, 7053],
+]
+
+
+def test_cache_round_trip(tmp_path):
+    cache = EESampleCache(str(tmp_path / "samples.sqlite"), max_bytes=10**6)
+    key = cache.key(
+        "LANDSAT/LC08/C01/T1",
+        ["B4"],
+        -3.683317243711068,
+        40.41498005371624,
+        10,
+        "2020-01-01",
+        "2020-01-31",
+    )
+
+    assert cache.get_many([key]) == {}
+    cache.put_many([(key, REGION_ARRAY)])
+
+    assert cache.get_many([key]) == {key: REGION_ARRAY}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_key_rounds_coordinates(tmp_path):
+    cache = EESampleCache(str(tmp_path / "samples.sqlite"), max_bytes=10**6, precision=5)
+
+    assert cache.key("NOAA/GFS0P25", ["B4"], 1.000001, 2.0, 10, "a", "b") == cache.key(
+        "NOAA/GFS0P25", ["B4"], 1.0, 2.0, 10, "a", "b"
+    )
+    assert cache.key("NOAA/GFS0P25", ["B4"], 1.0, 2.0, 10, "a", "b") != cache.key(
+        "NOAA/GFS0P25", ["B4"], 1.0, 2.0, 30, "a", "b"
+    )
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EESampleCache(str(tmp_path / "samples.sqlite"), max_bytes=10**6)
+    cache.put_many([("first", REGION_ARRAY)])
+    cache.max_bytes = 2 * cache.size_bytes()
+
+    cache.put_many([("second", REGION_ARRAY)])
+    cache.get_many(["first"])
+    cache.put_many([("third", REGION_ARRAY)])
+
+    assert set(cache.get_many(["first", "second", "third"])) == {"first", "third"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_is_created_on_first_use(tmp_path):
+    path = tmp_path / "ee_cache" / "samples.sqlite"
+    cache = EESampleCache(str(path), max_bytes=10**6)
+
+    assert not path.exists()
+    assert cache.stats()["size_bytes"] == 0
+    assert path.exists()
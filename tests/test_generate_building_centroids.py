@@ -1,6 +1,20 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import geopandas as gpd
+import numpy as np
+import osmnx as ox
+import pandas as pd
+import pytest
+from osmnx import downloader
+from shapely.geometry import box
+
 from open_geo_engine.src.generate_building_centroids import (
     GenerateBuildingCentroids,
 )
+from open_geo_engine.utils.overpass_cache import OverpassResponseCache
 
 
 def test_get_boundaries_from_place():
@@ -14,7 +28,264 @@ def test_get_boundaries_from_place():
         1,
         20,
     )
-    assert generate_building_centroids.get_representative_building_point((1, 20)).shape == (
+    assert generate_building_centroids.get_representative_building_point("ES").shape == (
         1,
         21,
     )
+
+
+OVERPASS_RESPONSE = {
+    "elements": [
+        {"type": "node", "id": 1, "lat": 0.19, "lon": 0.19},
+        {"type": "node", "id": 2, "lat": 0.19, "lon": 0.21},
+        {"type": "node", "id": 3, "lat": 0.21, "lon": 0.21},
+        {"type": "node", "id": 4, "lat": 0.21, "lon": 0.19},
+        {"type": "way", "id": 10, "nodes": [1, 2, 3, 4, 1], "tags": {"building": "school"}},
+    ]
+}
+
+
+@pytest.fixture
+def overpass_endpoint():
+    """Local stand-in for the Overpass API returning a school across the tile borders."""
+    stats = {"requests": [], "in_flight": 0, "max_in_flight": 0}
+    lock = threading.Lock()
+
+    class OverpassHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            with lock:
+                stats["requests"].append(self.rfile.read(int(self.headers["Content-Length"])))
+                stats["in_flight"] += 1
+                stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            time.sleep(0.02)
+            with lock:
+                stats["in_flight"] -= 1
+            body = json.dumps(OVERPASS_RESPONSE).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OverpassHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings = ox.settings.overpass_endpoint, ox.settings.overpass_rate_limit, ox.settings.use_cache
+    ox.settings.overpass_endpoint = f"http://127.0.0.1:{server.server_address[1]}/api"
+    ox.settings.overpass_rate_limit = False
+    ox.settings.use_cache = False
+    yield stats
+    ox.settings.overpass_endpoint, ox.settings.overpass_rate_limit, ox.settings.use_cache = settings
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_boundaries_from_tiles(overpass_endpoint):
+    generate_building_centroids = GenerateBuildingCentroids(
+        [("Test", (0.0, 0.0, 0.4, 0.4))],
+        "Test",
+        {"building": "school"},
+        tile_size_degrees=0.2,
+        tile_area="bbox",
+        max_concurrent_tiles=4,
+        overpass_max_in_flight=4,
+        overpass_requests_per_second=None,
+    )
+
+    building_footprints = generate_building_centroids.get_representative_building_point(
+        ("Test", (0.0, 0.0, 0.4, 0.4))
+    )
+
+    assert len(overpass_endpoint["requests"]) == 4
+    assert list(building_footprints.index) == [("way", 10)]
+    assert building_footprints["centroid_geometry"].iloc[0].within(box(0.19, 0.19, 0.21, 0.21))
+
+
+def test_iter_execute_limits_requests_per_endpoint(overpass_endpoint, monkeypatch):
+    generate_building_centroids = GenerateBuildingCentroids(
+        [("A", (0.0, 0.0, 0.4, 0.4)), ("B", (0.1, 0.1, 0.3, 0.3)), ("C", (0.15, 0.15, 0.25, 0.25))],
+        "Test",
+        {"building": "school"},
+        tile_size_degrees=0.5,
+        tile_area="bbox",
+        max_concurrent_locations=3,
+        overpass_max_in_flight=1,
+        overpass_requests_per_second=None,
+    )
+    # Keep the test from writing to the osmnx cache.
+    monkeypatch.setattr(GenerateBuildingCentroids, "_configure_osmnx", lambda self: None)
+
+    building_footprint_gdfs = list(generate_building_centroids.iter_execute())
+
+    assert len(building_footprint_gdfs) == 3
+    assert len(overpass_endpoint["requests"]) == 3
+    assert overpass_endpoint["max_in_flight"] == 1
+
+
+def test_execute_centroids_reduces_every_location_to_centroids(overpass_endpoint, monkeypatch):
+    generate_building_centroids = GenerateBuildingCentroids(
+        [("A", (0.0, 0.0, 0.4, 0.4)), ("B", (0.1, 0.1, 0.3, 0.3))],
+        "Test",
+        {"building": "school"},
+        tile_size_degrees=0.5,
+        tile_area="bbox",
+        overpass_requests_per_second=None,
+    )
+    monkeypatch.setattr(GenerateBuildingCentroids, "_configure_osmnx", lambda self: None)
+    to_centroids = GenerateBuildingCentroids.to_centroids
+    reduced = []
+
+    def count_to_centroids(self, building_footprints):
+        reduced.append(len(building_footprints))
+        return to_centroids(self, building_footprints)
+
+    monkeypatch.setattr(GenerateBuildingCentroids, "to_centroids", count_to_centroids)
+
+    centroids = generate_building_centroids.execute_centroids()
+
+    # Both locations return way 10, each is reduced on its own and deduplicated.
+    assert reduced == [1, 1]
+    assert centroids[["osm_type", "osm_id"]].values.tolist() == [["way", 10]]
+    assert list(centroids.columns) == ["osm_type", "osm_id", "lon", "lat", "name"]
+
+
+def test_get_building_points_for_points_merges_overlapping_queries(overpass_endpoint):
+    generate_building_centroids = GenerateBuildingCentroids(
+        [], "Test", {"building": "school"}, overpass_requests_per_second=None
+    )
+    # The first two search boxes overlap, the third one misses the school.
+    points = [(0.2, 0.2), (0.205, 0.21), (0.3, 0.3)]
+
+    building_footprints = generate_building_centroids.get_building_points_for_points(points)
+
+    assert len(overpass_endpoint["requests"]) == 2
+    assert list(building_footprints.index) == [("way", 10), ("way", 10)]
+    assert sorted(building_footprints["point_index"]) == [0, 1]
+    assert sorted(building_footprints["point_latitude"]) == [0.2, 0.205]
+
+
+def test_is_point():
+    assert GenerateBuildingCentroids._is_point((41.4, 2.17))
+    assert GenerateBuildingCentroids._is_point([41.4, 2.17])
+    assert not GenerateBuildingCentroids._is_point(("ES", (-9.39, 35.95, 3.04, 43.75)))
+    assert not GenerateBuildingCentroids._is_point("Iraq")
+
+
+def test_refresh_downloads_stale_tiles_and_reports_changes(
+    overpass_endpoint, tmp_path, monkeypatch
+):
+    location = ("Test", (0.0, 0.0, 0.4, 0.4))
+
+    def refresh(max_age_days):
+        generate_building_centroids = GenerateBuildingCentroids(
+            [location],
+            "Test",
+            {"building": "school"},
+            tile_size_degrees=0.2,
+            tile_area="bbox",
+            overpass_requests_per_second=None,
+            snapshot_folder=str(tmp_path),
+            snapshot_max_age_days=max_age_days,
+        )
+        return generate_building_centroids.refresh_for_country(location)
+
+    centroids, diff = refresh(max_age_days=7)
+    assert len(overpass_endpoint["requests"]) == 4
+    assert centroids["osm_id"].tolist() == [10]
+    assert diff["change"].tolist() == ["added"]
+
+    centroids, diff = refresh(max_age_days=7)
+    assert len(overpass_endpoint["requests"]) == 4
+    assert centroids["osm_id"].tolist() == [10]
+    assert diff.empty
+
+    moved_nodes = [
+        {**element, "lon": element["lon"] + 0.005} if element["type"] == "node" else element
+        for element in OVERPASS_RESPONSE["elements"]
+    ]
+    monkeypatch.setitem(OVERPASS_RESPONSE, "elements", moved_nodes)
+    centroids, diff = refresh(max_age_days=0)
+    assert len(overpass_endpoint["requests"]) == 8
+    assert diff[["osm_id", "change"]].values.tolist() == [[10, "moved"]]
+
+
+def test_response_cache_serves_repeated_queries(overpass_endpoint, tmp_path, monkeypatch):
+    for name in ("_retrieve_from_cache", "_save_to_cache"):
+        monkeypatch.setattr(downloader, name, getattr(downloader, name))
+    response_cache = OverpassResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=10**6)
+    generate_building_centroids = GenerateBuildingCentroids(
+        [("Test", (0.0, 0.0, 0.4, 0.4))],
+        "Test",
+        {"building": "school"},
+        tile_size_degrees=0.2,
+        tile_area="bbox",
+        overpass_requests_per_second=None,
+        response_cache=response_cache,
+    )
+
+    first = generate_building_centroids.execute()
+    second = generate_building_centroids.execute()
+
+    assert len(overpass_endpoint["requests"]) == 4
+    pd.testing.assert_frame_equal(first, second)
+    assert response_cache.stats()["hits"] == 4
+
+
+def test_get_tiles_clips_to_area():
+    generate_building_centroids = GenerateBuildingCentroids(
+        [], "Test", {"building": "school"}, tile_size_degrees=0.5
+    )
+
+    tiles = generate_building_centroids._get_tiles(box(0.0, 0.0, 1.0, 0.75))
+
+    assert len(tiles) == 4
+    assert sum(tile.area for tile in tiles) == pytest.approx(0.75)
+
+
+def test_to_centroids(tmp_path):
+    building_footprints = gpd.GeoDataFrame(
+        {"name": ["School A", None], "building": ["school", "school"]},
+        geometry=[box(0.0, 0.0, 0.01, 0.01), box(1.0, 1.0, 1.01, 1.01)],
+        index=pd.MultiIndex.from_tuples(
+            [("way", 10), ("relation", 20)], names=["element_type", "osmid"]
+        ),
+        crs="epsg:4326",
+    )
+    building_footprints["centroid_geometry"] = building_footprints.representative_point()
+    generate_building_centroids = GenerateBuildingCentroids(
+        [], "Test", {"building": "school"}, centroid_tags=["name", "amenity"]
+    )
+
+    centroids = generate_building_centroids.to_centroids(building_footprints)
+    generate_building_centroids.write_centroids(centroids, str(tmp_path / "centroids.parquet"))
+
+    assert list(centroids.columns) == ["osm_type", "osm_id", "lon", "lat", "name", "amenity"]
+    assert list(centroids["osm_id"]) == [10, 20]
+    assert centroids["lon"].dtype == np.float64
+    assert centroids["lon"].tolist() == pytest.approx([0.005, 1.005])
+    assert centroids["name"].isna().tolist() == [False, True]
+    pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "centroids.parquet"), centroids)
+
+
+def test_deduplicate_drops_repeated_elements_and_near_duplicates():
+    generate_building_centroids = GenerateBuildingCentroids([], "Test", {"building": "school"})
+    centroids = pd.DataFrame(
+        {
+            "osm_type": pd.Categorical(["way", "way", "node", "way"]),
+            "osm_id": np.array([10, 10, 11, 12], dtype=np.int64),
+            # The node is 0.5 m from way 10, way 12 is 50 m away.
+            "lon": [0.2, 0.2, 0.2000045, 0.20045],
+            "lat": [0.2, 0.2, 0.2, 0.2],
+        }
+    )
+
+    assert generate_building_centroids.deduplicate(centroids)["osm_id"].tolist() == [10, 12]
+
+    generate_building_centroids.dedup_tolerance_meters = None
+    assert generate_building_centroids.deduplicate(centroids)["osm_id"].tolist() == [10, 11, 12]
+
+    points = centroids.assign(point_index=[0, 1, 1, 1])
+    assert generate_building_centroids.deduplicate(points)["point_index"].tolist() == [0, 1, 1, 1]
@@ -0,0 +1,61 @@
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString, MultiPolygon, Point, Polygon, box
+
+from open_geo_engine.utils.geometry import (
+    location_key,
+    points_xy,
+    representative_points,
+    wkt_points_xy,
+)
+
+
+def test_representative_points_lie_within_mixed_geometries():
+    # A U shaped polygon whose centroid falls outside of it.
+    u_shape = Polygon([(0, 0), (3, 0), (3, 3), (2, 3), (2, 1), (1, 1), (1, 3), (0, 3)])
+    geometries = gpd.GeoSeries(
+        [
+            u_shape,
+            MultiPolygon([box(5, 5, 6, 6), box(8, 8, 9, 9)]),
+            Point(1, 2),
+            LineString([(0, 0), (2, 0)]),
+        ],
+        index=[10, 11, 12, 13],
+        crs="epsg:4326",
+    )
+
+    points = representative_points(geometries)
+
+    assert list(points.index) == [10, 11, 12, 13]
+    assert points.crs == geometries.crs
+    assert all(geometry.intersects(point) for geometry, point in zip(geometries, points))
+
+
+def test_points_xy():
+    x, y = points_xy([Point(1.5, -2.5), Point(3.0, 4.0)])
+
+    assert x.dtype == np.float64
+    assert x.tolist() == [1.5, 3.0]
+    assert y.tolist() == [-2.5, 4.0]
+
+
+def test_wkt_points_xy():
+    wkt = ["POINT (-3.68328454639349 40.41494595)", "POINT(1e-3 2E2)", "POINT Z (1 2 3)", None]
+
+    x, y = wkt_points_xy(wkt)
+
+    assert x[:3].tolist() == [-3.68328454639349, 1e-3, 1.0]
+    assert y[:3].tolist() == [40.41494595, 200.0, 2.0]
+    assert np.isnan(x[3]) and np.isnan(y[3])
+
+
+def test_location_key_is_exact_to_a_centimeter():
+    keys = location_key(
+        [40.41498005371624, 40.414980053716244, 40.4149802, -90.0, 90.0, 91.0, np.nan],
+        [-3.683317243711068, -3.683317243711068, -3.6833172, -180.0, 180.0, 0.0, 0.0],
+    )
+
+    assert keys[0] == keys[1]
+    assert keys[2] != keys[0]
+    assert keys[3] == 0 and keys[4] == (1_800_000_000 << 32) | 3_600_000_000
+    assert keys[5] == keys[6] == -1
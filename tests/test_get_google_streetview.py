@@ -1,8 +1,77 @@
+import json
 import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
 
 import pandas as pd
+import pytest
 
 from open_geo_engine.src.get_google_streetview import GetGoogleStreetView
+from open_geo_engine.utils.geometry import location_key
+from open_geo_engine.utils.streetview_downloader import StreetViewDownloader
+from open_geo_engine.utils.streetview_image_store import StreetViewImageStore
+from open_geo_engine.utils.streetview_metadata_cache import StreetViewMetadataCache
+
+
+@pytest.fixture
+def streetview_api():
+    """
+    Local stand-in for the Street View metadata and image APIs. Locations
+    south of the equator have no coverage, the others snap to a panorama per
+    0.001 degrees.
+    """
+    stats = {"locations": [], "panoramas": [], "in_flight": 0, "max_in_flight": 0}
+    lock = threading.Lock()
+
+    class StreetViewHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            query = parse_qs(urlsplit(self.path).query)
+            if "pano" in query:
+                with lock:
+                    stats["panoramas"].append(query["pano"][0])
+                self._respond("image/jpeg", query["pano"][0].encode("utf-8"))
+                return
+            location = query["location"][0]
+            with lock:
+                stats["locations"].append(location)
+                stats["in_flight"] += 1
+                stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            time.sleep(0.01)
+            with lock:
+                stats["in_flight"] -= 1
+            lat, lon = map(float, location.split(","))
+            if lat < 0:
+                metadata = {"status": "ZERO_RESULTS"}
+            else:
+                metadata = {
+                    "status": "OK",
+                    "pano_id": f"pano-{lat:.3f}-{lon:.3f}",
+                    "location": {"lat": lat, "lng": lon},
+                }
+            self._respond("application/json", json.dumps(metadata).encode("utf-8"))
+
+        def _respond(self, content_type, body):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StreetViewHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stats["url"] = f"http://127.0.0.1:{server.server_address[1]}"
+    yield stats
+    server.shutdown()
+    server.server_close()
 
 
 def test_get_google_streetview():
@@ -48,10 +117,10 @@ def test_get_google_streetview():
 
     satellite_data_df["lat_lon_str"] = get_google_streetview._join_lat_lon(satellite_data_df)
     assert satellite_data_df["lat_lon_str"][0] == str(lat_lon_str)
-    assert (
-        get_google_streetview.add_metadata_to_satellite_df(satellite_data_df)["metadata"][0]
-        == "<Response [200]>"
-    )
+    metadata_json = get_google_streetview.add_metadata_to_satellite_df(satellite_data_df)[
+        "metadata"
+    ][0]
+    assert "status" in json.loads(metadata_json)
 
     params.pop("key")
 
@@ -60,11 +129,318 @@ def test_get_google_streetview():
         "location": "40.41498005371624,-3.683317243711068",
         "pitch": "-0.76",
     }
+    with open(links_file) as f:
+        links = f.read().splitlines()
+    streetview_results = pd.DataFrame(
+        {
+            "request_key": location_key([40.41498005371624], [-3.683317243711068]),
+            "URL": links,
+        }
+    )
     satellite_streetview_data_df = get_google_streetview.add_links_to_satellite_df(
-        satellite_data_df
+        satellite_data_df, streetview_results
     )
 
     assert satellite_streetview_data_df["latitude"][0] == 40.41498005371624
     assert satellite_streetview_data_df["longitude"][0] == -3.683317243711068
 
     assert len(satellite_streetview_data_df.columns) == 10
+
+
+def test_download_images_of_locations_with_coverage(tmp_path):
+    class Results:
+        links = ["https://example.com/0", "https://example.com/1", "https://example.com/2"]
+        metadata = [{"status": "OK"}, {"status": "ZERO_RESULTS"}, {"status": "OK"}]
+
+        def save_metadata(self, path):
+            self.metadata_path = path
+
+    class Downloader:
+        def download_many(self, urls, paths):
+            self.requests = list(zip(urls, paths))
+            return ["downloaded", "failed"]
+
+    results = Results()
+    downloader = Downloader()
+    get_google_streetview = GetGoogleStreetView(
+        "600x300", "151.78", "-0.76", "key", str(tmp_path), "", "", "Test", "", downloader
+    )
+
+    assert get_google_streetview.download_images(results) == [
+        "downloaded",
+        "no_coverage",
+        "failed",
+    ]
+    assert downloader.requests == [
+        ("https://example.com/0", str(tmp_path / "gsv_0.jpg")),
+        ("https://example.com/2", str(tmp_path / "gsv_2.jpg")),
+    ]
+    assert [metadata.get("_file") for metadata in results.metadata] == ["gsv_0.jpg", None, None]
+
+
+def test_locations_are_requested_in_chunks(tmp_path):
+    class Results:
+        def __init__(self, params):
+            self.params = params
+            self.links = [f"https://example.com/{param['location']}" for param in params]
+            self.metadata = [{"status": "OK"} for _ in params]
+
+        def save_links(self, path):
+            self.links_path = path
+
+        def save_metadata(self, path):
+            self.metadata_paths = getattr(self, "metadata_paths", []) + [path]
+
+    class Downloader:
+        def download_many(self, urls, paths):
+            return ["downloaded"] * len(urls)
+
+    requested, chunk_results = [], []
+
+    def get_results(params):
+        requested.append([param["location"] for param in params])
+        chunk_results.append(Results(params))
+        return chunk_results[-1]
+
+    get_google_streetview = GetGoogleStreetView(
+        "600x300",
+        "151.78",
+        "-0.76",
+        "key",
+        str(tmp_path),
+        "links.txt",
+        "",
+        "Test",
+        "",
+        Downloader(),
+    )
+    get_google_streetview.request_chunk_size = 2
+    get_google_streetview.get_google_streetview = get_results
+    satellite_data_df = pd.DataFrame({"latitude": [41.0, 42.0, 41.0, 43.0], "longitude": [2.0] * 4})
+
+    with patch(
+        "open_geo_engine.src.get_google_streetview.google_streetview.helpers.api_list",
+        side_effect=lambda params: [
+            {**params, "location": location} for location in params["location"].split(";")
+        ],
+    ):
+        streetview_results = get_google_streetview.download_locations(satellite_data_df)
+
+    assert requested == [["41.0,2.0", "42.0,2.0"], ["43.0,2.0"]]
+    assert streetview_results["image_file"].tolist() == [
+        str(tmp_path / f"gsv_{position}.jpg") for position in range(3)
+    ]
+    assert streetview_results["latitude"].tolist() == [41.0, 42.0, 43.0]
+    # The links and metadata of every chunk are saved together, once.
+    assert len(chunk_results[0].links) == 3 and chunk_results[0].links_path == "links.txt"
+    assert not hasattr(chunk_results[1], "metadata_paths")
+
+
+def test_metadata_is_looked_up_once_per_location_and_cached(streetview_api, tmp_path):
+    satellite_data_df = pd.DataFrame(
+        {
+            "latitude": [40.4 + i % 10 / 1000 for i in range(30)] + [-1.0],
+            "longitude": [-3.68] * 30 + [-3.68],
+        }
+    )
+    satellite_data_df["time"] = range(len(satellite_data_df))
+
+    def get_google_streetview():
+        return GetGoogleStreetView(
+            "600x300",
+            "151.78",
+            "-0.76",
+            "key",
+            str(tmp_path),
+            "",
+            "",
+            "Test",
+            f"{streetview_api['url']}/metadata",
+            StreetViewDownloader(max_concurrent=4),
+            StreetViewMetadataCache(str(tmp_path / "metadata.sqlite"), ttl_seconds=60),
+        )
+
+    first = get_google_streetview()
+    satellite_data_df["lat_lon_str"] = first._join_lat_lon(satellite_data_df)
+    metadata_df = first.add_metadata_to_satellite_df(satellite_data_df.copy())
+
+    assert len(streetview_api["locations"]) == 11
+    assert 1 < streetview_api["max_in_flight"] <= 4
+    metadata = metadata_df["metadata"].map(json.loads)
+    assert metadata[0]["pano_id"] == "pano-40.400--3.680"
+    assert metadata[10]["pano_id"] == metadata[0]["pano_id"]
+    assert metadata.iloc[-1] == {"status": "ZERO_RESULTS"}
+
+    second = get_google_streetview()
+    rerun_df = second.add_metadata_to_satellite_df(satellite_data_df.copy())
+
+    assert len(streetview_api["locations"]) == 11
+    assert rerun_df["metadata"].tolist() == metadata_df["metadata"].tolist()
+    assert second.metadata_cache.stats()["hits"] == 11
+
+
+def test_metadata_first_downloads_one_image_per_panorama(streetview_api, tmp_path):
+    satellite_data_df = pd.DataFrame(
+        {
+            # The first two locations share a panorama, the last has no coverage.
+            "latitude": [40.4001, 40.4002, 40.4002, 40.41, -1.0],
+            "longitude": [-3.68, -3.68, -3.68, -3.68, -3.68],
+        }
+    )
+    get_google_streetview = GetGoogleStreetView(
+        "600x300",
+        "151.78",
+        "-0.76",
+        "key",
+        str(tmp_path),
+        "",
+        "",
+        "Test",
+        f"{streetview_api['url']}/metadata",
+        StreetViewDownloader(max_concurrent=4),
+        metadata_first=True,
+        image_base=f"{streetview_api['url']}/image",
+    )
+
+    satellite_streetview_df = get_google_streetview.add_panoramas_to_satellite_df(satellite_data_df)
+
+    assert len(streetview_api["locations"]) == 4
+    assert sorted(streetview_api["panoramas"]) == ["pano-40.400--3.680", "pano-40.410--3.680"]
+    assert satellite_streetview_df["pano_id"].tolist()[:4] == ["pano-40.400--3.680"] * 3 + [
+        "pano-40.410--3.680"
+    ]
+    image_files = satellite_streetview_df["image_file"]
+    assert image_files[0] == str(tmp_path / "pano_pano-40.400--3.680.jpg")
+    assert image_files[1] == image_files[0] and pd.isna(image_files[4])
+    assert "key=" not in satellite_streetview_df["URL"][0]
+    assert satellite_streetview_df["status"].tolist() == ["downloaded"] * 4 + ["no_coverage"]
+
+    metadata = {
+        "a": {"status": "OK", "pano_id": "p1"},
+        "b": {"status": "OK", "pano_id": "p1"},
+        "c": {"status": "OK", "pano_id": "p2"},
+        "d": {"status": "ZERO_RESULTS"},
+        "e": None,
+    }
+    pano_ids, counts = GetGoogleStreetView.snap_to_panoramas(metadata)
+    assert pano_ids == {"a": "p1", "b": "p1", "c": "p2"}
+    assert counts == {
+        "locations": 5,
+        "failed_lookups": 1,
+        "no_coverage": 1,
+        "panoramas": 2,
+        "deduplicated": 1,
+    }
+
+
+def test_plan_requests_yields_bounded_chunks_of_valid_locations():
+    satellite_data_df = pd.DataFrame(
+        {
+            "latitude": [40.41498005371624, 40.41498005371624, 41.0, 95.0, None, 42.0, 43.0],
+            "longitude": [-3.683317243711068, -3.683317243711068, 2.0, 2.0, 2.0, 2.5, 3.0],
+        }
+    )
+    get_google_streetview = GetGoogleStreetView(
+        "600x300", "151.78", "-0.76", "key", "", "", "", "Test", "", request_chunk_size=2
+    )
+
+    chunks = list(get_google_streetview.plan_requests(satellite_data_df))
+
+    assert [chunk["lat_lon_str"].tolist() for chunk in chunks] == [
+        ["40.41498005371624,-3.683317243711068", "41.0,2.0"],
+        ["42.0,2.5", "43.0,3.0"],
+    ]
+    assert (
+        get_google_streetview._join_lat_lon(satellite_data_df).tolist()[:2]
+        == ["40.41498005371624,-3.683317243711068"] * 2
+    )
+
+
+def test_metadata_first_downloads_panoramas_once_across_chunks(streetview_api, tmp_path):
+    satellite_data_df = pd.DataFrame(
+        {"latitude": [40.4001, 40.4002, 40.4003, 40.41], "longitude": [-3.68] * 4}
+    )
+    get_google_streetview = GetGoogleStreetView(
+        "600x300",
+        "151.78",
+        "-0.76",
+        "key",
+        str(tmp_path),
+        "",
+        "",
+        "Test",
+        f"{streetview_api['url']}/metadata",
+        StreetViewDownloader(max_concurrent=4),
+        image_base=f"{streetview_api['url']}/image",
+        request_chunk_size=1,
+    )
+
+    satellite_streetview_df = get_google_streetview.add_panoramas_to_satellite_df(satellite_data_df)
+
+    assert sorted(streetview_api["panoramas"]) == ["pano-40.400--3.680", "pano-40.410--3.680"]
+    assert satellite_streetview_df["image_file"].notna().all()
+
+
+def test_image_store_skips_panoramas_already_stored(streetview_api, tmp_path):
+    satellite_data_df = pd.DataFrame(
+        {"latitude": [40.4001, 40.4002, 40.41, -1.0], "longitude": [-3.68] * 4}
+    )
+
+    def add_panoramas():
+        get_google_streetview = GetGoogleStreetView(
+            "600x300",
+            "151.78",
+            "-0.76",
+            "key",
+            str(tmp_path),
+            "",
+            "",
+            "Test",
+            f"{streetview_api['url']}/metadata",
+            StreetViewDownloader(max_concurrent=4),
+            image_base=f"{streetview_api['url']}/image",
+            image_store=StreetViewImageStore(str(tmp_path)),
+        )
+        return get_google_streetview.add_panoramas_to_satellite_df(satellite_data_df.copy())
+
+    first_df = add_panoramas()
+    key = StreetViewImageStore.key("pano-40.400--3.680", "600x300", "151.78", "-0.76")
+
+    assert sorted(streetview_api["panoramas"]) == ["pano-40.400--3.680", "pano-40.410--3.680"]
+    assert first_df["image_file"][0] == str(tmp_path / key[:2] / key[2:4] / f"{key}.jpg")
+    assert first_df["status"].tolist() == ["downloaded"] * 3 + ["no_coverage"]
+
+    rerun_df = add_panoramas()
+
+    assert len(streetview_api["panoramas"]) == 2
+    assert rerun_df["image_file"].tolist()[:3] == first_df["image_file"].tolist()[:3]
+    assert rerun_df["status"].tolist() == ["exists"] * 3 + ["no_coverage"]
+
+
+def test_results_are_joined_on_the_quantized_location(tmp_path):
+    get_google_streetview = GetGoogleStreetView(
+        "600x300", "151.78", "-0.76", "key", str(tmp_path), "", "", "Test", ""
+    )
+    streetview_results = pd.DataFrame(
+        {
+            "request_key": location_key([40.41498005371624, 41.0], [-3.683317243711068, 2.0]),
+            "latitude": [40.41498005371624, 41.0],
+            "longitude": [-3.683317243711068, 2.0],
+            "pano_id": ["pano-a", "pano-b"],
+            "status": ["downloaded", "exists"],
+        }
+    )
+    # Coordinates read back from text differ from the requested ones in the last digits.
+    satellite_data_df = pd.DataFrame(
+        {
+            "latitude": [40.414980053716244, 41.00000000001, 42.0, None],
+            "longitude": [-3.683317243711068, 2.0, 2.0, 2.0],
+        }
+    )
+
+    joined_df = get_google_streetview.join_streetview_results(satellite_data_df, streetview_results)
+
+    assert joined_df["pano_id"].tolist()[:2] == ["pano-a", "pano-b"]
+    assert joined_df["pano_id"][2:].isna().all()
+    assert joined_df["latitude"].tolist()[:3] == [40.414980053716244, 41.00000000001, 42.0]
+    assert list(joined_df.columns) == ["latitude", "longitude", "pano_id", "status"]
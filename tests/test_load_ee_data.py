@@ -1,5 +1,13 @@
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+from ee.ee_exception import EEException
+
 from open_geo_engine.src.generate_building_centroids import GenerateBuildingCentroids
 from open_geo_engine.src.load_ee_data import LoadEEData
+from open_geo_engine.utils.ee_sample_cache import EESampleCache
+from open_geo_engine.utils.tile_snapshot import centroid_diff
 
 
 def test_prepare_dates():
@@ -70,3 +78,311 @@ def test_get_xy():
     xy_df = load_ee_data._get_xy(buildings_gdf)[["x", "y"]]
     assert xy_df["x"][0] == -3.68328454639349
     assert xy_df["y"][0] == 40.41494595
+
+
+def _load_ee_data(**kwargs):
+    return LoadEEData(
+        ["ES"],
+        2020,
+        1,
+        1,
+        2020,
+        1,
+        31,
+        "LANDSAT/LC08/C01/T1",
+        ["B4", "B3", "B2"],
+        "/test_data",
+        "/test_data",
+        "LANDSAT",
+        **kwargs,
+    )
+
+
+def test_features_to_region_arrays():
+    features = [
+        {
+            "id": "0_0",
+            "properties": {
+                "point_id": 1,
+                "longitude": -3.68,
+                "latitude": 40.41,
+                "time": 1578653746335,
+                "B4": 7053,
+                "B3": 7177,
+                "B2": 7825,
+            },
+        }
+    ]
+
+    region_arrays = _load_ee_data()._features_to_region_arrays(features, 2)
+
+    assert region_arrays[0] == [["id", "longitude", "latitude", "time", "B4", "B3", "B2"]]
+    assert region_arrays[1][1] == ["0_0", -3.68, 40.41, 1578653746335, 7053, 7177, 7825]
+
+
+def test_chunk_is_split_when_payload_too_large():
+    load_ee_data = _load_ee_data(sample_chunk_size=4, sample_max_splits=2)
+
+    def build_chunk_samples(collection, chunk):
+        if len(chunk) > 1:
+            raise EEException("Collection query aborted after accumulating over 5000 elements.")
+        lon, lat = chunk[0]
+        samples = MagicMock()
+        samples.getInfo.return_value = {
+            "features": [
+                {
+                    "id": "0_0",
+                    "properties": {"point_id": 0, "longitude": lon, "latitude": lat, "time": 0},
+                }
+            ]
+        }
+        return samples
+
+    points = [(0.0, 0.0), (1.0, 1.0), (2.0, 2.0), (3.0, 3.0), (4.0, 4.0)]
+    with patch.object(load_ee_data, "_build_chunk_samples", side_effect=build_chunk_samples):
+        region_arrays = list(load_ee_data._fetch_points(None, points))
+
+    assert [region_array[1][1:3] for region_array in region_arrays] == [
+        [lon, lat] for lon, lat in points
+    ]
+
+
+def test_only_uncached_points_are_fetched(tmp_path):
+    cache = EESampleCache(str(tmp_path / "samples.sqlite"), max_bytes=10**6)
+    load_ee_data = _load_ee_data(cache=cache)
+    cached_region_array = [["id", "longitude", "latitude", "time", "B4", "B3", "B2"]]
+    cache.put_many([(load_ee_data._cache_key(0.0, 0.0), cached_region_array)])
+
+    with patch.object(load_ee_data, "_fetch_points") as fetch_points:
+        fetch_points.return_value = iter([None])
+        region_arrays = list(load_ee_data._sample_points(None, [0.0, 1.0], [0.0, 1.0]))
+
+    fetch_points.assert_called_once_with(None, [(1.0, 1.0)])
+    assert region_arrays == [cached_region_array, None]
+    assert cache.stats()["hits"] == 1
+
+
+def test_execute_for_country_resumes_from_written_points(tmp_path):
+    footprint_file = tmp_path / "building_footprint.csv"
+    pd.DataFrame({"x": [0.0, 1.0, 2.0], "y": [0.0, 1.0, 2.0]}).to_csv(footprint_file)
+    load_ee_data = _load_ee_data(
+        filepath=str(footprint_file), output_folder=str(tmp_path), flush_points=2
+    )
+    country = ("ES", (-9.39288367353, 35.946850084, 3.03948408368, 43.7483377142))
+    header = ["id", "longitude", "latitude", "time", "B4", "B3", "B2"]
+    sampled_points = []
+
+    def sample_points(collection, lons, lats):
+        for lon, lat in zip(lons, lats):
+            sampled_points.append(lon)
+            if lon == 2.0 and len(sampled_points) == 3:
+                raise EEException("Computation timed out.")
+            yield [header, ["0", lon, lat, 0, 1, 2, 3]]
+
+    with patch("open_geo_engine.src.load_ee_data.ee"), patch.object(
+        load_ee_data, "_sample_points", side_effect=sample_points
+    ):
+        with pytest.raises(EEException):
+            load_ee_data.execute_for_country(country, save_images=False)
+        locations_ee_df = load_ee_data.execute_for_country(country, save_images=False)
+
+    assert sampled_points == [0.0, 1.0, 2.0, 2.0]
+    assert locations_ee_df["longitude"].tolist() == [0.0, 1.0, 2.0]
+
+
+def test_points_that_could_not_be_sampled_are_resampled_on_restart(tmp_path):
+    footprint_file = tmp_path / "building_footprint.csv"
+    pd.DataFrame({"x": [0.0, 1.0], "y": [0.0, 1.0]}).to_csv(footprint_file)
+    load_ee_data = _load_ee_data(filepath=str(footprint_file), output_folder=str(tmp_path))
+    country = ("ES", (-9.39288367353, 35.946850084, 3.03948408368, 43.7483377142))
+    header = ["id", "longitude", "latitude", "time", "B4", "B3", "B2"]
+    sampled_points = []
+
+    def sample_points(collection, lons, lats):
+        for lon, lat in zip(lons, lats):
+            sampled_points.append(lon)
+            # Point 1.0 fails on the first run only.
+            if lon == 1.0 and sampled_points.count(lon) == 1:
+                yield None
+                continue
+            yield [header, ["0", lon, lat, 0, 1, 2, 3]]
+
+    with patch("open_geo_engine.src.load_ee_data.ee"), patch.object(
+        load_ee_data, "_sample_points", side_effect=sample_points
+    ):
+        first_ee_df = load_ee_data.execute_for_country(country, save_images=False)
+        locations_ee_df = load_ee_data.execute_for_country(country, save_images=False)
+
+    assert first_ee_df["longitude"].tolist() == [0.0]
+    assert sampled_points == [0.0, 1.0, 1.0]
+    assert locations_ee_df["longitude"].tolist() == [0.0, 1.0]
+
+
+def test_diff_run_replaces_only_changed_centroids(tmp_path):
+    previous = pd.DataFrame(
+        {"osm_type": ["way"] * 3, "osm_id": [1, 2, 3], "lon": [0.0, 1.0, 2.0], "lat": [0.0] * 3}
+    )
+    # Way 2 moves, way 3 is removed and way 4 is added.
+    current = pd.DataFrame(
+        {"osm_type": ["way"] * 3, "osm_id": [1, 2, 4], "lon": [0.0, 1.5, 3.0], "lat": [0.0] * 3}
+    )
+    previous.to_parquet(tmp_path / "centroids.parquet", index=False)
+    centroid_diff(previous, current).to_parquet(tmp_path / "diff.parquet", index=False)
+    load_ee_data = _load_ee_data(output_folder=str(tmp_path / "gee_data"), flush_points=2)
+    country = ("ES", (-9.39288367353, 35.946850084, 3.03948408368, 43.7483377142))
+    header = ["id", "longitude", "latitude", "time", "B4", "B3", "B2"]
+    sampled_points = []
+
+    def sample_points(collection, lons, lats):
+        for lon, lat in zip(lons, lats):
+            sampled_points.append(lon)
+            yield [header, ["0", lon, lat, 0, 1, 2, 3]]
+
+    def sample(file_name):
+        load_ee_data.filepath = str(tmp_path / file_name)
+        return load_ee_data.execute_for_country(country, save_images=False)
+
+    with patch("open_geo_engine.src.load_ee_data.ee"), patch.object(
+        load_ee_data, "_sample_points", side_effect=sample_points
+    ):
+        sample("centroids.parquet")
+        diff_ee_df = sample("diff.parquet")
+        assert sorted(sampled_points) == [0.0, 1.0, 1.5, 2.0, 3.0]
+        current.to_parquet(tmp_path / "centroids.parquet", index=False)
+        sampled_points.clear()
+        full_ee_df = sample("centroids.parquet")
+
+    assert sorted(diff_ee_df["longitude"]) == [0.0, 1.5, 3.0]
+    assert sampled_points == []
+    assert sorted(full_ee_df["longitude"]) == [0.0, 1.5, 3.0]
+
+
+def test_locations_in_overlapping_countries_are_sampled_once():
+    locations_df = pd.DataFrame({"x": [0.5, 1.5, 2.5, 5.0], "y": [0.5, 0.5, 0.5, 5.0]})
+    load_ee_data = _load_ee_data(clip_to_country=True)
+    load_ee_data.countries = [("A", (0, 0, 2, 1)), ("B", (1, 0, 3, 1))]
+
+    in_a = load_ee_data._locations_in_country(locations_df, load_ee_data.countries[0])
+    in_b = load_ee_data._locations_in_country(locations_df, load_ee_data.countries[1])
+
+    assert in_a.index.tolist() == [0, 1]
+    assert in_b.index.tolist() == [2]
+
+
+def test_read_locations_from_centroid_tables_and_wkt_csv(tmp_path):
+    centroids = pd.DataFrame(
+        {"osm_type": ["way", "way"], "osm_id": [10, 11], "lon": [0.5, 1.5], "lat": [2.5, 3.5]}
+    )
+    centroids.to_parquet(tmp_path / "centroids.parquet", index=False)
+    centroids.to_csv(tmp_path / "centroids.csv", index=False)
+    pd.DataFrame({"centroid_geometry": ["POINT (0.5 2.5)", "POINT (1.5 3.5)"]}).to_csv(
+        tmp_path / "building_footprint.csv"
+    )
+    load_ee_data = _load_ee_data()
+
+    for file_name in ("centroids.parquet", "centroids.csv", "building_footprint.csv"):
+        locations_df = load_ee_data._read_locations(str(tmp_path / file_name))
+
+        assert locations_df["x"].tolist() == [0.5, 1.5]
+        assert locations_df["y"].tolist() == [2.5, 3.5]
+
+
+def test_read_locations_skips_removed_centroids_of_a_diff(tmp_path):
+    diff = pd.DataFrame(
+        {
+            "osm_type": ["way", "way", "way"],
+            "osm_id": [10, 11, 12],
+            "lon": [0.5, 1.5, 2.5],
+            "lat": [3.5, 4.5, 5.5],
+            "change": ["added", "removed", "moved"],
+        }
+    )
+    diff.to_parquet(tmp_path / "diff.parquet", index=False)
+
+    locations_df = _load_ee_data()._read_locations(str(tmp_path / "diff.parquet"))
+
+    assert locations_df.values.tolist() == [[0.5, 3.5], [2.5, 5.5]]
+
+
+def test_aggregation_bands_and_bins():
+    load_ee_data = _load_ee_data(aggregation_reducers=["mean", "p90"], aggregation_bin="weekly")
+    start, end = load_ee_data._generate_start_end_date()
+
+    assert load_ee_data.output_bands == [
+        "B4_mean",
+        "B4_p90",
+        "B3_mean",
+        "B3_p90",
+        "B2_mean",
+        "B2_p90",
+    ]
+    bins = load_ee_data._aggregation_bins(start, end)
+    assert [str(bin_start.date()) for bin_start, _ in bins] == [
+        "2020-01-01",
+        "2020-01-08",
+        "2020-01-15",
+        "2020-01-22",
+        "2020-01-29",
+    ]
+    assert str(bins[-1][1].date()) == "2020-01-31"
+    assert _load_ee_data(aggregation_reducers=["mean"])._aggregation_bins(start, end) == [
+        (start, end)
+    ]
+
+
+def test_date_shards_are_stitched_in_order_and_retried_in_isolation():
+    load_ee_data = _load_ee_data(date_shard_days=14, sample_chunk_size=2)
+    collection = MagicMock()
+    collection.filterDate.side_effect = lambda start, end: start
+    failures = []
+
+    def build_chunk_samples(shard, chunk):
+        if shard == "2020-01-15" and not failures:
+            failures.append(shard)
+            raise EEException("Internal error.")
+        samples = MagicMock()
+        samples.getInfo.return_value = {
+            "features": [
+                {
+                    "id": shard,
+                    "properties": {"point_id": i, "longitude": lon, "latitude": lat, "time": 0},
+                }
+                for i, (lon, lat) in enumerate(chunk)
+            ]
+        }
+        return samples
+
+    with patch.object(load_ee_data, "_build_chunk_samples", side_effect=build_chunk_samples):
+        region_arrays = list(load_ee_data._fetch_points(collection, [(0.0, 0.0), (1.0, 1.0)]))
+
+    assert failures == ["2020-01-15"]
+    assert [[row[0] for row in region_array[1:]] for region_array in region_arrays] == [
+        ["2020-01-01", "2020-01-15", "2020-01-29"],
+        ["2020-01-01", "2020-01-15", "2020-01-29"],
+    ]
+
+
+def test_points_with_a_failed_date_shard_are_not_sampled():
+    load_ee_data = _load_ee_data(date_shard_days=14, sample_chunk_size=2, sample_max_retries=1)
+    collection = MagicMock()
+    collection.filterDate.side_effect = lambda start, end: start
+
+    def build_chunk_samples(shard, chunk):
+        if shard == "2020-01-15":
+            raise EEException("Internal error.")
+        samples = MagicMock()
+        samples.getInfo.return_value = {
+            "features": [
+                {
+                    "id": shard,
+                    "properties": {"point_id": i, "longitude": lon, "latitude": lat, "time": 0},
+                }
+                for i, (lon, lat) in enumerate(chunk)
+            ]
+        }
+        return samples
+
+    with patch.object(load_ee_data, "_build_chunk_samples", side_effect=build_chunk_samples):
+        region_arrays = list(load_ee_data._fetch_points(collection, [(0.0, 0.0), (1.0, 1.0)]))
+
+    assert region_arrays == [None, None]
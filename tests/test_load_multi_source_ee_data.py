@@ -0,0 +1,65 @@
+from open_geo_engine.src.load_multi_source_ee_data import LoadMultiSourceEEData
+
+
+def _load_multi_source_ee_data(**kwargs):
+    return LoadMultiSourceEEData(
+        ["ES"],
+        2020,
+        1,
+        1,
+        2020,
+        1,
+        31,
+        {
+            "LANDSAT": ("LANDSAT/LC08/C01/T1", ["B4", "B3"]),
+            "NIGHTTIME_LIGHT": ("NOAA/VIIRS/DNB/MONTHLY_V1/VCMCFG", "avg_rad"),
+        },
+        "/test_data",
+        "/test_data",
+        "LANDSAT_NIGHTTIME_LIGHT",
+        **kwargs,
+    )
+
+
+def test_sources_are_prefixed_into_one_band_list():
+    load_ee_data = _load_multi_source_ee_data(sample_mode="point")
+
+    assert load_ee_data.sample_mode == "batch"
+    assert load_ee_data.output_bands == ["LANDSAT_B4", "LANDSAT_B3", "NIGHTTIME_LIGHT_avg_rad"]
+    assert load_ee_data._source_bands("NIGHTTIME_LIGHT") == ["NIGHTTIME_LIGHT_avg_rad"]
+
+
+def test_features_of_every_source_are_aligned_on_point_and_time():
+    day = 24 * 60 * 60 * 1000
+    features = [
+        {
+            "id": "landsat",
+            "properties": {
+                "point_id": 0,
+                "longitude": 1.0,
+                "latitude": 2.0,
+                "time": day + 3600000,
+                "LANDSAT_B4": 7053,
+                "LANDSAT_B3": 7177,
+            },
+        },
+        {
+            "id": "lights",
+            "properties": {
+                "point_id": 0,
+                "longitude": 1.0,
+                "latitude": 2.0,
+                "time": day,
+                "NIGHTTIME_LIGHT_avg_rad": 1.5,
+            },
+        },
+    ]
+
+    exact = _load_multi_source_ee_data()._features_to_region_arrays(features, 1)[0]
+    daily = _load_multi_source_ee_data(align_freq="1D")._features_to_region_arrays(features, 1)[0]
+
+    assert exact[1:] == [
+        ["lights", 1.0, 2.0, day, None, None, 1.5],
+        ["landsat", 1.0, 2.0, day + 3600000, 7053, 7177, None],
+    ]
+    assert daily[1:] == [["landsat", 1.0, 2.0, day, 7053, 7177, 1.5]]
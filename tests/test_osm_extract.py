@@ -0,0 +1,80 @@
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import Point, box
+
+from open_geo_engine.src.generate_building_centroids import GenerateBuildingCentroids
+from open_geo_engine.utils.osm_extract import iter_extract_footprints
+
+OSM_EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6" generator="test">
+  <node id="1" lat="0.19" lon="0.19" version="1"/>
+  <node id="2" lat="0.19" lon="0.21" version="1"/>
+  <node id="3" lat="0.21" lon="0.21" version="1"/>
+  <node id="4" lat="0.21" lon="0.19" version="1"/>
+  <node id="5" lat="1.0" lon="1.0" version="1"/>
+  <node id="6" lat="1.0" lon="1.01" version="1"/>
+  <node id="7" lat="1.01" lon="1.01" version="1"/>
+  <node id="8" lat="2.0" lon="2.0" version="1">
+    <tag k="building" v="school"/>
+    <tag k="name" v="School B"/>
+  </node>
+  <way id="10" version="1">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/><nd ref="4"/><nd ref="1"/>
+    <tag k="building" v="school"/>
+    <tag k="name" v="School A"/>
+    <tag k="operator" v="Ministry"/>
+  </way>
+  <way id="11" version="1">
+    <nd ref="5"/><nd ref="6"/><nd ref="7"/><nd ref="5"/>
+    <tag k="building" v="house"/>
+  </way>
+</osm>
+"""
+
+
+def _osmnx_footprints():
+    return gpd.GeoDataFrame(
+        {"building": ["school", "school", "house"], "name": ["School B", "School A", None]},
+        geometry=[Point(2.0, 2.0), box(0.19, 0.19, 0.21, 0.21), box(1.0, 1.0, 1.01, 1.01)],
+        index=pd.MultiIndex.from_tuples(
+            [("node", 8), ("way", 10), ("way", 11)], names=["element_type", "osmid"]
+        ),
+        crs="epsg:4326",
+    )
+
+
+def test_iter_extract_footprints_from_osm_file(tmp_path):
+    path = tmp_path / "extract.osm"
+    path.write_text(OSM_EXTRACT)
+
+    chunks = list(
+        iter_extract_footprints(str(path), {"building": "school"}, ["name", "operator"], 1)
+    )
+
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+    footprints = pd.concat(chunks)
+    assert list(footprints.index) == [("node", 8), ("way", 10)]
+    assert footprints["operator"].tolist() == [None, "Ministry"]
+
+
+@pytest.mark.parametrize("file_name", ["extract.osm", "extract.gpkg", "extract.parquet"])
+def test_extract_centroids_match_overpass_schema(tmp_path, file_name):
+    path = tmp_path / file_name
+    footprints = _osmnx_footprints()
+    if file_name.endswith(".osm"):
+        path.write_text(OSM_EXTRACT)
+    elif file_name.endswith(".gpkg"):
+        footprints.reset_index().to_file(path, driver="GPKG")
+    else:
+        footprints.to_parquet(path)
+    generate_building_centroids = GenerateBuildingCentroids(
+        [], "Test", {"building": "school"}, extract_path=str(path), extract_chunk_size=1
+    )
+
+    centroids = generate_building_centroids.extract_centroids()
+
+    expected = footprints.iloc[:2].copy()
+    expected["centroid_geometry"] = expected.representative_point()
+    expected = generate_building_centroids.to_centroids(expected)
+    pd.testing.assert_frame_equal(centroids.sort_values("osm_id", ignore_index=True), expected)
@@ -0,0 +1,111 @@
+import multiprocessing
+
+import pytest
+from osmnx import settings
+
+from open_geo_engine.utils.overpass_cache import OverpassResponseCache
+
+QUERY_URL = (
+    "https://overpass-api.de/api/interpreter?data=%5Bout%3Ajson%5D%5Btimeout%3A180%5D%3B"
+    "%28way%5B%27building%27%3D%27school%27%5D%28poly%3A%270+0+0+1+1+1%27%29%3B%29%3Bout%3B"
+)
+
+
+@pytest.fixture(autouse=True)
+def use_cache(monkeypatch):
+    monkeypatch.setattr(settings, "use_cache", True)
+
+
+def test_key_ignores_server_and_query_settings():
+    mirror_url = QUERY_URL.replace("overpass-api.de", "overpass.kumi.systems").replace("180", "900")
+
+    assert OverpassResponseCache.key(QUERY_URL) == OverpassResponseCache.key(mirror_url)
+    assert OverpassResponseCache.key(QUERY_URL) != OverpassResponseCache.key(
+        QUERY_URL.replace("school", "hospital")
+    )
+
+
+def test_retrieve_saved_response_and_stats(tmp_path):
+    cache = OverpassResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=10**6)
+    response_json = {"elements": [{"type": "node", "id": 1, "lat": 0.0, "lon": 0.0}]}
+
+    assert cache.retrieve(QUERY_URL) is None
+    cache.save(QUERY_URL, response_json, 200)
+    cache.save(QUERY_URL.replace("school", "hospital"), {"remark": "timeout"}, 200)
+    cache.save(QUERY_URL.replace("school", "clinic"), {"elements": []}, 429)
+
+    assert cache.retrieve(QUERY_URL, check_remark=True) == response_json
+    assert cache.retrieve(QUERY_URL.replace("school", "hospital"), check_remark=True) is None
+    assert cache.retrieve(QUERY_URL.replace("school", "clinic")) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 3)
+    assert stats["bytes_saved"] > 0
+
+
+def test_expired_and_least_recently_used_responses_are_evicted(tmp_path):
+    urls = [QUERY_URL.replace("school", f"school_{i}") for i in range(4)]
+    expiring_cache = OverpassResponseCache(
+        str(tmp_path / "expiring.sqlite"), max_bytes=10**6, ttl_seconds=0
+    )
+    expiring_cache.save(urls[0], {"elements": []}, 200)
+    assert expiring_cache.retrieve(urls[0]) is None
+
+    cache = OverpassResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=10**6)
+    for url in urls[:3]:
+        cache.save(url, {"elements": [{"id": i} for i in range(100)]}, 200)
+    cache.retrieve(urls[0])
+    cache.max_bytes = cache.size_bytes()
+    cache.save(urls[3], {"elements": [{"id": i} for i in range(100)]}, 200)
+
+    assert cache.retrieve(urls[0]) is not None
+    assert cache.retrieve(urls[1]) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_is_created_on_first_use(tmp_path):
+    path = tmp_path / "osm_cache" / "responses.sqlite"
+    cache = OverpassResponseCache(str(path), max_bytes=10**6)
+
+    assert cache.stats()["size_bytes"] == 0
+    assert not path.exists()
+    assert cache.retrieve(QUERY_URL) is None
+    assert path.exists()
+
+
+def _save_responses(cache, worker):
+    for i in range(20):
+        cache.save(QUERY_URL.replace("school", f"school_{worker}_{i}"), {"elements": [i]}, 200)
+
+
+def test_concurrent_workers_share_the_cache(tmp_path):
+    cache = OverpassResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=10**6)
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_save_responses, args=(cache, i)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert cache.retrieve(QUERY_URL.replace("school", "school_3_19")) == {"elements": [19]}
+    assert cache._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 80
+
+
+def _retrieve_responses(cache, worker):
+    cache.retrieve(QUERY_URL)
+    cache.retrieve(QUERY_URL.replace("school", f"school_{worker}"))
+
+
+def test_stats_count_the_lookups_of_every_worker(tmp_path):
+    cache = OverpassResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=10**6)
+    cache.save(QUERY_URL, {"elements": []}, 200)
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_retrieve_responses, args=(cache, i)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (4, 4)
+    assert OverpassResponseCache(cache.path, max_bytes=10**6).stats()["hits"] == 0
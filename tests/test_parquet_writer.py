@@ -0,0 +1,75 @@
+import os
+
+from open_geo_engine.utils.parquet_writer import StreamingParquetWriter
+
+HEADER = ["id", "longitude", "latitude", "time", "B4"]
+JOB = {"image_collection": "LANDSAT/LC08/C01/T1", "start": "2020-01-01"}
+
+
+def region_array(point_id):
+    return [HEADER, [f"{point_id}", point_id, point_id, point_id * 1000, point_id]]
+
+
+def test_parts_are_flushed_every_n_points(tmp_path):
+    writer = StreamingParquetWriter(str(tmp_path), ["B4"], flush_points=2, job=JOB)
+    for point_id in range(5):
+        writer.add(point_id, region_array(point_id))
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "manifest.json",
+        "part-00000.parquet",
+        "part-00001.parquet",
+    ]
+    writer.close()
+
+    df = writer.read()
+    assert df["longitude"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert list(df.columns) == ["longitude", "latitude", "time", "datetime", "B4"]
+
+
+def test_restarted_writer_skips_completed_points(tmp_path):
+    writer = StreamingParquetWriter(str(tmp_path), ["B4"], flush_points=2, job=JOB)
+    for point_id in range(3):
+        writer.add(point_id, region_array(point_id))
+    # The run crashes before point 2 is flushed.
+
+    restarted_writer = StreamingParquetWriter(str(tmp_path), ["B4"], flush_points=2, job=JOB)
+    assert restarted_writer.completed_point_ids == {0, 1}
+    for point_id in range(2, 4):
+        restarted_writer.add(point_id, region_array(point_id))
+    restarted_writer.close()
+
+    assert restarted_writer.read()["time"].tolist() == [0, 1000, 2000, 3000]
+
+
+def test_changed_job_starts_afresh(tmp_path):
+    writer = StreamingParquetWriter(str(tmp_path), ["B4"], flush_points=1, job=JOB)
+    writer.add(0, region_array(0))
+
+    new_writer = StreamingParquetWriter(
+        str(tmp_path), ["B4"], flush_points=1, job={**JOB, "start": "2021-01-01"}
+    )
+
+    assert new_writer.completed_point_ids == set()
+    assert new_writer.read().empty
+    assert not os.path.exists(tmp_path / "part-00000.parquet")
+
+
+def test_discarded_points_are_removed_from_their_parts(tmp_path):
+    writer = StreamingParquetWriter(str(tmp_path), ["B4"], flush_points=2, job=JOB)
+    for point_id in range(4):
+        writer.add(point_id, region_array(point_id))
+    writer.close()
+
+    assert writer.discard([1, 2, 3, 7]) == 3
+    writer.add(5, region_array(5))
+    writer.close()
+
+    restarted_writer = StreamingParquetWriter(str(tmp_path), ["B4"], flush_points=2, job=JOB)
+    assert restarted_writer.completed_point_ids == {0, 5}
+    assert restarted_writer.read()["longitude"].tolist() == [0.0, 5.0]
+    assert sorted(os.listdir(tmp_path)) == [
+        "manifest.json",
+        "part-00002.parquet",
+        "part-00003.parquet",
+    ]
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from open_geo_engine.utils.rate_limiter import RateLimiter, get_endpoint_limiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_rate_limiter_spaces_requests():
+    clock = FakeClock()
+    limiter = RateLimiter(max_in_flight=4, requests_per_second=2, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        with limiter.slot():
+            pass
+
+    assert clock.sleeps == [0.5, 0.5]
+
+
+def test_rate_limiter_caps_requests_in_flight():
+    limiter = RateLimiter(max_in_flight=2)
+    lock = threading.Lock()
+    stats = {"in_flight": 0, "max_in_flight": 0}
+
+    def request():
+        with limiter.slot():
+            with lock:
+                stats["in_flight"] += 1
+                stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            time.sleep(0.01)
+            with lock:
+                stats["in_flight"] -= 1
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stats["max_in_flight"] == 2
+
+
+def test_get_endpoint_limiter_is_shared_per_endpoint():
+    limiter = get_endpoint_limiter("https://overpass.example/api", 2, 1.0)
+
+    assert get_endpoint_limiter("https://overpass.example/api", 2, 1.0) is limiter
+    assert get_endpoint_limiter("https://other.example/api", 2, 1.0) is not limiter
@@ -0,0 +1,30 @@
+import numpy as np
+
+from open_geo_engine.utils.spatial_partition import (
+    chunk_locality,
+    hilbert_index,
+    spatial_order,
+    tile_degrees,
+)
+
+
+def test_hilbert_index_visits_neighbouring_cells():
+    assert hilbert_index([0, 0, 1, 1], [0, 1, 1, 0], order=1).tolist() == [0, 1, 2, 3]
+
+    grid = np.array([(x, y) for x in range(8) for y in range(8)])
+    curve = grid[np.argsort(hilbert_index(grid[:, 0], grid[:, 1], order=3))]
+    assert np.abs(np.diff(curve, axis=0)).sum(axis=1).max() == 1
+
+
+def test_spatial_order_makes_chunks_compact():
+    rng = np.random.default_rng(0)
+    lons, lats = rng.uniform(0, 1, 1000), rng.uniform(0, 1, 1000)
+    order = spatial_order(lons, lats)
+
+    unsorted = chunk_locality(lons, lats, 50, tile_size=0.1)
+    ordered = chunk_locality(lons[order], lats[order], 50, tile_size=0.1)
+
+    assert ordered["chunks"] == unsorted["chunks"] == 20
+    assert ordered["mean_bbox_area"] < unsorted["mean_bbox_area"] / 5
+    assert ordered["tiles"] < unsorted["tiles"]
+    assert round(tile_degrees(10), 3) == 0.023
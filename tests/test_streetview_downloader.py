@@ -0,0 +1,82 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from open_geo_engine.utils.streetview_downloader import StreetViewDownloader
+
+
+@pytest.fixture
+def image_server():
+    """Local stand-in for the Street View image API, /flaky-* paths fail once with a 503."""
+    stats = {"requests": [], "ports": set(), "in_flight": 0, "max_in_flight": 0}
+    lock = threading.Lock()
+
+    class ImageHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            with lock:
+                first_request = self.path not in stats["requests"]
+                stats["requests"].append(self.path)
+                stats["ports"].add(self.client_address[1])
+                stats["in_flight"] += 1
+                stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            time.sleep(0.01)
+            with lock:
+                stats["in_flight"] -= 1
+            if self.path.startswith("/missing"):
+                self._respond(404, b"")
+            elif self.path.startswith("/flaky") and first_request:
+                self._respond(503, b"")
+            else:
+                self._respond(200, self.path.encode("utf-8") * 1000)
+
+        def _respond(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stats["url"] = f"http://127.0.0.1:{server.server_address[1]}"
+    yield stats
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_many_reuses_a_bounded_pool_of_connections(image_server, tmp_path):
+    downloader = StreetViewDownloader(max_concurrent=4)
+    urls = [f"{image_server['url']}/image-{i}" for i in range(40)]
+    paths = [str(tmp_path / f"gsv_{i}.jpg") for i in range(40)]
+
+    statuses = downloader.download_many(urls, paths)
+
+    assert statuses == ["downloaded"] * 40
+    assert (tmp_path / "gsv_7.jpg").read_bytes() == b"/image-7" * 1000
+    assert image_server["max_in_flight"] <= 4
+    assert len(image_server["ports"]) <= 4
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_download_many_retries_and_skips_present_files(image_server, tmp_path):
+    delays = []
+    downloader = StreetViewDownloader(max_concurrent=2, backoff_seconds=0.1, sleep=delays.append)
+    (tmp_path / "gsv_0.jpg").write_bytes(b"jpeg")
+    urls = [f"{image_server['url']}/{path}" for path in ("present", "flaky-1", "missing-2")]
+    paths = [str(tmp_path / f"gsv_{i}.jpg") for i in range(3)]
+
+    statuses = downloader.download_many(urls, paths)
+
+    assert statuses == ["exists", "downloaded", "failed"]
+    assert sorted(image_server["requests"]) == ["/flaky-1", "/flaky-1", "/missing-2"]
+    assert len(delays) == 1 and 0.1 <= delays[0] <= 0.2
+    assert (tmp_path / "gsv_0.jpg").read_bytes() == b"jpeg"
+    assert not (tmp_path / "gsv_2.jpg").exists()
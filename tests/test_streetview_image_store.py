@@ -0,0 +1,50 @@
+import os
+
+from open_geo_engine.utils.streetview_image_store import StreetViewImageStore
+
+
+def write_image(store, key, content=b"image"):
+    os.makedirs(os.path.dirname(store.path(key)), exist_ok=True)
+    with open(store.path(key), "wb") as f:
+        f.write(content)
+
+
+def test_keys_name_the_requested_image(tmp_path):
+    store = StreetViewImageStore(str(tmp_path))
+    key = store.key("pano-a", "600x300", "151.78", "-0.76")
+
+    assert key == StreetViewImageStore.key("pano-a", "600x300", "151.78", "-0.76")
+    assert key != store.key("pano-a", "600x300", "0", "-0.76")
+    assert key != store.key("pano-a", "640x640", "151.78", "-0.76")
+    assert store.path(key) == str(tmp_path / key[:2] / key[2:4] / f"{key}.jpg")
+
+
+def test_store_indexes_written_images(tmp_path):
+    store = StreetViewImageStore(str(tmp_path))
+    key = store.key("pano-a", "600x300")
+    absent = store.key("pano-b", "600x300")
+
+    assert not store.has(key)
+    write_image(store, key)
+    store.add_many([(key, "pano-a"), (absent, "pano-b")])
+
+    assert store.has(key)
+    assert store.has_many([key, absent]) == {key}
+    assert StreetViewImageStore(str(tmp_path)).has(key)
+    assert store.stats()["hits"] == 2
+
+
+def test_compact_drops_orphans(tmp_path):
+    store = StreetViewImageStore(str(tmp_path), str(tmp_path / "cache" / "images.sqlite"))
+    kept, deleted, orphan = (store.key(pano_id, "600x300") for pano_id in ("a", "b", "c"))
+    for key in (kept, deleted, orphan):
+        write_image(store, key)
+    store.add_many([(kept, "a"), (deleted, "b")])
+    os.remove(store.path(deleted))
+    with open(f"{store.path(kept)}.1.tmp", "wb") as f:
+        f.write(b"partial")
+
+    assert store.compact() == {"images": 1, "removed_files": 2, "removed_entries": 1}
+    assert store.has_many([kept, deleted, orphan]) == {kept}
+    assert os.listdir(os.path.dirname(store.path(kept))) == [os.path.basename(store.path(kept))]
+    assert not os.path.exists(store.path(orphan))
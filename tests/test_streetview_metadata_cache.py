@@ -0,0 +1,36 @@
+from open_geo_engine.utils.streetview_metadata_cache import StreetViewMetadataCache
+
+METADATA = {"status": "OK", "pano_id": "pano", "location": {"lat": 40.41, "lng": -3.68}}
+
+
+def test_cache_round_trip(tmp_path):
+    cache = StreetViewMetadataCache(str(tmp_path / "metadata.sqlite"))
+
+    assert cache.get_many(["40.41,-3.68"]) == {}
+    cache.put_many([("40.41,-3.68", METADATA)])
+
+    assert cache.get_many(["40.41,-3.68", "1.0,2.0"]) == {"40.41,-3.68": METADATA}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_cache_keeps_answers_about_the_location_only(tmp_path):
+    cache = StreetViewMetadataCache(str(tmp_path / "metadata.sqlite"))
+
+    cache.put_many(
+        [
+            ("0.0,0.0", {"status": "ZERO_RESULTS"}),
+            ("1.0,1.0", {"status": "OVER_QUERY_LIMIT"}),
+            ("2.0,2.0", None),
+        ]
+    )
+
+    assert set(cache.get_many(["0.0,0.0", "1.0,1.0", "2.0,2.0"])) == {"0.0,0.0"}
+
+
+def test_cache_expires_entries(tmp_path):
+    path = str(tmp_path / "metadata.sqlite")
+    StreetViewMetadataCache(path).put_many([("40.41,-3.68", METADATA)])
+
+    assert StreetViewMetadataCache(path, ttl_seconds=60).get_many(["40.41,-3.68"])
+    assert StreetViewMetadataCache(path, ttl_seconds=0).get_many(["40.41,-3.68"]) == {}
@@ -0,0 +1,55 @@
+import pandas as pd
+from shapely.geometry import box
+
+from open_geo_engine.utils.tile_snapshot import TileSnapshotStore, centroid_diff, content_hash
+
+
+def _centroids(rows):
+    return pd.DataFrame(rows, columns=["osm_type", "osm_id", "lon", "lat"])
+
+
+def test_content_hash_ignores_row_order():
+    centroids = _centroids([("way", 1, 0.0, 0.0), ("way", 2, 1.0, 1.0)])
+
+    assert content_hash(centroids) == content_hash(centroids.iloc[::-1])
+    assert content_hash(centroids) != content_hash(centroids.assign(lon=[0.0, 1.5]))
+
+
+def test_centroid_diff():
+    previous = _centroids([("way", 1, 0.0, 0.0), ("way", 2, 1.0, 1.0), ("way", 3, 2.0, 2.0)])
+    current = _centroids([("way", 1, 0.0, 0.0), ("way", 2, 1.5, 1.0), ("relation", 3, 3.0, 3.0)])
+
+    diff = centroid_diff(previous, current).sort_values(["osm_type", "osm_id"])
+
+    assert diff[["osm_type", "osm_id", "lon", "lat", "change"]].values.tolist() == [
+        ["relation", 3, 3.0, 3.0, "added"],
+        ["way", 2, 1.5, 1.0, "moved"],
+        ["way", 3, 2.0, 2.0, "removed"],
+    ]
+    assert diff[["lon_previous", "lat_previous"]].fillna(-1).values.tolist() == [
+        [-1, -1],
+        [1.0, 1.0],
+        [2.0, 2.0],
+    ]
+
+
+def test_tile_snapshot_store(tmp_path):
+    tile = box(0.0, 0.0, 0.5, 0.5)
+    key = TileSnapshotStore.tile_key(tile)
+    centroids = _centroids([("way", 1, 0.1, 0.1), ("way", 2, 0.2, 0.2)])
+
+    store = TileSnapshotStore(str(tmp_path), job={"tags": {"building": "school"}})
+    assert store.is_stale(key, max_age_seconds=60, now=100.0)
+    assert store.put(key, centroids, fetched_at=100.0)
+    store.save()
+
+    store = TileSnapshotStore(str(tmp_path), job={"tags": {"building": "school"}})
+    assert not store.is_stale(key, max_age_seconds=60, now=159.0)
+    assert store.is_stale(key, max_age_seconds=60, now=160.0)
+    assert not store.put(key, centroids.iloc[::-1], fetched_at=160.0)
+    pd.testing.assert_frame_equal(store.read(), centroids)
+
+    store = TileSnapshotStore(str(tmp_path), job={"tags": {"building": "hospital"}})
+    assert store.is_stale(key, max_age_seconds=60, now=161.0)
+    assert store.read().empty
+    assert list(tmp_path.glob("tile-*")) == []
@@ -1,10 +1,12 @@
 import datetime
 from unittest.mock import patch
 
+import pandas as pd
 from pandas._testing import assert_frame_equal
 
 from open_geo_engine.src.generate_building_centroids import GenerateBuildingCentroids
 from open_geo_engine.src.load_ee_data import LoadEEData
+from open_geo_engine.utils.utils import ee_array_to_df, ee_arrays_to_df
 
 
 def test_ee_array_to_df():
@@ -98,3 +100,31 @@ def test_ee_array_to_df():
                 )._generate_dates(date_list)
                 == expected_date_list
             )
+
+
+def test_ee_arrays_to_df_matches_ee_array_to_df():
+    header = ["id", "longitude", "latitude", "time", "B4", "B3"]
+    region_arrays = [
+        [header, ["0_0", -3.68, 40.41, 1578653746335, 7053, 7177]],
+        None,
+        [header],
+        [
+            header,
+            ["1_0", -3.69, 40.42, 1578653746335, 6869, None],
+            ["1_1", -3.69, 40.42, 1580036142137, 6869, 7069],
+        ],
+    ]
+
+    expected = pd.concat(
+        [
+            ee_array_to_df(region_array, ["B4", "B3"])
+            for region_array in region_arrays
+            if region_array
+        ]
+    ).reset_index(drop=True)
+    result = ee_arrays_to_df(region_arrays, ["B4", "B3"])
+
+    assert list(result.columns) == list(expected.columns)
+    assert result["B4"].dtype == "float32"
+    assert result["time"].dtype == "int64"
+    assert_frame_equal(result, expected, check_dtype=False, check_names=False)